@@ -0,0 +1,248 @@
+# autotune.py
+"""
+CPU inference autotuner for llama.cpp models.
+
+n_threads / n_batch / n_ctx decide most of the speed on CPU-only hosts, and
+the best values depend on the machine (core count, SMT, cache, memory
+bandwidth). `autotune()` measures the configured GGUF on this host and writes
+the winners to a per-host profile:
+
+    config/profiles/<hostname>.yaml
+        models:
+          Meta-Llama-3-8B-Instruct.Q4_0.gguf:
+            params: {n_threads: 6, n_threads_batch: 12, n_batch: 512, n_ctx: 4096}
+
+`tuned_params(model_path)` reads it back; LlamaCPPInterface (via
+get_llm_interface) and tools/llama_cpp.py apply it automatically.
+
+The search is staged rather than a full grid (every point reloads the model):
+  1. thread count      – best generation tok/s -> n_threads,
+                         best prompt-eval tok/s -> n_threads_batch
+  2. batch size        – best prompt-eval tok/s -> n_batch
+  3. context size      – largest n_ctx whose generation speed stays within
+                         CTX_TOLERANCE of the best and that loads at all
+
+Usage:
+    python main.py --autotune
+    python autotune.py --model models/x.gguf --threads 4 8 --batches 256 512
+"""
+import argparse
+import datetime
+import logging
+import os
+import socket
+import time
+
+import yaml
+
+try:
+    from llama_cpp import Llama
+except ImportError:
+    Llama = None
+
+log = logging.getLogger("autotune")
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+PROFILE_DIR = os.path.join(PROJECT_ROOT, "config", "profiles")
+TUNED_KEYS = ("n_threads", "n_threads_batch", "n_batch", "n_ctx")
+
+DEFAULT_BATCHES = (128, 256, 512, 1024)
+DEFAULT_CONTEXTS = (2048, 4096, 8192)
+# A larger n_ctx is accepted if generation stays within this fraction of the best
+CTX_TOLERANCE = 0.05
+
+_FILLER = ("The quick brown fox jumps over the lazy dog while the network scanner "
+           "enumerates open ports, resolves hostnames and records service banners. ")
+
+
+def _host() -> str:
+    return socket.gethostname().split(".")[0].lower() or "localhost"
+
+
+def profile_path(host: str | None = None) -> str:
+    return os.path.join(PROFILE_DIR, f"{host or _host()}.yaml")
+
+
+def load_profile(host: str | None = None) -> dict:
+    """The host profile, or {} if this host has not been tuned."""
+    path = profile_path(host)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+    except (OSError, yaml.YAMLError) as e:
+        log.warning(f"Ignoring unreadable host profile {path}: {e}")
+        return {}
+
+
+def tuned_params(model_path: str | None, host: str | None = None) -> dict:
+    """Tuned llama.cpp parameters for this model on this host ({} if none)."""
+    if not model_path:
+        return {}
+    entry = load_profile(host).get("models", {}).get(os.path.basename(model_path)) or {}
+    return {k: v for k, v in (entry.get("params") or {}).items() if k in TUNED_KEYS}
+
+
+def save_profile(model_path: str, params: dict, summary: dict, host: str | None = None) -> str:
+    """Merge one model's results into the host profile and return its path."""
+    path = profile_path(host)
+    profile = load_profile(host)
+    profile["host"] = host or _host()
+    profile["cpu_count"] = os.cpu_count()
+    profile.setdefault("models", {})[os.path.basename(model_path)] = {
+        "params": params,
+        "tuned_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        **summary,
+    }
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# Generated by autotune on {profile['host']}; rerun `python main.py --autotune` after hardware changes.\n")
+        yaml.safe_dump(profile, f, sort_keys=False)
+    return path
+
+
+def candidate_threads() -> list[int]:
+    """Powers of two up to the usable CPU count, plus half and all of it (physical vs. logical cores)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on Windows/macOS
+        cpus = os.cpu_count() or 1
+    return sorted({n for n in (1, 2, 4, 8, 16, 32, 64) if n <= cpus} | {max(1, cpus // 2), cpus})
+
+
+def benchmark(model_path: str, n_threads: int, n_threads_batch: int, n_batch: int, n_ctx: int,
+              n_gpu_layers: int = 0, prompt_tokens: int = 512, gen_tokens: int = 64, repeats: int = 2) -> dict:
+    """
+    Load the model with one parameter set and measure prompt-eval and generation speed.
+    Returns:
+        dict: The parameters plus pp_tps / tg_tps (best of `repeats`), or an 'error' entry.
+    """
+    result = {"n_threads": n_threads, "n_threads_batch": n_threads_batch, "n_batch": n_batch, "n_ctx": n_ctx}
+    try:
+        llm = Llama(model_path=model_path, n_threads=n_threads, n_threads_batch=n_threads_batch,
+                    n_batch=n_batch, n_ctx=n_ctx, n_gpu_layers=n_gpu_layers, use_mmap=True, verbose=False)
+    except Exception as e:  # Typically out of memory for large n_ctx
+        log.warning(f"Could not load with {result}: {e}")
+        return {**result, "error": str(e)}
+
+    try:
+        n_prompt = max(16, min(prompt_tokens, n_ctx - gen_tokens - 8))
+        # The filler is ~25 tokens, so this always yields more than n_prompt
+        tokens = llm.tokenize((_FILLER * (n_prompt // 10 + 1)).encode("utf-8"))[:n_prompt]
+
+        pp, tg = [], []
+        for _ in range(repeats):
+            llm.reset()
+            start = time.perf_counter()
+            llm.eval(tokens)
+            pp.append(len(tokens) / (time.perf_counter() - start))
+
+            # generate() reuses the evaluated prompt as a KV-cache prefix, so this times decoding only
+            produced = 0
+            start = time.perf_counter()
+            for _token in llm.generate(tokens, temp=0.0, top_k=1):
+                produced += 1
+                if produced >= gen_tokens:
+                    break
+            tg.append(produced / (time.perf_counter() - start))
+        result.update(pp_tps=round(max(pp), 2), tg_tps=round(max(tg), 2))
+        log.info(f"  threads={n_threads}/{n_threads_batch} batch={n_batch} ctx={n_ctx}: "
+                 f"prompt {result['pp_tps']:.1f} tok/s, generation {result['tg_tps']:.1f} tok/s")
+        return result
+    finally:
+        close = getattr(llm, "close", None)
+        if close:
+            close()
+        del llm
+
+
+def autotune(model_path: str, n_gpu_layers: int = 0, threads=None, batches=None, contexts=None,
+             prompt_tokens: int = 512, gen_tokens: int = 64) -> dict:
+    """
+    Run the staged search for one model.
+    Returns:
+        dict: {"params": {...best...}, "pp_tps": ..., "tg_tps": ..., "results": [...every run...]}
+    Raises:
+        ImportError: If llama-cpp-python is not installed.
+        FileNotFoundError: If the model file does not exist.
+        RuntimeError: If no configuration could be loaded at all.
+    """
+    if Llama is None:
+        raise ImportError("llama-cpp-python is required for autotuning.")
+    if not os.path.exists(model_path):
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+
+    threads = sorted(threads or candidate_threads())
+    batches = sorted(batches or DEFAULT_BATCHES)
+    contexts = sorted(contexts or DEFAULT_CONTEXTS)
+    base_ctx = contexts[0]
+    base_batch = 512 if 512 in batches else batches[len(batches) // 2]
+    results = []
+
+    def run(**kw):
+        r = benchmark(model_path, n_gpu_layers=n_gpu_layers, prompt_tokens=prompt_tokens, gen_tokens=gen_tokens, **kw)
+        results.append(r)
+        return r
+
+    log.info(f"Autotuning {os.path.basename(model_path)}: threads={threads}, batches={batches}, contexts={contexts}")
+
+    log.info("Stage 1/3: thread count")
+    stage = [r for r in (run(n_threads=t, n_threads_batch=t, n_batch=base_batch, n_ctx=base_ctx) for t in threads) if "error" not in r]
+    if not stage:
+        raise RuntimeError(f"Model could not be loaded with any thread count (n_ctx={base_ctx}).")
+    n_threads = max(stage, key=lambda r: r["tg_tps"])["n_threads"]
+    n_threads_batch = max(stage, key=lambda r: r["pp_tps"])["n_threads"]
+    best = max(stage, key=lambda r: r["tg_tps"])
+
+    log.info("Stage 2/3: batch size")
+    stage = [r for r in (run(n_threads=n_threads, n_threads_batch=n_threads_batch, n_batch=b, n_ctx=base_ctx)
+                         for b in batches if b <= base_ctx) if "error" not in r]
+    if stage:
+        best = max(stage, key=lambda r: r["pp_tps"])
+    n_batch = best["n_batch"]
+
+    log.info("Stage 3/3: context size")
+    # The stage 2 winner already covers the smallest context
+    stage = [best] + [r for r in (run(n_threads=n_threads, n_threads_batch=n_threads_batch, n_batch=min(n_batch, c), n_ctx=c)
+                                  for c in contexts[1:]) if "error" not in r]
+    best_tg = max(r["tg_tps"] for r in stage)
+    fitting = [r for r in stage if r["tg_tps"] >= (1 - CTX_TOLERANCE) * best_tg]
+    chosen = max(fitting, key=lambda r: r["n_ctx"])
+
+    params = {"n_threads": n_threads, "n_threads_batch": n_threads_batch, "n_batch": chosen["n_batch"], "n_ctx": chosen["n_ctx"]}
+    return {"params": params, "pp_tps": chosen["pp_tps"], "tg_tps": chosen["tg_tps"],
+            "n_gpu_layers": n_gpu_layers, "results": results}
+
+
+def autotune_and_save(model_path: str, **kwargs) -> tuple[dict, str]:
+    """autotune() and write the winners to this host's profile. Returns (params, profile path)."""
+    outcome = autotune(model_path, **kwargs)
+    summary = {k: outcome[k] for k in ("pp_tps", "tg_tps", "n_gpu_layers", "results")}
+    path = save_profile(model_path, outcome["params"], summary)
+    log.info(f"Best settings for {os.path.basename(model_path)}: {outcome['params']} "
+             f"(prompt {outcome['pp_tps']} tok/s, generation {outcome['tg_tps']} tok/s) -> {path}")
+    return outcome["params"], path
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Benchmark a GGUF model on this host and save the best llama.cpp settings.")
+    parser.add_argument("--model", default=os.getenv("LLAMACPP_MODEL_PATH"), help="GGUF model file.")
+    parser.add_argument("--n-gpu-layers", type=int, default=0)
+    parser.add_argument("--threads", type=int, nargs="+", default=None)
+    parser.add_argument("--batches", type=int, nargs="+", default=None)
+    parser.add_argument("--contexts", type=int, nargs="+", default=None)
+    parser.add_argument("--prompt-tokens", type=int, default=512)
+    parser.add_argument("--gen-tokens", type=int, default=64)
+    args = parser.parse_args()
+    if not args.model:
+        parser.error("--model (or LLAMACPP_MODEL_PATH) is required")
+    params, path = autotune_and_save(args.model, n_gpu_layers=args.n_gpu_layers, threads=args.threads,
+                                     batches=args.batches, contexts=args.contexts,
+                                     prompt_tokens=args.prompt_tokens, gen_tokens=args.gen_tokens)
+    print(f"{params}\nSaved to {path}")
+
+
+if __name__ == "__main__":
+    main()
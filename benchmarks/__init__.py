@@ -0,0 +1,8 @@
+"""
+`benchmarks` package init file.
+
+Standalone measurement scripts for the LLM stack. Run them from the
+project root, e.g. `python -m benchmarks.speculative_bench --help`.
+"""
+
+__all__ = []
@@ -0,0 +1,92 @@
+"""
+Prompt corpora for the benchmarks.
+
+Benchmarks replay *recorded* user prompts rather than synthetic ones, so the
+numbers reflect what the bots actually see. Supported sources:
+  • ChatMemory JSON files (data/chat_history*.json) – user turns are used
+  • JSON list of strings, or a list of {"prompt": "..."} objects
+  • Plain text, one prompt per line
+  • The root bot's SQLite memory (memory.db, "name: text" entries)
+"""
+import glob
+import json
+import logging
+import os
+import sqlite3
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Used when no recorded prompts are available (fresh checkout)
+FALLBACK_PROMPTS = [
+    "hi",
+    "What is the capital of France?",
+    "whois example.com",
+    "Explain how a TLS handshake works, step by step.",
+    "Summarize the difference between TCP and UDP in two sentences.",
+    "What's the weather like in Happy Valley?",
+    "Write a short haiku about port scanners.",
+    "Which ports does a default nmap scan cover?",
+]
+
+
+def _from_json(path: str) -> list[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    prompts = []
+    for item in data if isinstance(data, list) else []:
+        if isinstance(item, str):
+            prompts.append(item)
+        elif isinstance(item, dict) and "prompt" in item:
+            prompts.append(item["prompt"])
+        elif isinstance(item, dict) and item.get("role") == "user":
+            prompts.append(item.get("content", ""))
+    return prompts
+
+
+def _from_sqlite(path: str) -> list[str]:
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("SELECT entry FROM memory ORDER BY id").fetchall()
+    finally:
+        conn.close()
+    # Entries look like "author: text"; skip the bot's own replies
+    return [r[0].split(": ", 1)[-1] for r in rows if not r[0].startswith("Bot:")]
+
+
+def load_prompts(path: str | None = None, limit: int | None = None) -> list[str]:
+    """
+    Load recorded prompts.
+    Args:
+        path (str, optional): File to read. Defaults to every data/chat_history*.json file plus memory.db.
+        limit (int, optional): Keep at most this many prompts.
+    Returns:
+        list[str]: Non-empty prompts (FALLBACK_PROMPTS if nothing was recorded yet).
+    """
+    if path:
+        paths = [path]
+    else:
+        paths = sorted(glob.glob(os.path.join(PROJECT_ROOT, "data", "chat_history*.json")))
+        paths.append(os.path.join(PROJECT_ROOT, "memory.db"))
+
+    prompts = []
+    for p in paths:
+        if not os.path.exists(p):
+            continue
+        try:
+            if p.endswith(".json"):
+                prompts.extend(_from_json(p))
+            elif p.endswith(".db"):
+                prompts.extend(_from_sqlite(p))
+            else:
+                with open(p, "r", encoding="utf-8") as f:
+                    prompts.extend(line.rstrip("\n") for line in f)
+        except (OSError, ValueError, sqlite3.Error) as e:
+            logging.warning(f"Skipping prompt source {p}: {e}")
+
+    prompts = [p.strip() for p in prompts if p and p.strip()]
+    if not prompts:
+        if path:
+            raise ValueError(f"No prompts found in {path}")
+        logging.info("No recorded prompts found; using the built-in fallback corpus.")
+        prompts = list(FALLBACK_PROMPTS)
+    return prompts[:limit] if limit else prompts
@@ -0,0 +1,225 @@
+"""
+LLM throughput / latency benchmark.
+
+Replays recorded prompts against any LLMInterface at one or more concurrency
+levels and reports end-to-end latency percentiles, time to first token and
+throughput. Results can be written as JSON (or appended to a .jsonl file) so
+runs can be compared over time.
+
+Layers:
+  llm       – generate_response_with_history on a single-turn conversation
+  pipeline  – the full CLI turn (memory, system/tool prompt, tool loop) via
+              cli_interface.generate_reply, each worker with its own memory
+
+Modes:
+  generate  – blocking call (TTFT = full latency)
+  stream    – stream_response_with_history (TTFT = first fragment)
+  async     – astream_response_with_history on one event loop
+
+Usage (from the project root):
+    python -m benchmarks.llm_bench --backend fake --token-latency 0.01 --concurrency 1 4 16
+    python -m benchmarks.llm_bench --mode stream --limit 50 --json results/llm.jsonl
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import copy
+import datetime
+import json
+import logging
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from utils import load_config, setup_logging  # noqa: E402  (src/utils.py)
+from llm_interface import get_llm_interface  # noqa: E402
+from benchmarks.corpus import load_prompts  # noqa: E402
+import llm_router  # noqa: E402
+
+
+def percentile(values: list[float], q: float) -> float | None:
+    """Nearest-rank percentile (q in 0..100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))]
+
+
+def _run_one(llm, prompt: str, mode: str, pipeline=None) -> dict:
+    start = time.perf_counter()
+    ttft = None
+    if pipeline is not None:
+        text = pipeline(prompt)
+    elif mode == 'stream':
+        pieces = []
+        for piece in llm.stream_response_with_history([{"role": "user", "content": prompt}]):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            pieces.append(piece)
+        text = "".join(pieces)
+    else:
+        text = llm.generate_response_with_history([{"role": "user", "content": prompt}])
+    latency = time.perf_counter() - start
+    return {"latency": latency, "ttft": ttft if ttft is not None else latency,
+            "tokens": llm_router.estimate_tokens(text)}
+
+
+async def _run_one_async(llm, prompt: str) -> dict:
+    start = time.perf_counter()
+    ttft, pieces = None, []
+    async for piece in llm.astream_response_with_history([{"role": "user", "content": prompt}]):
+        if ttft is None:
+            ttft = time.perf_counter() - start
+        pieces.append(piece)
+    latency = time.perf_counter() - start
+    return {"latency": latency, "ttft": ttft if ttft is not None else latency,
+            "tokens": llm_router.estimate_tokens("".join(pieces))}
+
+
+def _make_pipeline(config: dict, llm, workdir: str):
+    """One generate_reply closure per worker thread, each with its own throwaway memory file."""
+    from src.cli_interface import generate_reply
+    from src.memory import ChatMemory
+
+    local = threading.local()
+
+    def run(prompt: str) -> str:
+        if not hasattr(local, 'memory'):
+            cfg = copy.deepcopy(config)
+            cfg['memory'] = {'type': 'json', 'path': os.path.join(workdir, f"memory_{threading.get_ident()}.json")}
+            local.memory = ChatMemory(cfg)
+        return generate_reply(config, llm, local.memory, prompt)
+    return run
+
+
+def run_level(llm, config: dict, prompts: list[str], concurrency: int, mode: str, layer: str) -> dict:
+    """Runs every prompt once at the given concurrency and returns aggregate numbers."""
+    samples, errors = [], 0
+    wall_start = time.perf_counter()
+    if mode == 'async' and layer == 'llm':
+        async def drive():
+            sem = asyncio.Semaphore(concurrency)
+
+            async def bounded(p):
+                async with sem:
+                    return await _run_one_async(llm, p)
+            return await asyncio.gather(*(bounded(p) for p in prompts), return_exceptions=True)
+        outcomes = asyncio.run(drive())
+    else:
+        with tempfile.TemporaryDirectory() as workdir:
+            pipeline = _make_pipeline(config, llm, workdir) if layer == 'pipeline' else None
+            with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as pool:
+                futures = [pool.submit(_run_one, llm, p, mode, pipeline) for p in prompts]
+                outcomes = []
+                for f in futures:
+                    try:
+                        outcomes.append(f.result())
+                    except Exception as e:
+                        outcomes.append(e)
+    wall = time.perf_counter() - wall_start
+
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            errors += 1
+            logging.warning(f"Request failed: {outcome}")
+        else:
+            samples.append(outcome)
+
+    latencies = [s['latency'] for s in samples]
+    ttfts = [s['ttft'] for s in samples]
+    tokens = sum(s['tokens'] for s in samples)
+    rnd = lambda v: round(v, 4) if v is not None else None
+    return {
+        "concurrency": concurrency,
+        "requests": len(prompts),
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "latency_p50": rnd(percentile(latencies, 50)),
+        "latency_p95": rnd(percentile(latencies, 95)),
+        "latency_p99": rnd(percentile(latencies, 99)),
+        "ttft_p50": rnd(percentile(ttfts, 50)),
+        "ttft_p95": rnd(percentile(ttfts, 95)),
+        "ttft_p99": rnd(percentile(ttfts, 99)),
+        "requests_per_s": round(len(samples) / wall, 3) if wall else 0.0,
+        "tokens_per_s": round(tokens / wall, 2) if wall else 0.0,
+    }
+
+
+def write_results(path: str, report: dict) -> None:
+    """Writes a JSON report, or appends one line to a .jsonl history file."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.endswith('.jsonl'):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(report) + "\n")
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Benchmark LLM latency and throughput on recorded prompts.")
+    parser.add_argument('--config', default=os.path.join(PROJECT_ROOT, 'config', 'config.yaml'))
+    parser.add_argument('--backend', default=None, help="Override llm.type (e.g. 'fake', 'ollama').")
+    parser.add_argument('--prompts', default=None, help='Prompt file (defaults to recorded chat history).')
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--mode', choices=['generate', 'stream', 'async'], default='generate')
+    parser.add_argument('--layer', choices=['llm', 'pipeline'], default='llm')
+    parser.add_argument('--token-latency', type=float, default=None, help='Fake backend: seconds per generated token.')
+    parser.add_argument('--prompt-token-latency', type=float, default=None, help='Fake backend: seconds per prompt token.')
+    parser.add_argument('--response-tokens', type=int, default=None, help='Fake backend: tokens per reply.')
+    parser.add_argument('--tool-call-rate', type=float, default=None, help='Fake backend: fraction of turns answered with a tool call.')
+    parser.add_argument('--no-warmup', action='store_true')
+    parser.add_argument('--json', default=None, help='Write results here (.jsonl appends one line per run).')
+    args = parser.parse_args()
+
+    config = load_config(config_path=args.config)
+    if args.backend:
+        config['llm']['type'] = args.backend
+    for key in ('token_latency', 'prompt_token_latency', 'response_tokens', 'tool_call_rate'):
+        value = getattr(args, key)
+        if value is not None:
+            config['llm'][key] = value
+    if args.layer == 'pipeline' and args.mode != 'generate':
+        parser.error("--layer pipeline only supports --mode generate")
+
+    prompts = load_prompts(args.prompts, limit=args.limit)
+    llm = get_llm_interface(config)
+    if not args.no_warmup:
+        llm.warm_up()
+    logging.info(f"Benchmarking {llm.get_model_name()} on {len(prompts)} prompts "
+                 f"(mode={args.mode}, layer={args.layer}, concurrency={args.concurrency})")
+
+    results = [run_level(llm, config, prompts, c, args.mode, args.layer) for c in args.concurrency]
+
+    print(f"\n{'conc':>5}{'req/s':>9}{'tok/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'ttft50':>9}{'ttft95':>9}{'err':>5}")
+    for r in results:
+        print(f"{r['concurrency']:>5}{r['requests_per_s']:>9.2f}{r['tokens_per_s']:>10.1f}"
+              f"{r['latency_p50']:>9.3f}{r['latency_p95']:>9.3f}{r['latency_p99']:>9.3f}"
+              f"{r['ttft_p50']:>9.3f}{r['ttft_p95']:>9.3f}{r['errors']:>5}")
+
+    if args.json:
+        report = {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "host": socket.gethostname(),
+            "backend": config['llm']['type'],
+            "model": llm.get_model_name(),
+            "mode": args.mode,
+            "layer": args.layer,
+            "prompts": len(prompts),
+            "results": results,
+        }
+        write_results(args.json, report)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
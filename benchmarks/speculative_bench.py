@@ -0,0 +1,104 @@
+"""
+Speculative decoding benchmark.
+
+Replays recorded chat prompts through LlamaCPPInterface once per speculative
+mode and reports generation tokens/s, draft acceptance rate and speedup over
+plain decoding. Generation is greedy (temperature 0) so every mode produces
+the same text and only the speed differs.
+
+Usage (from the project root):
+    python -m benchmarks.speculative_bench --modes off prompt_lookup draft_model \\
+        --draft-model models/Llama-3.2-1B-Instruct.Q4_K_M.gguf --limit 20 --json spec.json
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'src'))
+
+from utils import load_config, setup_logging  # noqa: E402  (src/utils.py)
+from llm_interface import LlamaCPPInterface  # noqa: E402
+from benchmarks.corpus import load_prompts  # noqa: E402
+
+
+def run_mode(config: dict, mode: str, prompts: list[str], max_tokens: int, draft_model: str | None) -> dict:
+    """Runs every prompt with one speculative mode and returns aggregate numbers."""
+    cfg = copy.deepcopy(config)
+    spec = cfg['llm'].setdefault('speculative', {})
+    spec['mode'] = mode
+    if draft_model:
+        spec['draft_model_path'] = draft_model
+
+    llm = LlamaCPPInterface(cfg)
+    try:
+        llm.warm_up()
+        if llm.speculative_stats:
+            llm.speculative_stats.reset()
+        total_tokens, total_time = 0, 0.0
+        for prompt in prompts:
+            start = time.perf_counter()
+            with llm._handle as model:
+                response = model.create_chat_completion(
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=max_tokens,
+                    temperature=0.0,
+                )
+            total_time += time.perf_counter() - start
+            total_tokens += response.get('usage', {}).get('completion_tokens', 0)
+        result = {
+            "mode": mode,
+            "prompts": len(prompts),
+            "completion_tokens": total_tokens,
+            "seconds": round(total_time, 3),
+            "tokens_per_s": round(total_tokens / total_time, 2) if total_time else 0.0,
+        }
+        if llm.speculative_stats:
+            result.update(llm.speculative_stats.snapshot())
+        return result
+    finally:
+        # Free the weights before the next mode loads its own instance
+        llm.close(unload=True)
+
+
+def main():
+    setup_logging()
+    parser = argparse.ArgumentParser(description="Benchmark speculative decoding on recorded chat prompts.")
+    parser.add_argument('--config', default=os.path.join(PROJECT_ROOT, 'config', 'config.yaml'))
+    parser.add_argument('--prompts', default=None, help='Prompt file (defaults to recorded chat history).')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--max-tokens', type=int, default=128)
+    parser.add_argument('--modes', nargs='+', default=['off', 'prompt_lookup'],
+                        choices=['off', 'prompt_lookup', 'draft_model'])
+    parser.add_argument('--draft-model', default=None, help='Draft GGUF for the draft_model mode.')
+    parser.add_argument('--json', default=None, help='Also write results to this JSON file.')
+    args = parser.parse_args()
+
+    config = load_config(config_path=args.config)
+    prompts = load_prompts(args.prompts, limit=args.limit)
+    logging.info(f"Benchmarking {len(prompts)} prompts across modes {args.modes}")
+
+    results = [run_mode(config, mode, prompts, args.max_tokens, args.draft_model) for mode in args.modes]
+    baseline = next((r for r in results if r['mode'] == 'off'), None)
+    for r in results:
+        r['speedup'] = round(r['tokens_per_s'] / baseline['tokens_per_s'], 3) if baseline and baseline['tokens_per_s'] else None
+
+    print(f"\n{'mode':<15}{'tok/s':>10}{'accept':>10}{'speedup':>10}")
+    for r in results:
+        accept = f"{r['acceptance_rate']:.1%}" if 'acceptance_rate' in r else '-'
+        speedup = f"{r['speedup']:.2f}x" if r['speedup'] else '-'
+        print(f"{r['mode']:<15}{r['tokens_per_s']:>10.2f}{accept:>10}{speedup:>10}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"model": config['llm'].get('model_path'), "results": results}, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Local stand-ins for external services, for benchmarks and manual testing.
+
+OllamaStub speaks enough of the Ollama REST API for OllamaInterface:
+  GET  /api/tags      – lists the configured models
+  POST /api/chat      – echoes the last user message (JSON or NDJSON stream)
+  POST /api/generate  – load/keep-alive ping (no prompt) or a one-shot completion
+Responses carry realistic token/timing stats, and every request is recorded.
+
+Usage:
+    with OllamaStub(models=["mistral:latest"], token_delay=0.01) as stub:
+        config = {"llm": {"type": "ollama", "host": stub.url, "model_name": "mistral:latest"}}
+        ...
+        stub.requests  # [(method, path, body), ...]
+
+Or standalone:  python -m benchmarks.stub_servers --port 11434
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _OllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so connection pooling is exercised
+
+    def log_message(self, format, *args):  # Quiet
+        pass
+
+    @property
+    def stub(self) -> "OllamaStub":
+        return self.server.stub
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def _send_json(self, payload: dict, status: int = 200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.stub._record("GET", self.path, None)
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": m} for m in self.stub.models]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        body = self._body()
+        self.stub._record("POST", self.path, body)
+        if self.path not in ("/api/chat", "/api/generate"):
+            return self._send_json({"error": "not found"}, status=404)
+        model = body.get("model")
+        if model not in self.stub.models:
+            return self._send_json({"error": f"model '{model}' not found"}, status=404)
+        load_ns = self.stub._load(model)
+
+        if self.path == "/api/generate" and not body.get("prompt"):
+            # Load / keep-alive ping
+            return self._send_json({"model": model, "response": "", "done": True, "load_duration": load_ns})
+
+        if self.path == "/api/chat":
+            messages = body.get("messages") or []
+            prompt = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+        else:
+            prompt = body.get("prompt", "")
+        tokens = self.stub.reply_for(prompt).split(" ")
+        stats = {
+            "prompt_eval_count": max(1, len(prompt.split())),
+            "prompt_eval_duration": 5_000_000,
+            "eval_count": len(tokens),
+            "load_duration": load_ns,
+        }
+
+        if self.stub.delay:
+            time.sleep(self.stub.delay)
+        start = time.perf_counter()
+        if not body.get("stream", True):
+            time.sleep(self.stub.token_delay * len(tokens))
+            stats["eval_duration"] = int((time.perf_counter() - start) * 1e9) or 1
+            stats["total_duration"] = stats["eval_duration"] + load_ns
+            content = " ".join(tokens)
+            payload = {"model": model, "done": True, **stats}
+            payload.update({"message": {"role": "assistant", "content": content}} if self.path == "/api/chat" else {"response": content})
+            return self._send_json(payload)
+
+        # NDJSON stream, chunked transfer encoding
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            time.sleep(self.stub.token_delay)
+            piece = token if i == 0 else " " + token
+            chunk = {"model": model, "done": False}
+            chunk.update({"message": {"role": "assistant", "content": piece}} if self.path == "/api/chat" else {"response": piece})
+            self._write_chunk(chunk)
+        stats["eval_duration"] = int((time.perf_counter() - start) * 1e9) or 1
+        stats["total_duration"] = stats["eval_duration"] + load_ns
+        final = {"model": model, "done": True, **stats}
+        final.update({"message": {"role": "assistant", "content": ""}} if self.path == "/api/chat" else {"response": ""})
+        self._write_chunk(final)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, payload: dict):
+        data = json.dumps(payload).encode() + b"\n"
+        self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class OllamaStub:
+    """
+    Minimal Ollama server on a background thread.
+    Args:
+        models (list[str]): Model names to serve.
+        port (int): 0 picks a free port.
+        delay (float): Seconds to wait before answering a generation request.
+        token_delay (float): Seconds per generated token.
+        load_seconds (float): Simulated cold-load time (paid again after `keep_alive` expires).
+        reply (str): Fixed reply text; by default the last user message is echoed.
+    """
+
+    def __init__(self, models=("mistral:latest",), host="127.0.0.1", port=0, delay=0.0,
+                 token_delay=0.0, load_seconds=0.0, reply=None):
+        self.models = list(models)
+        self.delay = delay
+        self.token_delay = token_delay
+        self.load_seconds = load_seconds
+        self.reply = reply
+        self.requests: list[tuple] = []
+        self._loaded: dict[str, float] = {}  # model -> expiry (monotonic)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _OllamaHandler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reply_for(self, prompt: str) -> str:
+        return self.reply if self.reply is not None else f"echo: {prompt}"
+
+    def _record(self, method, path, body):
+        with self._lock:
+            self.requests.append((method, path, body))
+
+    def _load(self, model: str, keep_alive_s: float = 300.0) -> int:
+        """Returns the simulated load duration in ns (0 if the model is still resident)."""
+        now = time.monotonic()
+        with self._lock:
+            warm = self._loaded.get(model, 0) > now
+            self._loaded[model] = now + keep_alive_s
+        if warm or not self.load_seconds:
+            return 0
+        time.sleep(self.load_seconds)
+        return int(self.load_seconds * 1e9)
+
+    def start(self) -> "OllamaStub":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="ollama-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a stub Ollama server.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--model", action="append", dest="models", default=None)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--load-seconds", type=float, default=0.0)
+    args = parser.parse_args()
+    stub = OllamaStub(models=args.models or ["mistral:latest"], port=args.port,
+                      token_delay=args.token_delay, load_seconds=args.load_seconds)
+    print(f"Ollama stub listening on {stub.url} serving {stub.models}")
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
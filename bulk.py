@@ -0,0 +1,100 @@
+# bulk.py
+"""
+Runs one lookup tool over many indicators at once.
+
+    indicators = bulk.parse_indicators("8.8.8.8, 1.1.1.1\n9.9.9.9")
+    results = await bulk.run_bulk("ipinfo", indicators)
+    bulk.to_csv(results)    # indicator,ok,seconds,result — one row per indicator
+
+Calls go through tool_runner.run_tool, BULK_CONCURRENCY at a time, so the
+result cache, the tool's concurrency class and its provider's shared rate
+limit (rate_limit) all still apply. Indicators are de-duplicated
+case-insensitively and capped at BULK_MAX_INDICATORS per run.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import re
+import time
+
+import metrics
+import tool_runner
+from tool_cache import is_error_reply, normalize_arg
+from tool_registry import TOOLS
+
+CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", 8))
+MAX_INDICATORS = int(os.getenv("BULK_MAX_INDICATORS", 1000))
+
+_SEPARATORS = re.compile(r"[,;\r\n]+")
+
+
+def parse_indicators(text: str) -> list[str]:
+    """
+    Comma-, semicolon- or newline-separated indicators, in order, without blanks,
+    '#' comment lines or duplicates. Raises ValueError past MAX_INDICATORS.
+    """
+    indicators, seen = [], set()
+    for item in _SEPARATORS.split(text):
+        item = item.strip().strip('"').strip()
+        if not item or item.startswith("#"):
+            continue
+        key = normalize_arg(item)
+        if key not in seen:
+            seen.add(key)
+            indicators.append(item)
+    if len(indicators) > MAX_INDICATORS:
+        raise ValueError(f"{len(indicators)} indicators; the limit is {MAX_INDICATORS} per run")
+    return indicators
+
+
+async def run_bulk(tool: str, indicators: list[str], on_progress=None) -> list[dict]:
+    """
+    tool(indicator) for every indicator; results keep the input order:
+    [{"indicator", "ok", "seconds", "result"}]. `on_progress(done, total)` is
+    awaited after each one. Raises KeyError for an unknown tool.
+    """
+    if tool not in TOOLS:
+        raise KeyError(tool)
+    limit = asyncio.Semaphore(CONCURRENCY)
+    results: list[dict | None] = [None] * len(indicators)
+    done = 0
+
+    async def one(i: int, indicator: str):
+        nonlocal done
+        async with limit:
+            start_time = time.time()
+            try:
+                out = (await tool_runner.run_tool(tool, indicator)).strip()
+                ok = not is_error_reply(tool, out) # Wrappers report errors as "[Tool] …"
+            except Exception as e:
+                out, ok = f"[{tool}] {e}", False
+            results[i] = {"indicator": indicator, "ok": ok, "seconds": round(time.time() - start_time, 3), "result": out}
+        metrics.inc("bulk_indicators_total", tool=tool, ok=str(ok).lower())
+        done += 1
+        if on_progress is not None:
+            await on_progress(done, len(indicators))
+
+    await asyncio.gather(*(one(i, indicator) for i, indicator in enumerate(indicators)))
+    return results
+
+
+def to_csv(results: list[dict]) -> str:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=["indicator", "ok", "seconds", "result"])
+    writer.writeheader()
+    writer.writerows(results)
+    return buf.getvalue()
+
+
+def to_json(results: list[dict]) -> str:
+    """Results as JSON; a result that is itself JSON (the REST wrappers) is embedded as an object."""
+    rows = []
+    for r in results:
+        try:
+            value = json.loads(r["result"]) if r["ok"] else r["result"]
+        except ValueError:
+            value = r["result"]
+        rows.append({**r, "result": value})
+    return json.dumps(rows, indent=2, ensure_ascii=False)
@@ -0,0 +1,266 @@
+# circuit_breaker.py
+"""
+Circuit breakers, active health probes and a fallback chain for flaky backends.
+
+A breaker watches one backend:
+  • closed    – calls go through; `failure_threshold` consecutive failures open it
+  • open      – calls are rejected immediately (no timeout to wait out) until
+                `reset_timeout` seconds pass or a health probe succeeds
+  • half_open – a single trial call is let through; success closes the
+                breaker, failure opens it again
+
+The `prober` thread runs each backend's cheap health check every
+HEALTH_PROBE_INTERVAL seconds, so a dead backend is skipped before a user
+request trips over it, and a recovered one is retried without waiting.
+
+`FallbackChain` tries backends in order and returns the first healthy answer.
+Breaker states are exported as the `circuit_breaker_state` gauge
+(0 = closed, 1 = half_open, 2 = open).
+"""
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+log = logging.getLogger("circuit_breaker")
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 3))
+RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", 30))
+PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", 15))
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because the backend's breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT,
+                 clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock # Injectable for tests
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        metrics.set_gauge("circuit_breaker_state", STATE_VALUES[CLOSED], backend=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _set_state(self, state: str) -> None:
+        # Caller holds the lock
+        if state == self._state:
+            return
+        log.info(f"Breaker '{self.name}': {self._state} -> {state}")
+        self._state = state
+        self._trial_in_flight = False
+        if state == OPEN:
+            self._opened_at = self._clock()
+        if state == CLOSED:
+            self._failures = 0
+        metrics.set_gauge("circuit_breaker_state", STATE_VALUES[state], backend=self.name)
+        metrics.inc("circuit_breaker_transitions_total", backend=self.name, to=state)
+
+    def _maybe_half_open(self) -> None:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+
+    def allow(self) -> bool:
+        """True if a call may go through now (claims the single trial slot when half-open)."""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            metrics.inc("circuit_breaker_rejections_total", backend=self.name)
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._set_state(OPEN)
+            self._trial_in_flight = False
+
+    def trip(self) -> None:
+        """Open the breaker now (e.g. a health probe failed)."""
+        with self._lock:
+            self._set_state(OPEN)
+            self._opened_at = self._clock()
+
+    def probe_succeeded(self) -> None:
+        """An open backend looks healthy again: let the next real call through as the trial."""
+        with self._lock:
+            if self._state == OPEN:
+                self._set_state(HALF_OPEN)
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn through the breaker. Raises CircuitOpenError without calling fn when open."""
+        if not self.allow():
+            raise CircuitOpenError(f"Backend '{self.name}' is unavailable (circuit open)")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, **kwargs) -> CircuitBreaker:
+    """Process-wide breaker per backend name (shared by every caller of that backend)."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name, **kwargs)
+        return breaker
+
+
+def states() -> dict:
+    """{backend: state} for every breaker."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.state for b in breakers}
+
+
+class HealthProber:
+    """Background thread running registered health checks and steering breakers."""
+
+    def __init__(self, interval: float = PROBE_INTERVAL):
+        self.interval = interval
+        self._probes: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, breaker: CircuitBreaker, probe) -> None:
+        """probe() returns truthy when the backend looks healthy; exceptions count as unhealthy."""
+        with self._lock:
+            self._probes[breaker.name] = (breaker, probe)
+        if self.interval > 0:
+            self.start()
+
+    def unregister(self, name: str, probe=None) -> None:
+        """
+        Stops probing breaker `name`. With `probe`, only if that probe is the one registered,
+        so a backend being closed can't remove the probe of the one that replaced it.
+        """
+        with self._lock:
+            entry = self._probes.get(name)
+            if entry is not None and (probe is None or entry[1] == probe):
+                del self._probes[name]
+
+    def run_once(self) -> dict:
+        with self._lock:
+            probes = list(self._probes.values())
+        results = {}
+        for breaker, probe in probes:
+            start = time.perf_counter()
+            try:
+                healthy = bool(probe())
+            except Exception as e:
+                log.debug(f"Health probe for '{breaker.name}' raised: {e}")
+                healthy = False
+            metrics.observe("health_probe_seconds", time.perf_counter() - start, backend=breaker.name)
+            metrics.set_gauge("backend_healthy", 1 if healthy else 0, backend=breaker.name)
+            results[breaker.name] = healthy
+            state = breaker.state
+            if not healthy and state != OPEN:
+                log.warning(f"Health probe failed for '{breaker.name}'; opening its breaker.")
+                breaker.trip()
+            elif healthy and state == OPEN:
+                breaker.probe_succeeded()
+        return results
+
+    def _loop(self):
+        while True:
+            self.run_once()
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="health-prober", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+prober = HealthProber()
+
+
+class Backend:
+    """
+    One entry of a fallback chain.
+    Args:
+        name (str): Breaker / metrics name.
+        call (callable): call(*args, **kwargs) -> result; raise on failure.
+        probe (callable, optional): Cheap health check for the prober.
+    """
+
+    def __init__(self, name: str, call, probe=None):
+        self.name = name
+        self.call = call
+        self.breaker = get_breaker(name)
+        if probe is not None:
+            prober.register(self.breaker, probe)
+
+
+class FallbackChain:
+    """Tries each backend in order, skipping those whose breaker is open."""
+
+    def __init__(self, backends: list[Backend]):
+        self.backends = backends
+
+    def call(self, *args, **kwargs):
+        """
+        Returns (backend_name, result) from the first backend that succeeds.
+        Raises:
+            CircuitOpenError: If every backend is open or failed.
+        """
+        errors = []
+        for backend in self.backends:
+            if not backend.breaker.allow():
+                errors.append(f"{backend.name}: circuit open")
+                continue
+            start = time.perf_counter()
+            try:
+                result = backend.call(*args, **kwargs)
+            except Exception as e:
+                backend.breaker.record_failure()
+                metrics.inc("backend_failures_total", backend=backend.name)
+                log.warning(f"Backend '{backend.name}' failed ({type(e).__name__}: {e}); trying the next one.")
+                errors.append(f"{backend.name}: {str(e) or type(e).__name__}")
+                continue
+            backend.breaker.record_success()
+            metrics.observe("backend_latency_seconds", time.perf_counter() - start, backend=backend.name)
+            if backend is not self.backends[0]:
+                metrics.inc("backend_fallbacks_total", backend=backend.name)
+            return backend.name, result
+        raise CircuitOpenError("All backends unavailable: " + "; ".join(errors))
@@ -4,7 +4,6 @@
 import os
 import sys
 from dotenv import load_dotenv
-from llm_manager import get_llm
 from memory import memory
 from tool_registry import TOOLS, list_tools
 
@@ -24,6 +23,7 @@ def run_tool_cli(tool_name: str, arg: str):
 
 
 def interactive_loop():
+    from llm_manager import get_llm # Not needed for one-shot tool runs
     llm = get_llm()
     print("Available tools:", list_tools())
     while True:
@@ -42,7 +42,10 @@ logging.getLogger("tools.ollama_tool").disabled = True
 
 from config.constants import CONTEXT_LIMIT
 import asyncio
+import gzip
+import io
 import random
+import time
 from collections import defaultdict
 from typing import List
 import shlex
@@ -50,11 +53,17 @@ import shlex
 from discord.ext import commands
 from dotenv import load_dotenv
 
-from llm_manager import get_llm
+from llm_manager import get_llm_for, swap_model, install_reload_signal
 from memory import memory
 from tool_registry import TOOLS
+import tool_runner
+import bulk
+from output_capture import OutputCapture, capture_text, read_page
+from jobs import job_manager
+from scan_store import scan_store
 from utils.token_utils import truncate_to_token_limit
 from llama_local import query_llama_local
+import model_lifecycle
 
 # Force logging errors to stdout
 handler = logging.StreamHandler(sys.stdout)
@@ -73,6 +82,10 @@ load_dotenv()
 
 MAX_HISTORY = int(os.getenv("OPENAI_MAX_HISTORY_MSGS", 100000))
 MAX_DISCORD_CHARS = 1900
+STREAM_EDIT_INTERVAL = float(os.getenv("TOOL_STREAM_EDIT_INTERVAL", 2.0)) # Seconds between progress edits
+ATTACH_MAX_BYTES = 8 * 1024 * 1024 # Discord's default upload limit
+ATTACH_MAX_CHARS = 4 * 1024 * 1024 # Larger outputs are attached still gzipped
+BULK_INPUT_MAX_BYTES = 1024 * 1024 # Largest indicator list accepted as an attachment
 
 YOUR_USER_ID = 212698599631355904
 HAUNTER_BOT_USER_ID = 1365583428610691082
@@ -124,7 +137,9 @@ async def generate_response(bot_id: int, channel_id: int, user_message: str) ->
         f"{persona}\n\nConversation so far:\n{full_history}\n\nUser: {user_message}\nBot:", usable_tokens
     )
 
-    llm = get_llm()
+    # Short / small-talk messages go to the small model when SMALL_GPT4ALL_MODEL_PATH is set,
+    # unless the prompt with its memory and history is too long for it
+    llm = get_llm_for(user_message, prompt=trimmed_prompt)
     reply = await asyncio.to_thread(llm.generate_text, trimmed_prompt, max_tokens=256)
     return reply
 
@@ -137,7 +152,7 @@ bot = commands.Bot(command_prefix=None, intents=intents)
 # ---------------------------------------------------------------------------
 # Free-form tool executor
 # ---------------------------------------------------------------------------
-def _try_execute_tool(message_content: str) -> str | None:
+async def _try_execute_tool(message_content: str) -> str | None:
     lowered = message_content.lower().strip()
     aliases = {
         "image": "stable_diffusion",
@@ -150,19 +165,255 @@ def _try_execute_tool(message_content: str) -> str | None:
     for alias, tool_name in aliases.items():
         if lowered == alias or lowered.startswith(alias + " "):
             prompt = message_content[len(alias):].strip()
-            out = TOOLS[tool_name](prompt)
+            out = await tool_runner.run_tool(tool_name, prompt)
             return f"[{tool_name}]\n{out}"
     for name in TOOLS:
         if lowered.startswith(name.lower()):
             arg = message_content[len(name):].strip()
-            out = TOOLS[name](arg)
+            out = await tool_runner.run_tool(name, arg)
             return f"[{name}]\n{out}"
     return None
 
+# ---------------------------------------------------------------------------
+# Progressive output for CLI tools
+# ---------------------------------------------------------------------------
+async def _run_tool_streaming(channel, tool_name: str, arg: str) -> tuple[str, OutputCapture, discord.Message | None]:
+    """
+    Runs a tool; a CLI scan posts one message and edits it with the rolling
+    output tail (throttled to STREAM_EDIT_INTERVAL) while it runs.
+    Returns (output summary, its OutputCapture, progress message or None).
+    """
+    if not tool_runner.is_cli(tool_name, arg):
+        capture = capture_text(await tool_runner.run_tool(tool_name, arg), tool_name)
+        return capture.summary(), capture, None
+    capture = OutputCapture(tool_name)
+    progress = await channel.send(f"⏳ `{tool_name} {arg}` running…"[:MAX_DISCORD_CHARS])
+
+    async def show(tail: str):
+        await progress.edit(content=f"⏳ `{tool_name}` running…\n```{tail[-(MAX_DISCORD_CHARS - 100):]}```")
+
+    out = await tool_runner.run_tool(tool_name, arg, on_update=show, update_interval=STREAM_EDIT_INTERVAL,
+                                     capture=capture)
+    return out, capture, progress
+
+# ---------------------------------------------------------------------------
+# Paged output (!page)
+# ---------------------------------------------------------------------------
+async def _page_content(capture_id: str, page: int) -> tuple[str, int, int] | None:
+    found = await asyncio.to_thread(read_page, capture_id, page) # Decompresses the file: keep it off the loop
+    if found is None:
+        return None
+    text, page, pages = found
+    return f"Output `{capture_id}` — page {page}/{pages}\n```{text}```", page, pages
+
+
+class OutputPager(discord.ui.View):
+    """◀ / ▶ buttons that page through a spilled output in place."""
+
+    def __init__(self, capture_id: str, page: int, pages: int):
+        super().__init__(timeout=600)
+        self.capture_id, self.page, self.pages = capture_id, page, pages
+        self._sync_buttons()
+
+    def _sync_buttons(self):
+        self.previous.disabled = self.page <= 1
+        self.next.disabled = self.page >= self.pages
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        found = await _page_content(self.capture_id, page)
+        if found is None:
+            await interaction.response.edit_message(content=f"Output `{self.capture_id}` has expired.", view=None)
+            return
+        content, self.page, self.pages = found
+        self._sync_buttons()
+        await interaction.response.edit_message(content=content, view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+
+async def _send_page(channel, capture_id: str, page: int = 1, missing: str | None = None):
+    found = await _page_content(capture_id, page)
+    if found is None:
+        await channel.send(missing or f"No saved output `{capture_id}` (unknown or expired).")
+        return
+    content, page, pages = found
+    await channel.send(content, view=OutputPager(capture_id, page, pages) if pages > 1 else None)
+
+
+async def _send_output_file(channel, capture: OutputCapture):
+    """Attaches a spilled output: as plain text when small enough, else the gzip itself."""
+    if capture.total_chars <= ATTACH_MAX_CHARS:
+        data = await asyncio.to_thread(gzip.decompress, capture.path.read_bytes())
+        file = discord.File(io.BytesIO(data), filename=f"{capture.label}-{capture.id}.txt")
+    elif capture.path.stat().st_size <= ATTACH_MAX_BYTES:
+        file = discord.File(str(capture.path), filename=f"{capture.label}-{capture.id}.txt.gz")
+    else:
+        await channel.send(f"Full output is too large to attach; page through it with `!page {capture.id}`.")
+        return
+    await channel.send(f"Full output ({capture.total_chars} chars):", file=file)
+
+# ---------------------------------------------------------------------------
+# Stored nmap results (!scan)
+# ---------------------------------------------------------------------------
+def _scan_query(content: str) -> str:
+    """!scan list | !scan show <id> | !scan port <n>[/udp] [days] | !scan host <addr> [days]"""
+    parts = content.split()
+    action = parts[1].lower() if len(parts) > 1 else ""
+    days = float(parts[3]) if len(parts) > 3 and parts[3].replace(".", "", 1).isdigit() else None
+    since = time.time() - days * 86400 if days else None
+    window = f" in the last {days:g} day(s)" if days else ""
+    if action == "list":
+        scans = scan_store.recent_scans()
+        return "\n".join(f"#{s['id']:<5} {time.strftime('%Y-%m-%d %H:%M', time.localtime(s['started']))}"
+                         f"  {s['hosts_up']} up  {s['args']}" for s in scans) or "No scans stored yet."
+    if action == "show" and len(parts) > 2 and parts[2].isdigit():
+        return scan_store.summarize(int(parts[2]))
+    if action == "port" and len(parts) > 2:
+        port, _, protocol = parts[2].partition("/")
+        if not port.isdigit():
+            return "Usage: !scan port <n>[/udp] [days]"
+        rows = scan_store.hosts_with_port(int(port), protocol or "tcp", since=since)
+        if not rows:
+            return f"No stored host has {parts[2]} open{window}."
+        lines = [f"{len(rows)} host(s) with {parts[2]} open{window}:"]
+        for r in rows:
+            name = f" ({r['hostname']})" if r["hostname"] else ""
+            service = " ".join(filter(None, (r["service"], r["product"], r["version"])))
+            lines.append(f"{r['addr']}{name}: {service} (scan #{r['scan_id']})")
+        return "\n".join(lines)
+    if action == "host" and len(parts) > 2:
+        rows = scan_store.host_history(parts[2], since=since)
+        if not rows:
+            return f"No stored results for {parts[2]}{window}."
+        lines, current = [], None
+        for r in rows:
+            if r["scan_id"] != current:
+                current = r["scan_id"]
+                when = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["seen"]))
+                os_name = f" [{r['os']}]" if r["os"] else ""
+                lines.append(f"scan #{current} ({when}){os_name}:")
+            lines.append(f"  {r['port']}/{r['protocol']} {r['state']} "
+                         f"{' '.join(filter(None, (r['service'], r['product'], r['version'])))}")
+        return "\n".join(lines)
+    return "Usage: `!scan list` | `!scan show <id>` | `!scan port <n>[/udp] [days]` | `!scan host <addr> [days]`"
+
+# ---------------------------------------------------------------------------
+# Bulk lookups (!bulk)
+# ---------------------------------------------------------------------------
+async def _handle_bulk_command(message: discord.Message, content: str):
+    """!bulk <tool> [--json] <indicators, comma- or newline-separated> (or attach a .txt/.csv list)"""
+    parts = content.split(maxsplit=2)
+    if len(parts) < 2:
+        await message.channel.send("Usage: `!bulk <tool> [--json] <ip, domain, …>` or attach a list file")
+        return
+    tool_name, rest = parts[1], parts[2] if len(parts) > 2 else ""
+    as_json = rest.startswith("--json")
+    text = rest[len("--json"):] if as_json else rest
+    for att in message.attachments:
+        if att.size > BULK_INPUT_MAX_BYTES:
+            await message.channel.send(f"`{att.filename}` is too large (limit {BULK_INPUT_MAX_BYTES // 1024} KB).")
+            return
+        text += "\n" + (await att.read()).decode("utf-8", errors="replace")
+    if tool_name not in TOOLS:
+        await message.channel.send(f"Tool `{tool_name}` not found.")
+        return
+    try:
+        indicators = bulk.parse_indicators(text)
+    except ValueError as e:
+        await message.channel.send(f"⚠️ {e}")
+        return
+    if not indicators:
+        await message.channel.send("No indicators given.")
+        return
+
+    progress = await message.channel.send(f"⏳ `{tool_name}`: 0/{len(indicators)}")
+    last_edit = time.monotonic()
+
+    async def show(done: int, total: int):
+        nonlocal last_edit
+        if done < total and time.monotonic() - last_edit < STREAM_EDIT_INTERVAL:
+            return
+        last_edit = time.monotonic()
+        await progress.edit(content=f"⏳ `{tool_name}`: {done}/{total}")
+
+    start_time = time.time()
+    results = await bulk.run_bulk(tool_name, indicators, on_progress=show)
+    elapsed = time.time() - start_time
+    ok = sum(r["ok"] for r in results)
+    data = bulk.to_json(results) if as_json else bulk.to_csv(results)
+    file = discord.File(io.BytesIO(data.encode("utf-8")), filename=f"{tool_name}-bulk.{'json' if as_json else 'csv'}")
+    await progress.edit(content=f"✅ `{tool_name}`: {ok}/{len(results)} succeeded in {elapsed:.1f}s"
+                                f" ({len(results) / max(elapsed, 0.001):.1f}/s)")
+    await message.channel.send(file=file)
+
+# ---------------------------------------------------------------------------
+# Background jobs (!job)
+# ---------------------------------------------------------------------------
+async def _notify_job_done(job):
+    channel = bot.get_channel(job["channel_id"]) if job["channel_id"] else None
+    if channel is None:
+        return
+    icon = {"done": "✅", "failed": "⚠️", "cancelled": "🛑"}.get(job["status"], "ℹ️")
+    detail = f" ({job['error']})" if job["error"] else ""
+    found = await asyncio.to_thread(read_page, job["output_id"] or "", 1)
+    pages = found[2] if found else 0
+    await channel.send(f"{icon} Job #{job['id']} `{job['tool']} {job['arg']}` {job['status']}{detail}"
+                       f" — `!job result {job['id']}` ({pages} page(s))")
+
+
+async def _handle_job_command(message: discord.Message, content: str):
+    """!job start <tool> <args> | !job status | !job result <id> [page] | !job cancel <id>"""
+    parts = content.split(maxsplit=3)
+    action = parts[1].lower() if len(parts) > 1 else ""
+    if action == "start" and len(parts) >= 3:
+        tool_name, arg = parts[2], parts[3] if len(parts) > 3 else ""
+        try:
+            job_id = await job_manager.submit(tool_name, arg, channel_id=message.channel.id, user_id=message.author.id)
+        except KeyError:
+            await message.channel.send(f"Tool `{tool_name}` not found.")
+            return
+        await message.channel.send(f"🕒 Job #{job_id} queued: `{tool_name} {arg}`. I'll post here when it finishes.")
+    elif action == "status":
+        jobs = job_manager.recent()
+        if not jobs:
+            await message.channel.send("No jobs yet.")
+            return
+        lines = [f"#{j['id']:<5} {j['status']:<9} {j['tool']} {j['arg']}"[:120] for j in jobs]
+        await message.channel.send("```" + "\n".join(lines) + "```")
+    elif action == "result" and len(parts) >= 3 and parts[2].isdigit():
+        job = job_manager.get(int(parts[2]))
+        if job is None:
+            await message.channel.send(f"No job #{parts[2]}.")
+            return
+        page = int(parts[3]) if len(parts) > 3 and parts[3].isdigit() else 1
+        await _send_page(message.channel, job["output_id"] or "", page,
+                         missing=f"Job #{job['id']} ({job['status']}) has no output yet.")
+    elif action == "cancel" and len(parts) >= 3 and parts[2].isdigit():
+        if await job_manager.cancel(int(parts[2])):
+            await message.channel.send(f"🛑 Cancelling job #{parts[2]}.")
+        else:
+            await message.channel.send(f"Job #{parts[2]} is not queued or running.")
+    else:
+        await message.channel.send("Usage: `!job start <tool> <args>` | `!job status` | `!job result <id> [page]` | `!job cancel <id>`")
+
 # ---------------------------------------------------------------------------
 # Events
 # ---------------------------------------------------------------------------
 
+@bot.event
+async def on_ready():
+    # Tools run off the loop (tool_runner); this records any blocking that remains
+    tool_runner.start_loop_lag_monitor()
+    job_manager.notify = _notify_job_done
+    job_manager.start()
+
+
 @bot.event
 async def on_message(message: discord.Message):
     log = logging.getLogger("discord.client")
@@ -172,8 +423,49 @@ async def on_message(message: discord.Message):
         if message.author.id == bot.user.id:
             return
 
+        # Hold messages until the startup preload/warm-up stage has finished
+        if not model_lifecycle.is_ready():
+            log.debug("[GATE] Models still warming up, waiting…")
+            await model_lifecycle.wait_ready()
+
         content = message.content.strip()
         channel_id = message.channel.id
+
+        # Admin: load another model in the background and switch to it once it is warm
+        if content.startswith("!swapmodel") and message.author.id == YOUR_USER_ID:
+            model_path = content[len("!swapmodel"):].strip()
+            if not model_path:
+                await message.channel.send("Usage: !swapmodel <model path>")
+                return
+            await message.channel.send(f"🔁 Loading `{model_path}` in the background; the current model keeps answering.")
+            try:
+                await asyncio.to_thread(swap_model, model_path)
+                await message.channel.send(f"✅ Now serving `{model_path}`.")
+            except Exception as e:
+                await message.channel.send(f"⚠️ Swap failed, still on the old model: {e}")
+            return
+        # Page through a large saved tool output
+        if content.startswith("!page"):
+            parts = content.split()
+            if len(parts) < 2:
+                await message.channel.send("Usage: !page <output id> [page]")
+                return
+            await _send_page(message.channel, parts[1], int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else 1)
+            return
+        # Questions about earlier nmap scans, answered from the store
+        if content.startswith("!scan"):
+            for c in chunk(f"```{_scan_query(content)}```"):
+                await message.channel.send(c)
+            return
+        # One lookup tool over a list of indicators
+        if content.startswith("!bulk"):
+            async with message.channel.typing():
+                await _handle_bulk_command(message, content)
+            return
+        # Background jobs for long scans
+        if content.startswith("!job"):
+            await _handle_job_command(message, content)
+            return
         bot_name_lower = bot.user.name.lower()
         mentioned = bot_name_lower in content.lower()
         freeform_allowed = FREEFORM_MATCH_ALL or (channel_id in FREEFORM_CHANNELS)
@@ -216,7 +508,7 @@ async def on_message(message: discord.Message):
         if m:
             q = m.group(1).strip()
             async with message.channel.typing():
-                res = TOOLS["google_images_search"](q).strip()
+                res = (await tool_runner.run_tool("google_images_search", q)).strip()
                 if res.startswith(("http://", "https://")):
                     await message.channel.send(res)
                 else:
@@ -233,7 +525,7 @@ async def on_message(message: discord.Message):
         if m2:
             q = m2.group(1).strip()
             async with message.channel.typing():
-                img = TOOLS["stable_diffusion"](q).strip()
+                img = (await tool_runner.run_tool("stable_diffusion", q)).strip()
                 if img.startswith(("http://", "https://")):
                     await message.channel.send(img)
                 else:
@@ -243,7 +535,7 @@ async def on_message(message: discord.Message):
     log.debug("→ Entering: Freeform generic tool block")
     # Free-form generic tool execution
     if freeform_allowed:
-        tool_out = _try_execute_tool(content)
+        tool_out = await _try_execute_tool(content)
         if tool_out:
             async with message.channel.typing():
                 for part in chunk(tool_out):
@@ -256,14 +548,22 @@ async def on_message(message: discord.Message):
         arg = argp[0] if argp else ""
         async with message.channel.typing():
             if tool_name in TOOLS:
-                out = TOOLS[tool_name](arg).strip()
+                out, capture, progress = await _run_tool_streaming(message.channel, tool_name, arg)
+                out = out.strip()
                 lines = out.splitlines()
-                if all(line.startswith(("http://", "https://")) for line in lines):
+                parts = chunk(f"```{out}```")
+                if progress is not None:
+                    # The progress message becomes the first part of the final output
+                    await progress.edit(content=parts.pop(0))
+                if all(line.startswith(("http://", "https://")) for line in lines) and progress is None:
                     embeds = [discord.Embed().set_image(url=url) for url in lines]
                     await message.channel.send(embeds=embeds[:10])
                 else:
-                    for c in chunk(f"```{out}```"):
+                    for c in parts:
                         await message.channel.send(c)
+                if capture.spilled:
+                    await _send_output_file(message.channel, capture)
+                    await _send_page(message.channel, capture.id)
             else:
                 await message.channel.send(f"Tool `{tool_name}` not found.")
         return
@@ -308,4 +608,8 @@ if __name__ == "__main__":
     token = os.getenv("DISCORD_TOKEN_HAUNTER")
     if not token:
         raise RuntimeError("DISCORD_TOKEN_HAUNTER not set in environment or .env")
+    # Load + warm up models while the gateway connects
+    model_lifecycle.start_preload_thread()
+    # SIGHUP after editing GPT4ALL_MODEL_PATH in .env swaps the model without a restart
+    install_reload_signal()
     bot.run(token)
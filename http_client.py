@@ -0,0 +1,211 @@
+# http_client.py
+"""
+Shared, pooled HTTP clients.
+
+Creating a client per call means a fresh TCP (and TLS) handshake every time.
+These process-wide clients keep connections alive and reuse them:
+
+  • get_client()        – httpx.Client for threads / sync code
+  • get_async_client()  – httpx.AsyncClient for the running event loop
+                          (one per loop, since connections are loop-bound)
+
+Both take an optional Unix socket path (`uds`); `split_url()` turns a
+"unix:///path/to.sock" URL into (base_url, uds) for them.
+
+Pool sizes come from HTTP_MAX_CONNECTIONS / HTTP_MAX_KEEPALIVE /
+HTTP_KEEPALIVE_EXPIRY (seconds).
+
+For third-party APIs (the REST tool wrappers) use `request()` / `arequest()`:
+they go through the same pools, cap concurrent requests per host
+(HTTP_MAX_PER_HOST) and retry connection errors, timeouts and 429/5xx
+replies with exponential backoff (HTTP_RETRIES, HTTP_BACKOFF seconds;
+Retry-After is honoured).
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+
+import metrics
+
+log = logging.getLogger("http_client")
+
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 60))
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", 10))
+RETRIES = int(os.getenv("HTTP_RETRIES", 2))
+BACKOFF = float(os.getenv("HTTP_BACKOFF", 0.5))
+RETRY_STATUSES = {429, 502, 503, 504}
+MAX_RETRY_AFTER = 30.0 # Never sleep longer than this on a server's Retry-After
+
+_lock = threading.Lock()
+_clients: dict[str | None, httpx.Client] = {}
+_host_slots: dict[str, threading.BoundedSemaphore] = {}
+# Per event loop, keyed by the loop itself (not id(), which a new loop can reuse)
+_async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary() # loop -> {uds: AsyncClient}
+_async_host_slots: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary() # loop -> {host: Semaphore}
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def _for_loop(table: weakref.WeakKeyDictionary, loop: asyncio.AbstractEventLoop) -> dict:
+    """table[loop], created on first use. Call with _lock held."""
+    # A value can keep its own loop alive (a pooled connection's transport, a semaphore's
+    # waiters), so entries of closed loops are dropped here rather than left to the GC
+    for old in [l for l in table if l.is_closed()]:
+        del table[old]
+    return table.setdefault(loop, {})
+
+
+def split_url(url: str) -> tuple[str, str | None]:
+    """("http://host:port", None) for HTTP URLs; ("http://localhost", "/path.sock") for unix:///path.sock."""
+    if url.startswith("unix://"):
+        return "http://localhost", url[len("unix://"):]
+    return url.rstrip("/"), None
+
+
+def get_client(uds: str | None = None) -> httpx.Client:
+    """Process-wide pooled sync client (one per Unix socket path when `uds` is given)."""
+    with _lock:
+        client = _clients.get(uds)
+        if client is None or client.is_closed:
+            transport = httpx.HTTPTransport(uds=uds, limits=_limits()) if uds else None
+            client = _clients[uds] = httpx.Client(limits=_limits(), timeout=DEFAULT_TIMEOUT, transport=transport)
+        return client
+
+
+def get_async_client(uds: str | None = None) -> httpx.AsyncClient:
+    """Pooled async client for the current event loop (must be called inside a running loop)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _for_loop(_async_clients, loop)
+        client = clients.get(uds)
+        if client is None or client.is_closed:
+            transport = httpx.AsyncHTTPTransport(uds=uds, limits=_limits()) if uds else None
+            client = clients[uds] = httpx.AsyncClient(
+                limits=_limits(), timeout=DEFAULT_TIMEOUT, transport=transport)
+        return client
+
+
+def close() -> None:
+    """Close the sync clients (async clients are closed with `aclose()` on their loop)."""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+async def aclose() -> None:
+    """Close the async clients belonging to the running loop."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = list(_async_clients.pop(loop, {}).values())
+        _async_host_slots.pop(loop, None)
+    for client in clients:
+        await client.aclose()
+
+
+# --- Retrying requests for external APIs ---
+
+def _host(url: str) -> str:
+    return urlsplit(url).netloc or url
+
+
+def _retry_delay(attempt: int, response: httpx.Response | None, backoff: float) -> float:
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.replace(".", "", 1).isdigit():
+            return min(float(retry_after), MAX_RETRY_AFTER)
+    return backoff * (2 ** attempt) * (0.5 + random.random()) # Jittered exponential backoff
+
+
+def _should_retry(response: httpx.Response | None, error: Exception | None) -> bool:
+    if error is not None:
+        return isinstance(error, (httpx.TransportError, httpx.TimeoutException))
+    return response.status_code in RETRY_STATUSES
+
+
+def _clean_headers(kwargs: dict) -> dict:
+    # httpx rejects surrounding whitespace that requests tolerated (e.g. a
+    # generated "Bearer " header whose key is not configured)
+    headers = kwargs.get("headers")
+    if isinstance(headers, dict):
+        kwargs["headers"] = {k: v.strip() if isinstance(v, str) else v for k, v in headers.items()}
+    return kwargs
+
+
+def request(method: str, url: str, retries: int = RETRIES, backoff: float = BACKOFF, **kwargs) -> httpx.Response:
+    """
+    A request on the shared sync pool, at most HTTP_MAX_PER_HOST at a time per host,
+    retried with backoff. Returns the last response (check raise_for_status()) or raises
+    the last transport error.
+    """
+    host = _host(url)
+    kwargs = _clean_headers(kwargs)
+    with _lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = _host_slots[host] = threading.BoundedSemaphore(MAX_PER_HOST)
+    for attempt in range(retries + 1):
+        response, error = None, None
+        start_time = time.time()
+        try:
+            with slot:
+                response = get_client().request(method, url, **kwargs)
+        except Exception as e:
+            error = e
+        metrics.observe("http_request_seconds", time.time() - start_time, host=host)
+        if attempt == retries or not _should_retry(response, error):
+            break
+        delay = _retry_delay(attempt, response, backoff)
+        metrics.inc("http_retries_total", host=host)
+        log.info(f"{method} {host}: {error or response.status_code}; retry {attempt + 1}/{retries} in {delay:.1f}s")
+        time.sleep(delay)
+    if error is not None:
+        raise error
+    return response
+
+
+async def arequest(method: str, url: str, retries: int = RETRIES, backoff: float = BACKOFF, **kwargs) -> httpx.Response:
+    """Async request() on the loop's pooled client (must be called inside a running loop)."""
+    host = _host(url)
+    kwargs = _clean_headers(kwargs)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        slots = _for_loop(_async_host_slots, loop)
+        slot = slots.get(host)
+        if slot is None:
+            slot = slots[host] = asyncio.Semaphore(MAX_PER_HOST)
+    for attempt in range(retries + 1):
+        response, error = None, None
+        start_time = time.time()
+        try:
+            async with slot:
+                response = await get_async_client().request(method, url, **kwargs)
+        except Exception as e:
+            error = e
+        metrics.observe("http_request_seconds", time.time() - start_time, host=host)
+        if attempt == retries or not _should_retry(response, error):
+            break
+        delay = _retry_delay(attempt, response, backoff)
+        metrics.inc("http_retries_total", host=host)
+        log.info(f"{method} {host}: {error or response.status_code}; retry {attempt + 1}/{retries} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+    if error is not None:
+        raise error
+    return response
@@ -0,0 +1,249 @@
+# jobs.py
+"""
+Background jobs for long-running tools (nmap, masscan, amass, …).
+
+    job_id = await job_manager.submit("nmap", "-p- 10.0.0.0/24", channel_id=..., user_id=...)
+    job = job_manager.get(job_id)           # row from the jobs table
+    read_page(job["output_id"], page=2)     # (text, page, pages), see output_capture
+    await job_manager.cancel(job_id)
+
+Jobs are recorded in data/jobs.db. Their full output is streamed through an
+OutputCapture that always spills (data/outputs/<output_id>.txt.gz), so it is
+never truncated, survives restarts for OUTPUT_RETENTION_HOURS, and pages
+with `!page` like any other large output, even while the job is running.
+CLI tools run as async subprocesses (tool_runner.stream_cli): cancelling a
+job kills its process.
+A pool of worker tasks runs them under a global cap (JOB_MAX_CONCURRENCY)
+and per-tool caps (JOB_TOOL_CONCURRENCY, e.g. "nmap=2,masscan=1"; unlisted
+tools get JOB_DEFAULT_TOOL_CONCURRENCY). There is no timeout unless
+JOB_TIMEOUT is set. When a job finishes, `notify(job)` is awaited so the
+frontend can post to the channel that started it.
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+import metrics
+import tool_runner
+from output_capture import OutputCapture
+from tool_registry import TOOLS
+
+log = logging.getLogger("jobs")
+
+DATA_DIR = Path(__file__).parent / "data"
+DB_PATH = DATA_DIR / "jobs.db"
+
+MAX_CONCURRENCY = int(os.getenv("JOB_MAX_CONCURRENCY", 4))
+DEFAULT_TOOL_CONCURRENCY = int(os.getenv("JOB_DEFAULT_TOOL_CONCURRENCY", 1))
+TOOL_CONCURRENCY = {
+    name.strip(): int(limit)
+    for name, _, limit in (item.partition("=") for item in os.getenv("JOB_TOOL_CONCURRENCY", "").split(","))
+    if name.strip() and limit.strip()
+}
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", 0)) or None # Seconds; unset = run to completion
+FLUSH_INTERVAL = 5.0 # Seconds between making a running job's output readable
+
+ACTIVE_STATES = ("queued", "running")
+
+
+class JobManager:
+    """Persistent job table plus the worker pool that runs it."""
+
+    def __init__(self, db_path: Path = DB_PATH):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self._ensure_schema()
+        self.notify = None # async callable(job_row), set by the frontend
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self._tool_slots: dict[str, asyncio.Semaphore] = {}
+        self._running: dict[int, asyncio.Task] = {}
+
+    # ---------- private helpers ----------
+    def _ensure_schema(self):
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs(
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                tool        TEXT    NOT NULL,
+                arg         TEXT    NOT NULL,
+                status      TEXT    NOT NULL,
+                channel_id  INTEGER,
+                user_id     INTEGER,
+                created     REAL    NOT NULL,
+                started     REAL,
+                finished    REAL,
+                exit_code   INTEGER,
+                error       TEXT,
+                output_id   TEXT
+            )
+            """
+        )
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(jobs)")}
+        if "output_id" not in columns: # Tables created before outputs moved to output_capture
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN output_id TEXT")
+        self.conn.commit()
+
+    def _update(self, job_id: int, **fields):
+        columns = ", ".join(f"{k} = ?" for k in fields)
+        self.conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+        self.conn.commit()
+
+    def _tool_slot(self, tool: str) -> asyncio.Semaphore:
+        sem = self._tool_slots.get(tool)
+        if sem is None:
+            sem = self._tool_slots[tool] = asyncio.Semaphore(TOOL_CONCURRENCY.get(tool, DEFAULT_TOOL_CONCURRENCY))
+        return sem
+
+    # ---------- lifecycle ----------
+    def start(self):
+        """Starts the worker pool (once) and re-queues jobs left over from a previous run. Call inside the loop."""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        # A job that was running when the process died has partial output; mark it rather than rerun a scan
+        self.conn.execute(
+            "UPDATE jobs SET status = 'failed', finished = ?, error = 'interrupted by restart' WHERE status = 'running'",
+            (time.time(),))
+        self.conn.commit()
+        for row in self.conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id"):
+            self._queue.put_nowait(row["id"])
+        self._workers = [asyncio.get_running_loop().create_task(self._worker()) for _ in range(MAX_CONCURRENCY)]
+        log.info(f"Job workers started ({MAX_CONCURRENCY}); {self._queue.qsize()} queued job(s) resumed")
+
+    async def close(self):
+        for task in list(self._running.values()) + self._workers:
+            task.cancel()
+        await asyncio.gather(*self._running.values(), *self._workers, return_exceptions=True)
+        self._workers, self._queue = [], None
+
+    # ---------- public API ----------
+    async def submit(self, tool: str, arg: str, channel_id: int | None = None, user_id: int | None = None) -> int:
+        """Queues a tool run and returns its job id. Raises KeyError for an unknown tool."""
+        if tool not in TOOLS:
+            raise KeyError(tool)
+        self.start()
+        cur = self.conn.execute(
+            "INSERT INTO jobs(tool, arg, status, channel_id, user_id, created) VALUES (?,?,?,?,?,?)",
+            (tool, arg, "queued", channel_id, user_id, time.time()))
+        self.conn.commit()
+        job_id = cur.lastrowid
+        metrics.inc("jobs_submitted_total", tool=tool)
+        await self._queue.put(job_id)
+        return job_id
+
+    def get(self, job_id: int) -> sqlite3.Row | None:
+        return self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def recent(self, user_id: int | None = None, limit: int = 10) -> list[sqlite3.Row]:
+        """Active jobs first, then the most recent finished ones."""
+        where, params = ("WHERE user_id = ?", (user_id,)) if user_id is not None else ("", ())
+        return self.conn.execute(
+            f"SELECT * FROM jobs {where} ORDER BY status NOT IN {ACTIVE_STATES}, id DESC LIMIT ?",
+            (*params, limit)).fetchall()
+
+    async def cancel(self, job_id: int) -> bool:
+        """Cancels a queued or running job. False if it already finished (or does not exist)."""
+        job = self.get(job_id)
+        if job is None or job["status"] not in ACTIVE_STATES:
+            return False
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel() # The worker kills the process and records the status
+        else:
+            self._update(job_id, status="cancelled", finished=time.time())
+        return True
+
+    # ---------- workers ----------
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            job = self.get(job_id)
+            if job is None or job["status"] != "queued":
+                continue # Cancelled while waiting
+            async with self._tool_slot(job["tool"]):
+                if self.get(job_id)["status"] != "queued":
+                    continue
+                task = asyncio.current_task()
+                run = asyncio.ensure_future(self._run(job))
+                self._running[job_id] = run
+                try:
+                    await asyncio.shield(run)
+                except asyncio.CancelledError:
+                    if task.cancelling(): # The pool is shutting down
+                        run.cancel()
+                        raise
+                finally:
+                    self._running.pop(job_id, None)
+            job = self.get(job_id)
+            if self.notify is not None:
+                try:
+                    await self.notify(job)
+                except Exception as e:
+                    log.warning(f"Job {job_id} completion notice failed: {e}")
+
+    async def _run(self, job: sqlite3.Row):
+        job_id, tool, arg = job["id"], job["tool"], job["arg"]
+        capture = OutputCapture(tool, spill_chars=0) # Always on disk, so it pages even mid-run
+        self._update(job_id, status="running", started=time.time(), output_id=capture.id)
+        metrics.add_gauge("jobs_running", 1, tool=tool)
+        start_time = time.time()
+        status, exit_code, error = "done", None, None
+
+        async def flush(_tail: str):
+            capture.flush()
+
+        try:
+            with capture:
+                command = tool_runner.cli_command(tool, arg)
+                if command is not None:
+                    exit_code = await self._run_cli(command, capture, flush)
+                    status = "done" if exit_code == 0 else "failed"
+                else:
+                    result = await tool_runner.run_blocking(TOOLS[tool], arg, tool_class=tool_runner.tool_class(tool))
+                    capture.write(str(result))
+        except asyncio.CancelledError:
+            status, error = "cancelled", "cancelled"
+        except asyncio.TimeoutError:
+            status, error = "failed", f"timed out after {JOB_TIMEOUT:g}s"
+        except Exception as e:
+            status, error = "failed", str(e)
+        finally:
+            metrics.add_gauge("jobs_running", -1, tool=tool)
+        self._update(job_id, status=status, finished=time.time(), exit_code=exit_code, error=error)
+        metrics.inc("jobs_finished_total", tool=tool, status=status)
+        metrics.observe("job_run_seconds", time.time() - start_time, tool=tool)
+        log.info(f"Job {job_id} ({tool}) {status}")
+
+
+    async def _run_cli(self, command: tuple, capture: OutputCapture, flush) -> int:
+        argv, label, finish = command
+        error = None
+        try:
+            exit_code = await tool_runner.stream_cli(argv, capture, timeout=JOB_TIMEOUT, on_update=flush,
+                                                     update_interval=FLUSH_INTERVAL, label=label)
+            error = f"exit {exit_code}" if exit_code != 0 else None
+            return exit_code
+        except asyncio.CancelledError:
+            error = "cancelled"
+            raise
+        except asyncio.TimeoutError:
+            error = f"Timed-out (>{JOB_TIMEOUT:g}s)"
+            raise
+        except OSError as e:
+            error = str(e)
+            raise
+        finally:
+            if finish is not None:
+                # Structured wrappers (nmap) turn the run into their result, partial runs included
+                result = await asyncio.to_thread(finish, capture.summary(), error) if error != "cancelled" \
+                    else finish(capture.summary(), error)
+                if result:
+                    capture.write(f"\n{result}\n")
+
+
+job_manager = JobManager()
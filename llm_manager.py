@@ -1,79 +1,350 @@
 import logging
-from gpt4all import GPT4All
+import llama_local
 from llama_local import query_llama_local  # fallback
+from model_registry import registry
+from circuit_breaker import Backend, FallbackChain, CircuitOpenError
+import circuit_breaker
+import llm_router
 import os
 from utils.token_utils import truncate_to_token_limit
 from config.constants import CONTEXT_LIMIT
 import concurrent.futures
+import signal
+import threading
+import time
 import traceback
+import metrics
 
 log = logging.getLogger("llm_manager")
 _llm_instance = None
+_small_llm_instance = None
+
+# Seconds before a GPT4All generation counts as failed
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+# Backends tried in order; each has its own circuit breaker ("gpt4all", "ollama", "llama_local")
+FALLBACK_CHAIN = [b.strip() for b in os.getenv("LLM_FALLBACK_CHAIN", "gpt4all,llama_local").split(",") if b.strip()]
+# Optional Ollama fallback (only used when OLLAMA_MODEL is set and "ollama" is in the chain)
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+if "://" not in OLLAMA_HOST:
+    OLLAMA_HOST = "http://" + OLLAMA_HOST
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL")
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+ALL_DOWN_REPLY = "⚠️ All LLM backends are unavailable right now. Please try again shortly."
+# When set (e.g. "http://127.0.0.1:8088" or "unix:///tmp/offline-bot.sock"), get_llm() is a thin
+# client of `python main.py --serve` instead of loading a model into this process
+LLM_SERVER_URL = os.getenv("LLM_SERVER_URL")
+
+
+def _ollama_generate(prompt, **kwargs):
+    import http_client
+    options = {}
+    if 'max_tokens' in kwargs:
+        options['num_predict'] = kwargs['max_tokens']
+    if 'temperature' in kwargs:
+        options['temperature'] = kwargs['temperature']
+    if 'top_p' in kwargs:
+        options['top_p'] = kwargs['top_p']
+    if 'stop_sequences' in kwargs:
+        options['stop'] = kwargs['stop_sequences']
+    response = http_client.get_client().post(
+        f"{OLLAMA_HOST}/api/generate",
+        json={"model": OLLAMA_MODEL, "prompt": prompt, "stream": False, "keep_alive": OLLAMA_KEEP_ALIVE, "options": options},
+        timeout=LLM_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()["response"].strip()
+
+
+def _ollama_probe():
+    import http_client
+    return http_client.get_client().get(f"{OLLAMA_HOST}/api/tags", timeout=2.0).status_code == 200
+
+
+def _llama_local_generate(prompt, **kwargs):
+    output = query_llama_local(prompt)
+    if output.startswith(("[LLaMA Error]", "[Subprocess Crash]")):
+        raise RuntimeError(output)
+    return output
+
+
+def _llama_local_probe():
+    return os.path.exists(llama_local.BIN_PATH)
+
+
+class RemoteLLM:
+    """LLMManager-compatible client for the shared model server (see src/server.py)."""
+
+    def __init__(self, server_url: str):
+        import http_client
+        self.server_url = server_url
+        self.base_url, self.uds = http_client.split_url(server_url)
+        self.model = server_url # Truthy: the model lives in the server process
+        self.breaker = circuit_breaker.get_breaker(f"server:{server_url}")
+        log.info(f"🧠 Using the LLM server at {server_url}")
+
+    def close(self):
+        pass
+
+    def warm_up(self, prompt: str = "Hello", max_tokens: int = 8):
+        """The server warms its own model; just check that it answers."""
+        import http_client
+        http_client.get_client(self.uds).get(f"{self.base_url}/health", timeout=5.0).raise_for_status()
+
+    def _chat(self, prompt, **kwargs):
+        import http_client
+        payload = {"messages": [{"role": "user", "content": prompt}], "stream": False}
+        for key in ('max_tokens', 'temperature', 'top_p'):
+            if key in kwargs:
+                payload[key] = kwargs[key]
+        if 'stop_sequences' in kwargs:
+            payload['stop'] = kwargs['stop_sequences']
+        response = http_client.get_client(self.uds).post(
+            f"{self.base_url}/v1/chat/completions", json=payload, timeout=LLM_TIMEOUT)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"].strip()
+
+    def generate_text(self, prompt, **kwargs):
+        usable_tokens = CONTEXT_LIMIT - kwargs.get("max_tokens", 256)
+        trimmed_prompt = truncate_to_token_limit(prompt, usable_tokens)
+        try:
+            return self.breaker.call(self._chat, trimmed_prompt, **kwargs)
+        except Exception as e:
+            log.error(f"🔥 LLM server request failed: {str(e) or type(e).__name__}")
+            return ALL_DOWN_REPLY
+
 
 class LLMManager:
     def __init__(self, model_path: str):
-        self.model = None
         self.model_path = model_path
+        self._load_failed = False
+        # Shared with tools/gpt4all.py (and any other consumer) through the model registry
+        self._handle = registry.acquire("gpt4all", model_path)
         log.info(f"🧠 Loading GPT4All model from: {model_path}")
         log.info(f"[LLMManager] Attempting to load GPT4All model from path: {self.model_path}")
         try:
-            # Try by name first (hosted or cache), allow download
-            self.model = GPT4All(self.model_path, allow_download=True)
-        except FileNotFoundError:
-            log.warning(f"[LLMManager] Model not found in cache, falling back to local file path {model_path}")
-            try:
-                self.model = GPT4All(self.model_path, allow_download=False)
-            except Exception as e:
-                log.error(f"❌ Failed to load GPT4All model: {e}", exc_info=True)
-                self.model = None
+            self._handle.get()
         except Exception as e:
             log.error(f"❌ Failed to load GPT4All model: {e}", exc_info=True)
-            self.model = None
+            self._load_failed = True
+        # A generation that timed out and is still running; GPT4All is unhealthy until it finishes
+        self._stuck = None
+        # generate_text() calls in progress, so a hot swap can wait for them before unloading
+        self._in_flight = 0
+        self._idle = threading.Condition()
+        self.backend_name = f"gpt4all:{os.path.basename(model_path)}"
+        self.chain = self._build_chain()
 
-    def generate_text(self, prompt, **kwargs):
-        if self.model is None:
-            log.warning("⚠️ LLM not loaded, falling back to llama_local")
-            return "⚠️ Fallback: " + query_llama_local(prompt)
+    def _build_chain(self) -> FallbackChain:
+        backends = []
+        for name in FALLBACK_CHAIN:
+            if name == "gpt4all":
+                backends.append(Backend(self.backend_name, self._generate_gpt4all, probe=self._probe_gpt4all))
+            elif name == "ollama":
+                if OLLAMA_MODEL:
+                    backends.append(Backend("ollama", _ollama_generate, probe=_ollama_probe))
+                else:
+                    log.warning("'ollama' is in LLM_FALLBACK_CHAIN but OLLAMA_MODEL is not set; skipping it.")
+            elif name == "llama_local":
+                backends.append(Backend("llama_local", _llama_local_generate, probe=_llama_local_probe))
+            else:
+                log.warning(f"Unknown backend '{name}' in LLM_FALLBACK_CHAIN; skipping it.")
+        log.info(f"[LLMManager] Fallback chain: {[b.name for b in backends]}")
+        return FallbackChain(backends)
+
+    def _probe_gpt4all(self) -> bool:
+        # Cheap: no generation, and never triggers a reload of an evicted model
+        return not self._load_failed and (self._stuck is None or self._stuck.done())
+
+    @property
+    def model(self):
+        """The loaded GPT4All model (reloaded by the registry if it was evicted), or None."""
+        if self._load_failed:
+            return None
         try:
-            usable_tokens = CONTEXT_LIMIT - kwargs.get("max_tokens", 256)
-            trimmed_prompt = truncate_to_token_limit(prompt, usable_tokens)
-            log.debug(f"[Prompt] {trimmed_prompt}")
-
-            # Map kwargs to GPT4All.generate params
-            gen_kwargs = {}
-            # Map max_tokens to n_predict
-            if 'max_tokens' in kwargs:
-                gen_kwargs['n_predict'] = kwargs.pop('max_tokens')
-            # Map temperature to temp
-            if 'temperature' in kwargs:
-                gen_kwargs['temp'] = kwargs.pop('temperature')
-            # Map other parameters if needed (top_p, stop_sequences)
-            if 'top_p' in kwargs:
-                gen_kwargs['top_p'] = kwargs.pop('top_p')
-            if 'stop_sequences' in kwargs:
-                gen_kwargs['stop'] = kwargs.pop('stop_sequences')
-
-            def _generate():
-                return self.model.generate(trimmed_prompt, **gen_kwargs)
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                future = executor.submit(_generate)
-                result = future.result(timeout=60)  # a minute timeout
-                log.debug(f"[Response] {result}")
-                return result.strip()
+            return self._handle.get()
+        except Exception as e:
+            log.error(f"❌ Failed to reload GPT4All model: {e}", exc_info=True)
+            self._load_failed = True
+            return None
+
+    def close(self, unload: bool = False):
+        """Drop this manager's reference; the registry frees the model when it needs the RAM (or now, with unload=True)."""
+        # The probe is bound to this manager; left registered, it would keep it (and its stuck thread) alive
+        circuit_breaker.prober.unregister(self.backend_name, self._probe_gpt4all)
+        self._handle.release(unload=unload)
 
+    def drain(self, timeout: float | None = None) -> bool:
+        """Wait until no generate_text() call is running. Returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._in_flight == 0, timeout=timeout)
+
+    def warm_up(self, prompt: str = "Hello", max_tokens: int = 8):
+        """Run a tiny generation so the weights are paged in before the first user message."""
+        if self.model is None:
+            return
+        self.model.generate(prompt, n_predict=max_tokens, temp=0.0)
+
+    def _generate_gpt4all(self, prompt, **kwargs):
+        """Generate with the GPT4All model; raises on failure or after LLM_TIMEOUT seconds."""
+        if self.model is None:
+            raise RuntimeError("GPT4All model is not loaded")
+
+        # Map kwargs to GPT4All.generate params
+        gen_kwargs = {}
+        # Map max_tokens to n_predict
+        if 'max_tokens' in kwargs:
+            gen_kwargs['n_predict'] = kwargs['max_tokens']
+        # Map temperature to temp
+        if 'temperature' in kwargs:
+            gen_kwargs['temp'] = kwargs['temperature']
+        # Map other parameters if needed (top_p, stop_sequences)
+        if 'top_p' in kwargs:
+            gen_kwargs['top_p'] = kwargs['top_p']
+        if 'stop_sequences' in kwargs:
+            gen_kwargs['stop'] = kwargs['stop_sequences']
+
+        def _generate():
+            with self._handle as model: # Pin the model so it isn't evicted mid-generation
+                return model.generate(prompt, **gen_kwargs)
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(_generate)
+        try:
+            result = future.result(timeout=LLM_TIMEOUT)
         except concurrent.futures.TimeoutError:
-            log.error("🔥 GPT4All generation timed out after 60 seconds.")
-            return "🔥 Timeout: " + query_llama_local(prompt)
+            self._stuck = future
+            log.error(f"🔥 GPT4All generation timed out after {LLM_TIMEOUT:.0f} seconds.")
+            # A wedged model won't do better on the next request: open its breaker right away
+            circuit_breaker.get_breaker(self.backend_name).trip()
+            raise
+        finally:
+            # Don't wait for a timed-out generation to finish
+            executor.shutdown(wait=False)
+        log.debug(f"[Response] {result}")
+        return result.strip()
+
+    def generate_text(self, prompt, **kwargs):
+        """
+        Generate with the first healthy backend of the fallback chain.
+        Backends whose circuit breaker is open are skipped without being called.
+        """
+        with self._idle:
+            self._in_flight += 1
+        try:
+            return self._generate_text(prompt, **kwargs)
+        finally:
+            with self._idle:
+                self._in_flight -= 1
+                self._idle.notify_all()
+
+    def _generate_text(self, prompt, **kwargs):
+        usable_tokens = CONTEXT_LIMIT - kwargs.get("max_tokens", 256)
+        trimmed_prompt = truncate_to_token_limit(prompt, usable_tokens)
+        log.debug(f"[Prompt] {trimmed_prompt}")
+        try:
+            backend, result = self.chain.call(trimmed_prompt, **kwargs)
+        except CircuitOpenError as e:
+            log.error(f"🔥 {e}")
+            return ALL_DOWN_REPLY
         except Exception as e:
             trace = traceback.format_exc()
             log.error(f"🔥 Generation error: {e}\n{trace}")
-            return "🔥 Fallback: " + query_llama_local(prompt)
+            return ALL_DOWN_REPLY
+        if self.chain.backends and backend != self.chain.backends[0].name:
+            log.warning(f"⚠️ Answer served by fallback backend '{backend}'")
+            return "⚠️ Fallback: " + result
+        return result
 
 def get_llm():
     global _llm_instance
+    if _llm_instance is None and LLM_SERVER_URL:
+        _llm_instance = RemoteLLM(LLM_SERVER_URL)
     if _llm_instance is None:
         # Use env var or default
         model_path = os.getenv("GPT4ALL_MODEL_PATH", "Meta-Llama-3-8B-Instruct")
         _llm_instance = LLMManager(model_path)
     return _llm_instance
+
+def get_small_llm():
+    """The small, fast model used for routing and short replies (None if not configured)."""
+    global _small_llm_instance
+    if LLM_SERVER_URL:
+        return None # The server decides which model answers
+    if _small_llm_instance is None:
+        model_path = os.getenv("SMALL_GPT4ALL_MODEL_PATH")
+        if not model_path:
+            return None
+        _small_llm_instance = LLMManager(model_path)
+    return _small_llm_instance
+
+def get_llm_for(user_message: str, task: str = None, prompt: str = None):
+    """
+    Route a request to the small or the large model (see llm_router for the rules).
+    Pass the full `prompt` that will be sent (memory and history included): its size
+    decides too, so a short message with a long context never lands on the small model.
+    """
+    messages = user_message if prompt is None else \
+        [{"role": "system", "content": prompt}, {"role": "user", "content": user_message}]
+    if llm_router.choose_backend(messages, task=task) == llm_router.SMALL:
+        small = get_small_llm()
+        if small is not None and small.model is not None:
+            log.debug("[Router] small model selected")
+            return small
+    return get_llm()
+
+_swap_lock = threading.Lock()
+
+def swap_model(model_path: str, drain_timeout: float | None = None) -> LLMManager:
+    """
+    Zero-downtime model change. The new model is loaded and warmed up while the current one
+    keeps serving; get_llm() then returns the new manager, requests already running finish
+    on the old model, and the old model is unloaded. Blocks until done (run it in a thread).
+    Raises:
+        RuntimeError: If the new model cannot be loaded (the current model stays active).
+    """
+    global _llm_instance
+    if LLM_SERVER_URL:
+        raise RuntimeError("The model is served by LLM_SERVER_URL; swap it on the server instead.")
+    with _swap_lock:
+        start = time.perf_counter()
+        log.info(f"🔁 Hot swap: loading {model_path} while the current model keeps serving")
+        new = LLMManager(model_path)
+        if new._load_failed:
+            new.close(unload=True)
+            raise RuntimeError(f"Could not load {model_path}; keeping the current model.")
+        new.warm_up()
+        old, _llm_instance = _llm_instance, new
+        metrics.inc("llm_model_swaps_total")
+        metrics.observe("llm_model_swap_seconds", time.perf_counter() - start)
+        log.info(f"🔁 Hot swap: now serving {model_path} (ready in {time.perf_counter() - start:.1f}s)")
+        if old is not None and old is not new:
+            if not old.drain(timeout=drain_timeout if drain_timeout is not None else LLM_TIMEOUT * 2):
+                log.warning(f"🔁 Hot swap: {old.model_path} still busy; unloading it anyway")
+            old.close(unload=True)
+        return new
+
+def install_reload_signal() -> None:
+    """
+    On SIGHUP, re-read .env and hot-swap to GPT4ALL_MODEL_PATH if it changed (POSIX only;
+    on Windows use the `!swapmodel` admin command).
+    """
+    if not hasattr(signal, "SIGHUP"):
+        return
+
+    def swap():
+        from dotenv import load_dotenv
+        load_dotenv(override=True)
+        model_path = os.getenv("GPT4ALL_MODEL_PATH", "Meta-Llama-3-8B-Instruct")
+        if _llm_instance is not None and getattr(_llm_instance, "model_path", None) == model_path:
+            log.info(f"🔁 SIGHUP: GPT4ALL_MODEL_PATH unchanged ({model_path}); nothing to swap")
+            return
+        try:
+            swap_model(model_path)
+        except Exception as e:
+            log.error(f"🔁 Hot swap to {model_path} failed: {e}")
+
+    signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=swap, name="llm-hot-swap", daemon=True).start())
+
+def backend_states() -> dict:
+    """Circuit breaker state per LLM backend ({name: 'closed' | 'half_open' | 'open'})."""
+    return circuit_breaker.states()
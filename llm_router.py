@@ -0,0 +1,107 @@
+# llm_router.py
+"""
+Routing rules for the small/large model split.
+
+Cheap work – deciding whether a message is small talk or a tool request,
+extracting a tool call, short replies – goes to a small quantized model.
+Long-form answers go to the big model. The rules only look at the prompt, so
+they are shared by `src/llm_interface.RoutedLLMInterface` and
+`llm_manager.get_llm_for()`.
+"""
+import functools
+import re
+
+SMALL = "small"
+LARGE = "large"
+
+# Tasks that always go to the small model, whatever the prompt looks like
+SMALL_TASKS = {"classify", "tool_call", "short_reply"}
+
+DEFAULT_RULES = {
+    # User messages up to this many characters count as "short"
+    "short_reply_chars": 200,
+    # ...but only if the whole prompt stays under this estimated token count
+    "max_small_prompt_tokens": 1024,
+    # Requests containing any of these words want a long-form answer
+    "long_form_keywords": [
+        "explain", "describe", "write", "summarize", "summarise", "compare",
+        "analyze", "analyse", "report", "essay", "story", "step by step",
+        "in detail", "how do", "how does", "how to", "why",
+    ],
+}
+
+_SMALL_TALK = re.compile(
+    r"^\s*(hi|hey|hello|yo|sup|thanks|thank you|thx|ok|okay|cool|nice|lol|gm|gn|good (morning|night))\b",
+    re.IGNORECASE,
+)
+_TOOL_HINT = re.compile(r"\b(whois|ipinfo|geocode|lookup|look up|scan|search|find|nmap|shodan)\b", re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=8)
+def _keyword_pattern(keywords: tuple) -> re.Pattern:
+    """One regex matching any of the keywords as whole words ("why" but not "whyte")."""
+    alternatives = "|".join(r"\s+".join(map(re.escape, k.split())) for k in keywords)
+    return re.compile(rf"\b(?:{alternatives})\b", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 chars per token), good enough for routing."""
+    return len(text) // 4 + 1
+
+
+def classify_intent(text: str, rules: dict | None = None) -> str:
+    """Return 'small_talk', 'tool', 'long_form' or 'question' for a user message."""
+    rules = {**DEFAULT_RULES, **(rules or {})}
+    if rules["long_form_keywords"] and _keyword_pattern(tuple(rules["long_form_keywords"])).search(text):
+        return "long_form"
+    if _SMALL_TALK.match(text) and len(text) <= rules["short_reply_chars"]:
+        return "small_talk"
+    if _TOOL_HINT.search(text):
+        return "tool"
+    return "question"
+
+
+def choose_backend(messages: list | str, task: str | None = None, rules: dict | None = None) -> str:
+    """
+    Pick SMALL or LARGE for a request.
+
+    Args:
+        messages (list | str): OpenAI-style message list, or a raw prompt string.
+        task (str, optional): Explicit task hint, e.g. 'classify' or 'tool_call'.
+        rules (dict, optional): Overrides for DEFAULT_RULES.
+    Returns:
+        str: SMALL or LARGE.
+    """
+    rules = {**DEFAULT_RULES, **(rules or {})}
+    if task in SMALL_TASKS:
+        return SMALL
+    if task == "long_form":
+        return LARGE
+
+    if isinstance(messages, str):
+        prompt_text, last_role, last_user = messages, "user", messages
+    else:
+        prompt_text = "\n".join(str(m.get("content", "")) for m in messages)
+        last_role = messages[-1].get("role") if messages else "user"
+        last_user = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+
+    # Turning a tool result into an answer is the long-form part of a tool loop
+    if last_role == "tool":
+        return LARGE
+    if estimate_tokens(prompt_text) > rules["max_small_prompt_tokens"]:
+        return LARGE
+
+    intent = classify_intent(last_user, rules)
+    if intent in ("small_talk", "tool"):
+        return SMALL
+    if intent == "question" and len(last_user) <= rules["short_reply_chars"]:
+        return SMALL
+    return LARGE
+
+
+def looks_like_tool_call(text: str) -> bool:
+    """Cheap check for the JSON tool-call format described in src/tools.py."""
+    stripped = text.strip().strip("`").strip()
+    if stripped.startswith("json"):
+        stripped = stripped[4:].lstrip()
+    return stripped.startswith("{") and '"tool_name"' in stripped
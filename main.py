@@ -1,25 +1,48 @@
 import argparse
 import logging
+import signal
 import sys
 import os
+import threading
 
-# Adjust path to import from src directory
+# The src modules are a package (relative imports) that also imports project root modules,
+# so the project root goes on the path whichever directory this is started from
 current_dir = os.path.dirname(os.path.abspath(__file__))
-sys.path.insert(0, os.path.join(current_dir, 'src'))
+sys.path.insert(0, current_dir)
 
-# Now import modules from src
 try:
-    from utils import load_config, setup_logging
-    from llm_interface import get_llm_interface, LLMInterface
-    from memory import ChatMemory
-    from cli_interface import run_cli_loop
-    from discord_bot import run_discord_bot
+    from src.utils import load_config, setup_logging
+    from src.llm_interface import get_llm_interface, LLMInterface, HotSwapInterface
+    from src.memory import ChatMemory
+    from src.cli_interface import run_cli_loop
+    from src.server import run_server
+    from src.tools import build_tool_call_grammar
+    import model_lifecycle
+    import autotune
 except ImportError as e:
      print(f"Error importing necessary modules: {e}")
-     print("Please ensure the script is run from the project root directory or that the 'src' directory is in the Python path.")
+     print("Please install the dependencies listed in requirements.txt.")
      sys.exit(1)
 
 
+def _install_reload_signal(llm: HotSwapInterface, config_path: str):
+    """SIGHUP re-reads the config file and hot-swaps the model in the background (POSIX only)."""
+    if not hasattr(signal, 'SIGHUP'):
+        return
+
+    def swap():
+        try:
+            llm.swap(load_config(config_path=config_path))
+        except Exception as e:
+            logging.error(f"Hot swap failed; still serving '{llm.get_model_name()}': {e}", exc_info=True)
+
+    def on_sighup(signum, frame):
+        logging.info("SIGHUP received: reloading the configuration and swapping in the configured model.")
+        threading.Thread(target=swap, name="llm-hot-swap", daemon=True).start()
+
+    signal.signal(signal.SIGHUP, on_sighup)
+
+
 def main():
     """Main entry point for the Offline LLM Bot."""
     setup_logging() # Configure logging first
@@ -34,6 +57,34 @@ def main():
         default='config/config.yaml', # Default path relative to project root
         help='Path to the configuration file (YAML).'
     )
+    parser.add_argument(
+        '--autotune',
+        action='store_true',
+        help='Benchmark the configured llama_cpp model on this host, save the best n_threads/n_batch/n_ctx to config/profiles/<hostname>.yaml and exit.'
+    )
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Serve the loaded model (OpenAI-compatible /v1/chat/completions and /tools/{name}) to other processes instead of running a chat interface.'
+    )
+    parser.add_argument(
+        '--host',
+        type=str,
+        default=None,
+        help='Address for --serve (overrides server.host).'
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=None,
+        help='Port for --serve (overrides server.port).'
+    )
+    parser.add_argument(
+        '--unix-socket',
+        type=str,
+        default=None,
+        help='Serve on this Unix socket instead of TCP (overrides server.unix_socket).'
+    )
     parser.add_argument(
         '--interface',
         type=str,
@@ -58,10 +109,34 @@ def main():
         # Pass the absolute path to load_config
         config = load_config(config_path=config_path)
 
-        # --- Initialize LLM ---
+        # --- Autotune (benchmark only, then exit) ---
+        if args.autotune:
+            if config['llm']['type'].lower() != 'llama_cpp':
+                raise ValueError("--autotune only supports the 'llama_cpp' LLM type.")
+            params, path = autotune.autotune_and_save(
+                config['llm']['model_path'], n_gpu_layers=config['llm'].get('n_gpu_layers', 0))
+            print(f"\nBest settings: {params}\nSaved to {path} (applied automatically on the next start).")
+            return
+
+        # --- Initialize LLM (load + warm-up lifecycle stage) ---
         logging.info("Initializing LLM...")
-        llm = get_llm_interface(config)
+        warmup_cfg = config['llm'].get('warmup', {})
+        warm = None
+        if warmup_cfg.get('enabled', True):
+            warm = lambda m: m.warm_up(warmup_cfg.get('prompt', 'Hello'), warmup_cfg.get('max_tokens', 8))
+        llm = model_lifecycle.load_and_warm(f"llm:{config['llm']['type']}", lambda: get_llm_interface(config), warm)
+        model_lifecycle.mark_ready()
         logging.info(f"LLM Initialized: Type={config['llm']['type']}, Model={llm.get_model_name()}")
+        # Changing llm.model_path (or any llm setting) then `kill -HUP <pid>` swaps models without a restart
+        llm = HotSwapInterface(config, llm)
+        _install_reload_signal(llm, config_path)
+
+        # --- Server mode: one resident model for every frontend process ---
+        if args.serve:
+            if config.get('tools', {}).get('enabled', False):
+                llm.set_tool_grammar(build_tool_call_grammar()) # Used only if llm.tool_grammar is on
+            run_server(config, llm, host=args.host, port=args.port, unix_socket=args.unix_socket)
+            return
 
         # --- Determine Interface ---
         # Command-line argument takes precedence over config file
@@ -79,6 +154,8 @@ def main():
 
         # --- Run Selected Interface ---
         if run_discord_mode:
+            # Imported here so the other modes don't need discord.py installed
+            from src.discord_bot import run_discord_bot
             # Discord bot manages its own memory instances per channel/DM
             run_discord_bot(config, llm)
         else:
@@ -0,0 +1,138 @@
+# metrics.py
+"""
+Tiny in-process metrics registry: counters, gauges and windowed histograms.
+
+No external dependency; every subsystem (LLM backends, breakers, caches, rate
+limiters, …) records here and `snapshot()` / `render_text()` expose the lot.
+`render_text()` emits the Prometheus text format so the numbers can be
+scraped later without changing call sites.
+
+    metrics.inc("llm_requests_total", backend="ollama")
+    metrics.observe("llm_latency_seconds", 1.7, backend="ollama")
+    metrics.set_gauge("breaker_state", 1, backend="gpt4all")
+    metrics.quantile("llm_latency_seconds", 0.95, backend="ollama")
+"""
+import threading
+from collections import deque
+
+# Observations kept per histogram series for quantiles
+HISTOGRAM_WINDOW = 1024
+
+_lock = threading.Lock()
+_counters: dict[tuple, float] = {}
+_gauges: dict[tuple, float] = {}
+_histograms: dict[tuple, dict] = {}
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+def inc(name: str, value: float = 1.0, **labels) -> None:
+    """Add `value` to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Set a gauge to `value`."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def add_gauge(name: str, delta: float, **labels) -> None:
+    """Move a gauge up or down (e.g. in-flight requests, queue depth)."""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = _gauges.get(key, 0.0) + delta
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record one histogram observation."""
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = {"count": 0, "sum": 0.0, "window": deque(maxlen=HISTOGRAM_WINDOW)}
+        h["count"] += 1
+        h["sum"] += value
+        h["window"].append(value)
+
+
+def quantile(name: str, q: float, **labels) -> float | None:
+    """q-quantile (0..1) over the recent window of a histogram, or None without data."""
+    with _lock:
+        h = _histograms.get(_key(name, labels))
+        values = sorted(h["window"]) if h else []
+    if not values:
+        return None
+    idx = min(len(values) - 1, max(0, round(q * (len(values) - 1))))
+    return values[idx]
+
+
+def count(name: str, **labels) -> int:
+    """Total observations recorded for a histogram."""
+    with _lock:
+        h = _histograms.get(_key(name, labels))
+        return h["count"] if h else 0
+
+
+def get_counter(name: str, **labels) -> float:
+    with _lock:
+        return _counters.get(_key(name, labels), 0.0)
+
+
+def get_gauge(name: str, **labels) -> float | None:
+    with _lock:
+        return _gauges.get(_key(name, labels))
+
+
+def snapshot() -> dict:
+    """Plain-dict view of every series, for logging or JSON endpoints."""
+    def fmt(key):
+        name, labels = key
+        return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+    with _lock:
+        hist = {k: (h["count"], h["sum"], sorted(h["window"])) for k, h in _histograms.items()}
+        out = {
+            "counters": {fmt(k): v for k, v in _counters.items()},
+            "gauges": {fmt(k): v for k, v in _gauges.items()},
+            "histograms": {},
+        }
+    for k, (count, total, values) in hist.items():
+        pick = lambda q: values[min(len(values) - 1, round(q * (len(values) - 1)))] if values else None
+        out["histograms"][fmt(k)] = {"count": count, "sum": round(total, 6), "p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99)}
+    return out
+
+
+def render_text() -> str:
+    """Prometheus text exposition of every series (histograms as summaries)."""
+    def series(name, labels, extra=()):
+        pairs = list(labels) + list(extra)
+        return name + ("{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else "")
+
+    lines = []
+    with _lock:
+        for (name, labels), v in sorted(_counters.items()):
+            lines.append(f"{series(name, labels)} {v}")
+        for (name, labels), v in sorted(_gauges.items()):
+            lines.append(f"{series(name, labels)} {v}")
+        hist = sorted((k, h["count"], h["sum"], sorted(h["window"])) for k, h in _histograms.items())
+    for (name, labels), count, total, values in hist:
+        for q in (0.5, 0.95, 0.99):
+            if values:
+                v = values[min(len(values) - 1, round(q * (len(values) - 1)))]
+                lines.append(f"{series(name, labels, [('quantile', q)])} {v}")
+        lines.append(f"{series(name + '_count', labels)} {count}")
+        lines.append(f"{series(name + '_sum', labels)} {total}")
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    """Clear every series (benchmarks use this between runs)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
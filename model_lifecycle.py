@@ -0,0 +1,143 @@
+# model_lifecycle.py
+"""
+Startup lifecycle for local models: preload, warm-up and readiness gating.
+
+Instead of paying a cold load (plus page faults on the mmap'd weights) on the
+first user message, the bot calls `preload()` once at startup. Every configured
+model is loaded, run through a tiny generation to fault its weights into RAM,
+and only then is `READY` set. Message handlers wait on `READY` before touching
+a model.
+
+Which models get preloaded is controlled by PRELOAD_MODELS (comma separated):
+  • llm_manager – the GPT4All model behind `llm_manager.get_llm()` (default)
+  • llm_small   – the small routing model behind `llm_manager.get_small_llm()`
+  • llama_cpp   – the llama-cpp-python model in `tools/llama_cpp.py`
+  • gpt4all     – the GPT4All model in `tools/gpt4all.py`
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger("model_lifecycle")
+
+# Set once every configured model has been loaded and warmed up (or failed to).
+READY = threading.Event()
+
+# name -> {"load_s": float, "warmup_s": float}
+TIMINGS: dict[str, dict[str, float]] = {}
+
+PRELOAD_MODELS = [m.strip() for m in os.getenv("PRELOAD_MODELS", "llm_manager").split(",") if m.strip()]
+WARMUP_PROMPT = os.getenv("MODEL_WARMUP_PROMPT", "Hello")
+WARMUP_TOKENS = int(os.getenv("MODEL_WARMUP_TOKENS", 8))
+
+
+def _llm_manager_target():
+    from llm_manager import get_llm
+    return get_llm, lambda llm: llm.warm_up(WARMUP_PROMPT, WARMUP_TOKENS)
+
+
+def _llm_small_target():
+    from llm_manager import get_small_llm
+    return get_small_llm, lambda llm: llm.warm_up(WARMUP_PROMPT, WARMUP_TOKENS)
+
+
+def _llama_cpp_target():
+    from tools import llama_cpp
+    return llama_cpp.load_model, lambda _m: llama_cpp.warm_up(WARMUP_PROMPT, WARMUP_TOKENS)
+
+
+def _gpt4all_target():
+    from tools import gpt4all
+    return gpt4all.load_model, lambda _m: gpt4all.warm_up(WARMUP_PROMPT, WARMUP_TOKENS)
+
+
+# name -> factory returning (loader, warmer). Factories import lazily so that
+# only the configured backends are ever imported.
+TARGETS = {
+    "llm_manager": _llm_manager_target,
+    "llm_small": _llm_small_target,
+    "llama_cpp": _llama_cpp_target,
+    "gpt4all": _gpt4all_target,
+}
+
+
+def load_and_warm(name: str, loader, warm=None):
+    """
+    Run one lifecycle stage: load a model, optionally warm it up, record timings.
+
+    Args:
+        name (str): Label used in logs and in `TIMINGS`.
+        loader (callable): Zero-argument callable returning the loaded model.
+        warm (callable, optional): Called with the loaded model to run a short generation.
+
+    Returns:
+        The object returned by `loader`. Load errors propagate; warm-up errors
+        are only logged since the model is still usable.
+    """
+    start = time.perf_counter()
+    model = loader()
+    load_s = time.perf_counter() - start
+    TIMINGS[name] = {"load_s": load_s, "warmup_s": 0.0}
+    log.info(f"🧠 [{name}] Loaded in {load_s:.2f}s")
+
+    if warm is not None and model is not None:
+        start = time.perf_counter()
+        try:
+            warm(model)
+            TIMINGS[name]["warmup_s"] = time.perf_counter() - start
+            log.info(f"🔥 [{name}] Warm-up finished in {TIMINGS[name]['warmup_s']:.2f}s")
+        except Exception as e:
+            log.warning(f"⚠️ [{name}] Warm-up failed: {e}")
+    return model
+
+
+def preload(targets: list[str] | None = None) -> dict[str, dict[str, float]]:
+    """
+    Load and warm up every configured model, then mark the bot as ready.
+
+    Safe to call from a background thread. `READY` is always set at the end,
+    even if some models failed, so handlers fall back to their usual error
+    paths instead of waiting forever.
+    """
+    targets = PRELOAD_MODELS if targets is None else targets
+    log.info(f"Preloading models: {targets}")
+    try:
+        for name in targets:
+            factory = TARGETS.get(name)
+            if factory is None:
+                log.warning(f"⚠️ Unknown preload target '{name}' (known: {list(TARGETS)})")
+                continue
+            try:
+                loader, warm = factory()
+                load_and_warm(name, loader, warm)
+            except Exception as e:
+                log.error(f"❌ [{name}] Preload failed: {e}", exc_info=True)
+    finally:
+        mark_ready()
+    return TIMINGS
+
+
+def start_preload_thread(targets: list[str] | None = None) -> threading.Thread:
+    """Run `preload()` in a daemon thread so it overlaps with e.g. Discord login."""
+    t = threading.Thread(target=preload, args=(targets,), name="model-preload", daemon=True)
+    t.start()
+    return t
+
+
+def mark_ready() -> None:
+    if not READY.is_set():
+        READY.set()
+        total = sum(t["load_s"] + t["warmup_s"] for t in TIMINGS.values())
+        log.info(f"✅ Models ready ({total:.2f}s total load + warm-up)")
+
+
+def is_ready() -> bool:
+    return READY.is_set()
+
+
+async def wait_ready() -> None:
+    """Await readiness without blocking the event loop."""
+    if not READY.is_set():
+        await asyncio.to_thread(READY.wait)
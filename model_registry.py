@@ -0,0 +1,276 @@
+# model_registry.py
+"""
+Process-wide registry for loaded models.
+
+Every consumer (tools/llama_cpp.py, tools/gpt4all.py, tools/ollama_tool.py,
+llm_manager.LLMManager, src/llm_interface.LlamaCPPInterface) acquires a
+`ModelHandle` here instead of constructing `Llama(...)` / `GPT4All(...)`
+itself, so the same GGUF is resident at most once per backend.
+
+  • Deduplication – entries are keyed by (backend kind, normalised model path,
+                     load parameters), so a consumer never gets a model loaded
+                     with another consumer's n_ctx / n_gpu_layers / speculative
+                     config. Parameters are plain values: the llama_cpp loader
+                     builds the draft model from the `speculative` spec itself.
+  • Ref-counting   – `acquire()` / `release()` track live handles.
+  • Lazy loading   – nothing is loaded until a handle is first used.
+  • LRU eviction   – when MODEL_RAM_BUDGET_MB would be exceeded, the least
+                     recently used idle models are unloaded (unreferenced ones
+                     first). Their handles transparently reload on next use.
+
+Usage:
+    handle = registry.acquire("llama_cpp", path, n_ctx=4096)
+    with handle as model:          # pins the model while generating
+        model.create_completion(...)
+    handle.release()               # when the consumer is done for good
+"""
+import gc
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger("model_registry")
+
+# 0 disables the budget (never evict)
+MODEL_RAM_BUDGET_MB = int(os.getenv("MODEL_RAM_BUDGET_MB", 0))
+
+# Loader parameters that don't change the loaded model, so they don't split entries
+NON_LOAD_PARAMS = {"verbose"}
+
+
+# ---------------------------------------------------------------------------
+# Loaders (imported lazily so unused backends are never imported)
+# ---------------------------------------------------------------------------
+def _load_llama_cpp(path: str, speculative: dict | None = None, **params):
+    from llama_cpp import Llama
+    if speculative: # The draft belongs to this model instance, so it is built with it
+        from speculative import build_draft
+        params["draft_model"] = build_draft(speculative)
+    return Llama(model_path=path, **params)
+
+
+def _load_gpt4all(path: str, **params):
+    from gpt4all import GPT4All
+    if "allow_download" in params:
+        return GPT4All(path, **params)
+    try:
+        # Try by name first (hosted or cache), allow download
+        return GPT4All(path, allow_download=True, **params)
+    except FileNotFoundError:
+        log.warning(f"[gpt4all] Model not found in cache, falling back to local file path {path}")
+        return GPT4All(path, allow_download=False, **params)
+
+
+LOADERS = {
+    "llama_cpp": _load_llama_cpp,
+    "gpt4all": _load_gpt4all,
+}
+
+
+def register_loader(kind: str, loader) -> None:
+    """Add a backend, e.g. for the transformers/pythia/falcon stubs once implemented."""
+    LOADERS[kind] = loader
+
+
+def normalize_path(path: str) -> str:
+    """Real path for files on disk; hosted model names are kept as-is."""
+    if path and os.path.exists(path):
+        return os.path.normcase(os.path.realpath(path))
+    return path
+
+
+def _freeze(value):
+    """Hashable form of a loader parameter (dicts and lists by value)."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def entry_key(kind: str, path: str, params: dict) -> tuple:
+    """(kind, normalised path, load parameters): equal keys can share one loaded model."""
+    load_params = {k: v for k, v in params.items() if k not in NON_LOAD_PARAMS}
+    return kind, normalize_path(path), _freeze(load_params)
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+class _Entry:
+    def __init__(self, key: tuple, kind: str, path: str, params: dict):
+        self.key = key
+        self.kind = kind
+        self.path = path
+        self.params = params
+        self.model = None
+        self.refs = 0        # live handles
+        self.pins = 0        # handles currently inside `with handle:`
+        self.last_used = 0.0
+        self.size_bytes = os.path.getsize(path) if os.path.isfile(path) else 0
+        self.load_lock = threading.Lock()
+
+
+class ModelHandle:
+    """A consumer's reference to a registry entry."""
+
+    def __init__(self, registry: "ModelRegistry", key: tuple):
+        self._registry = registry
+        self.key = key
+        self.released = False
+
+    def get(self):
+        """Return the model, loading it if needed. Raises if loading fails."""
+        return self._registry._get(self.key)
+
+    def __enter__(self):
+        return self._registry._get(self.key, pin=True)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._registry._unpin(self.key)
+        return False
+
+    def release(self, unload: bool = False) -> None:
+        """Drop this reference. With unload=True the model is freed right away if nobody else holds it."""
+        if not self.released:
+            self.released = True
+            self._registry._release(self.key, unload=unload)
+
+
+class ModelRegistry:
+    def __init__(self, ram_budget_mb: int = MODEL_RAM_BUDGET_MB):
+        self.ram_budget_bytes = ram_budget_mb * 1024 * 1024
+        self._entries: dict[tuple, _Entry] = {}
+        self._lock = threading.Lock()
+
+    # ---------- public API ----------
+    def acquire(self, kind: str, path: str, **params) -> ModelHandle:
+        """Get a handle on (kind, path, load params); see entry_key. Does not load the model."""
+        if kind not in LOADERS:
+            raise ValueError(f"Unknown model kind '{kind}' (known: {list(LOADERS)})")
+        key = entry_key(kind, path, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                others = [e.params for e in self._entries.values() if e.key[:2] == key[:2]]
+                if others:
+                    log.info(f"[{kind}] {path} is also registered with {others}; "
+                             f"{params} gets its own copy (a second load of the weights)")
+                entry = self._entries[key] = _Entry(key, kind, path, params)
+            entry.refs += 1
+        return ModelHandle(self, key)
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    "kind": e.kind,
+                    "path": e.path,
+                    "params": {k: v for k, v in e.params.items() if k not in NON_LOAD_PARAMS},
+                    "loaded": e.model is not None,
+                    "refs": e.refs,
+                    "pins": e.pins,
+                    "size_mb": round(e.size_bytes / 1024 / 1024, 1),
+                    "idle_s": round(time.monotonic() - e.last_used, 1) if e.last_used else None,
+                }
+                for e in self._entries.values()
+            ]
+
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(e.size_bytes for e in self._entries.values() if e.model is not None)
+
+    # ---------- internals ----------
+    def _get(self, key: tuple, pin: bool = False):
+        with self._lock:
+            entry = self._entries[key]
+            entry.last_used = time.monotonic()
+            if pin:
+                entry.pins += 1
+            model = entry.model
+        if model is not None:
+            return model
+
+        try:
+            with entry.load_lock:
+                if entry.model is None:
+                    self._make_room(entry)
+                    log.info(f"🧠 [{entry.kind}] Loading {entry.path}")
+                    start = time.perf_counter()
+                    entry.model = LOADERS[entry.kind](entry.path, **entry.params)
+                    log.info(f"🧠 [{entry.kind}] Loaded {entry.path} in {time.perf_counter() - start:.2f}s "
+                             f"({self.resident_bytes() / 1024 / 1024:.0f} MB resident)")
+                return entry.model
+        except Exception:
+            if pin:
+                self._unpin(key)
+            raise
+
+    def _unpin(self, key: tuple) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.pins > 0:
+                entry.pins -= 1
+
+    def _release(self, key: tuple, unload: bool = False) -> None:
+        model = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refs -= 1
+            if entry.refs <= 0 and (entry.model is None or (unload and entry.pins == 0)):
+                model, entry.model = entry.model, None
+                del self._entries[key]
+        # Otherwise unreferenced but still loaded models stay cached until the budget needs the room.
+        if model is not None:
+            log.info(f"♻️ [{entry.kind}] Unloading {entry.path}")
+            close = getattr(model, "close", None)
+            if callable(close):
+                close()
+            del model
+            gc.collect()
+
+    def _make_room(self, incoming: _Entry) -> None:
+        """Unload idle LRU models until `incoming` fits in the RAM budget."""
+        if not self.ram_budget_bytes:
+            return
+        victims = []
+        with self._lock:
+            resident = sum(e.size_bytes for e in self._entries.values() if e.model is not None)
+            # Unreferenced models go first, then referenced-but-idle ones; oldest first within each group
+            candidates = sorted(
+                (e for e in self._entries.values() if e.model is not None and e.pins == 0 and e is not incoming),
+                key=lambda e: (e.refs > 0, e.last_used),
+            )
+            for e in candidates:
+                if resident + incoming.size_bytes <= self.ram_budget_bytes:
+                    break
+                victims.append((e, e.model))
+                e.model = None
+                resident -= e.size_bytes
+            for e, _ in victims:
+                if e.refs <= 0:
+                    self._entries.pop(e.key, None)
+            if resident + incoming.size_bytes > self.ram_budget_bytes:
+                log.warning(f"⚠️ Loading {incoming.path} exceeds MODEL_RAM_BUDGET_MB "
+                            f"({(resident + incoming.size_bytes) / 1024 / 1024:.0f} MB > "
+                            f"{self.ram_budget_bytes / 1024 / 1024:.0f} MB); remaining models are in use")
+        for e, model in victims:
+            log.info(f"♻️ [{e.kind}] Evicting {e.path} (LRU, {e.size_bytes / 1024 / 1024:.0f} MB)")
+            close = getattr(model, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as ex:
+                    log.debug(f"[{e.kind}] close() failed during eviction: {ex}")
+        if victims:
+            # Drop the last references so the weights are actually freed
+            del model
+            victims.clear()
+            gc.collect()
+
+
+# singleton for import convenience
+registry = ModelRegistry()
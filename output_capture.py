@@ -0,0 +1,183 @@
+# output_capture.py
+"""
+Bounded-memory capture of tool output.
+
+    cap = OutputCapture("masscan")
+    for line in proc.stdout:
+        cap.write(line)
+    cap.close()
+    cap.summary()   # head + "… N chars omitted — !page <id> …" + tail
+    read_page(cap.id, page=3)
+
+Small outputs stay in memory. Once an output passes SPILL_CHARS it is streamed
+to a gzip file (data/outputs/<id>.txt.gz) while only the first HEAD_CHARS and
+the last TAIL_CHARS are kept in RAM. Spill files can be read back one page at
+a time by id (`!page <id> [n]` in Discord) or attached whole. Background jobs
+pass spill_chars=0 so their whole output is always on disk and pages the same
+way. Files older than OUTPUT_RETENTION_HOURS are removed when new captures spill.
+"""
+import codecs
+import collections
+import gzip
+import logging
+import os
+import time
+import uuid
+import zlib
+from pathlib import Path
+
+log = logging.getLogger("output_capture")
+
+OUTPUT_DIR = Path(__file__).parent / "data" / "outputs"
+HEAD_CHARS = int(os.getenv("OUTPUT_HEAD_CHARS", 1500))
+TAIL_CHARS = int(os.getenv("OUTPUT_TAIL_CHARS", 2500))
+SPILL_CHARS = int(os.getenv("OUTPUT_SPILL_CHARS", 16000)) # Largest output kept whole in memory
+RETENTION_HOURS = float(os.getenv("OUTPUT_RETENTION_HOURS", 72))
+PAGE_CHARS = 1800 # Fits a Discord message with a code fence
+
+
+def spill_path(capture_id: str) -> Path:
+    return OUTPUT_DIR / f"{capture_id}.txt.gz"
+
+
+def _prune(now: float):
+    cutoff = now - RETENTION_HOURS * 3600
+    for path in OUTPUT_DIR.glob("*.txt.gz"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
+
+
+class OutputCapture:
+    """Accumulates streamed text with bounded memory; see the module docstring."""
+
+    def __init__(self, label: str = "output", spill_chars: int = SPILL_CHARS):
+        self.label = label
+        self.spill_chars = spill_chars
+        self.id = uuid.uuid4().hex[:10]
+        self.total_chars = 0
+        self._buffer: list[str] = [] # Whole output until it spills
+        self._head = ""
+        self._tail: collections.deque[str] = collections.deque()
+        self._tail_chars = 0
+        self._spill = None
+        self.path: Path | None = None
+
+    @property
+    def spilled(self) -> bool:
+        return self.path is not None
+
+    def write(self, text: str) -> None:
+        if not text:
+            return
+        self.total_chars += len(text)
+        if self._spill is None:
+            self._buffer.append(text)
+            if self.total_chars <= self.spill_chars:
+                return
+            self._start_spill()
+            return
+        self._spill.write(text)
+        if len(self._head) < HEAD_CHARS: # Spilled early (spill_chars=0): keep filling the head
+            self._head += text[:HEAD_CHARS - len(self._head)]
+        self._push_tail(text)
+
+    def _start_spill(self):
+        now = time.time()
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        _prune(now)
+        self.path = spill_path(self.id)
+        self._spill = gzip.open(self.path, "wt", encoding="utf-8", compresslevel=6)
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._spill.write(text)
+        self._head = text[:HEAD_CHARS]
+        self._push_tail(text)
+        log.debug(f"[{self.label}] output passed {self.spill_chars} chars; spilling to {self.path}")
+
+    def _push_tail(self, text: str):
+        text = text[-TAIL_CHARS:]
+        self._tail.append(text)
+        self._tail_chars += len(text)
+        while self._tail_chars - len(self._tail[0]) >= TAIL_CHARS:
+            self._tail_chars -= len(self._tail.popleft())
+
+    def flush(self) -> None:
+        """Makes everything written so far readable by read_page (e.g. while a job runs)."""
+        if self._spill is not None:
+            self._spill.flush()
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def tail(self, chars: int = TAIL_CHARS) -> str:
+        """The most recent output (for progress displays)."""
+        if not self.spilled:
+            return "".join(self._buffer)[-chars:]
+        return "".join(self._tail)[-chars:]
+
+    def summary(self) -> str:
+        """Whole output, or head + an omission marker pointing at `!page` + tail."""
+        if not self.spilled:
+            return "".join(self._buffer)
+        tail = self.tail()
+        omitted = self.total_chars - len(self._head) - len(tail)
+        pages = -(-self.total_chars // PAGE_CHARS)
+        return (f"{self._head}\n… [{omitted} chars omitted — full output: `!page {self.id}` (1-{pages})] …\n"
+                f"{tail}")
+
+
+def capture_text(text: str, label: str = "output", spill_chars: int = SPILL_CHARS) -> OutputCapture:
+    """Captures an already-complete string (spilling it if it is longer than spill_chars)."""
+    with OutputCapture(label, spill_chars) as cap:
+        cap.write(text)
+    return cap
+
+
+def _iter_text(path: Path):
+    """Decompressed text of a spill file in chunks; tolerates a file still being written."""
+    inflate = zlib.decompressobj(wbits=31) # gzip container
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    with open(path, "rb") as f:
+        while raw := f.read(1 << 16):
+            if text := decoder.decode(inflate.decompress(raw)):
+                yield text
+            if inflate.eof:
+                break
+
+
+def read_page(capture_id: str, page: int = 1, page_chars: int = PAGE_CHARS) -> tuple[str, int, int] | None:
+    """
+    One page of a spilled output: (text, page, pages), 1-based and clamped.
+    None if the id is unknown or expired. Decompresses the file once, keeping
+    only the requested page and the last one in memory; an output still being
+    written (a running job) reads up to what has been flushed. Blocking: run
+    it off the event loop.
+    """
+    if not capture_id.isalnum():
+        return None
+    path = spill_path(capture_id)
+    if not path.exists():
+        return None
+    start = (max(1, page) - 1) * page_chars
+    total, wanted, tail = 0, [], ""
+    for chunk in _iter_text(path):
+        lo, hi = max(0, start - total), min(len(chunk), start + page_chars - total)
+        if lo < hi:
+            wanted.append(chunk[lo:hi])
+        total += len(chunk)
+        tail = (tail + chunk)[-page_chars:]
+    pages = max(1, -(-total // page_chars))
+    if page > pages: # Clamp to the last page
+        return (tail[-(total - (pages - 1) * page_chars):] if total else ""), pages, pages
+    return "".join(wanted), max(1, page), pages
@@ -0,0 +1,272 @@
+# rate_limit.py
+"""
+Token-bucket rate limits per API provider, shared by every thread and process
+(Kib and Haun) on this machine.
+
+    limiter.acquire("nominatim")            # blocks until a request may go out
+    await limiter.aacquire("shodan")         # same, without blocking the loop
+
+Buckets live in data/rate_limits.db. Each acquire reserves the next slot in
+one short write transaction, so callers in different processes queue up
+fairly instead of all retrying at once; a bucket whose tokens are below zero
+has that many reservations waiting. tool_registry wraps the tools listed in
+TOOL_PROVIDERS, so a cached result never waits for a token.
+
+Each provider has a short-term rate (PROVIDERS: requests per second and
+burst) and optionally a quota per calendar day or month (QUOTAS), counted
+separately and reset on the UTC window boundary. A quota is never spread
+into the refill rate, so bursts run at API speed until the quota is spent;
+past it, calls fail fast with RateLimitExceeded until the window resets.
+Override with RATE_LIMIT_<PROVIDER>="<per second>:<burst>" (a rate of 0
+disables the short-term limit only; a quota still applies) and
+RATE_LIMIT_<PROVIDER>_QUOTA="<n>/<day|month>" (empty = none).
+Metrics: rate_limit_wait_seconds{provider}, rate_limit_waiting{provider}
+(callers waiting in this process), rate_limit_queue_depth{provider}
+(reservations waiting across all processes) and
+rate_limit_quota_remaining{provider}.
+"""
+import asyncio
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import metrics
+
+log = logging.getLogger("rate_limit")
+
+DB_PATH = Path(__file__).parent / "data" / "rate_limits.db"
+MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", 300)) # Longest a caller will queue for a token
+
+# (requests per second, burst) — short-term limits
+PROVIDERS = {
+    "nominatim": (1.0, 1), # OSM usage policy: at most 1 request/s
+    "shodan": (1.0, 1),
+    "otx": (5.0, 10),
+    "google_cse": (1.0, 5),
+    "ipinfo": (10.0, 10),
+}
+
+# (requests, "day" | "month") — free-tier quotas, counted per UTC calendar window
+QUOTAS = {
+    "google_cse": (100, "day"),
+    "ipinfo": (50000, "month"),
+}
+
+TOOL_PROVIDERS = {
+    "geopy": "nominatim",
+    "shodan": "shodan",
+    "alienvault_otx": "otx",
+    "google_images_search": "google_cse",
+    "ipinfo": "ipinfo",
+}
+
+
+class RateLimitExceeded(RuntimeError):
+    """Raised when the wait for a token would exceed the caller's max_wait."""
+
+
+def limits_for(provider: str) -> tuple[float, float]:
+    """(rate per second, burst) for a provider; (0, 0) = unlimited."""
+    override = os.getenv(f"RATE_LIMIT_{provider.upper()}")
+    if override:
+        rate, _, burst = override.partition(":")
+        return float(rate), float(burst or 1)
+    return PROVIDERS.get(provider, (0.0, 0.0))
+
+
+def quota_for(provider: str) -> tuple[int, str] | None:
+    """(requests, "day" | "month") quota for a provider, or None."""
+    override = os.getenv(f"RATE_LIMIT_{provider.upper()}_QUOTA")
+    if override is not None:
+        if not override.strip():
+            return None
+        count, _, window = override.partition("/")
+        return int(count), window.strip() or "day"
+    return QUOTAS.get(provider)
+
+
+def unlimited(provider: str) -> bool:
+    """True if the provider has neither a short-term rate nor a quota."""
+    return not limits_for(provider)[0] and quota_for(provider) is None
+
+
+def _window_bounds(window: str, now: float) -> tuple[float, float]:
+    """(start, end) of the UTC day or month containing `now`."""
+    t = datetime.fromtimestamp(now, timezone.utc)
+    if window == "month":
+        start = t.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        end = start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    else:
+        start = t.replace(hour=0, minute=0, second=0, microsecond=0)
+        end = datetime.fromtimestamp(start.timestamp() + 86400, timezone.utc)
+    return start.timestamp(), end.timestamp()
+
+
+class RateLimiter:
+    """SQLite-backed token buckets; see the module docstring."""
+
+    def __init__(self, db_path: Path = DB_PATH):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self._local = threading.local() # One connection per thread
+        self._ensure_schema()
+
+    # ---------- private helpers ----------
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: transactions are explicit (BEGIN IMMEDIATE below)
+            conn = self._local.conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _ensure_schema(self):
+        self._conn().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS buckets(
+                provider  TEXT PRIMARY KEY,
+                tokens    REAL NOT NULL,
+                updated   REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS quotas(
+                provider      TEXT PRIMARY KEY,
+                window_start  REAL    NOT NULL,
+                used          INTEGER NOT NULL
+            );
+            """
+        )
+
+    def _count_quota(self, conn: sqlite3.Connection, provider: str, delta: int, now: float):
+        # Caller holds the write transaction
+        quota = quota_for(provider)
+        if quota is None:
+            return
+        limit, window = quota
+        start, end = _window_bounds(window, now)
+        row = conn.execute("SELECT window_start, used FROM quotas WHERE provider = ?", (provider,)).fetchone()
+        used = row[1] if row is not None and row[0] == start else 0 # A new window starts from zero
+        if delta > 0 and used + delta > limit:
+            raise RateLimitExceeded(f"{provider}: {limit}/{window} quota used up; resets in {(end - now) / 3600:.1f}h")
+        conn.execute("INSERT OR REPLACE INTO quotas(provider, window_start, used) VALUES (?,?,?)",
+                     (provider, start, max(0, used + delta)))
+        metrics.set_gauge("rate_limit_quota_remaining", limit - max(0, used + delta), provider=provider)
+
+    def _update(self, provider: str, delta: float, max_wait: float | None = None) -> float:
+        """
+        Adds `delta` tokens (-1 reserves one) after refilling the bucket, and counts the
+        request against the provider's quota; returns how long the reservation must wait.
+        A reservation that would wait past max_wait or exceed the quota is not made.
+        """
+        rate, burst = limits_for(provider)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE") # Takes the write lock, so reserve is atomic across processes
+        try:
+            now = time.time()
+            wait, tokens = 0.0, None
+            if rate: # Rate 0: no short-term limit, only the quota
+                row = conn.execute("SELECT tokens, updated FROM buckets WHERE provider = ?", (provider,)).fetchone()
+                tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+                wait = max(0.0, -(tokens + delta) / rate)
+                if max_wait is not None and wait > max_wait:
+                    raise RateLimitExceeded(f"{provider}: next request slot is {wait:.0f}s away (limit {max_wait:g}s)")
+            self._count_quota(conn, provider, int(-delta), now)
+            if tokens is not None:
+                tokens += delta
+                conn.execute("INSERT OR REPLACE INTO buckets(provider, tokens, updated) VALUES (?,?,?)",
+                             (provider, tokens, now))
+            conn.execute("COMMIT")
+        except (sqlite3.Error, RateLimitExceeded):
+            conn.execute("ROLLBACK")
+            raise
+        if tokens is not None:
+            metrics.set_gauge("rate_limit_queue_depth", max(0, -int(tokens // 1)), provider=provider)
+        return wait
+
+    def _reserve(self, provider: str, max_wait: float) -> float:
+        try:
+            return self._update(provider, -1.0, max_wait)
+        except sqlite3.Error as e:
+            # The limiter must never take a tool down with it
+            log.warning(f"Rate limit store unavailable; not throttling {provider}: {e}")
+            return 0.0
+
+    def _refund(self, provider: str):
+        try:
+            self._update(provider, 1.0)
+        except sqlite3.Error:
+            pass
+
+    # ---------- public API ----------
+    def acquire(self, provider: str, max_wait: float = MAX_WAIT) -> float:
+        """Blocks until `provider` may be called; returns the seconds waited."""
+        if unlimited(provider):
+            return 0.0
+        wait = self._reserve(provider, max_wait)
+        metrics.observe("rate_limit_wait_seconds", wait, provider=provider)
+        if wait > 0:
+            metrics.add_gauge("rate_limit_waiting", 1, provider=provider)
+            try:
+                time.sleep(wait)
+            finally:
+                metrics.add_gauge("rate_limit_waiting", -1, provider=provider)
+        return wait
+
+    async def aacquire(self, provider: str, max_wait: float = MAX_WAIT) -> float:
+        """acquire() for the event loop; a cancelled waiter gives its slot back."""
+        if unlimited(provider):
+            return 0.0
+        # The reservation is one short transaction, but another process may hold the lock
+        wait = await asyncio.to_thread(self._reserve, provider, max_wait)
+        metrics.observe("rate_limit_wait_seconds", wait, provider=provider)
+        if wait > 0:
+            metrics.add_gauge("rate_limit_waiting", 1, provider=provider)
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                await asyncio.to_thread(self._refund, provider)
+                raise
+            finally:
+                metrics.add_gauge("rate_limit_waiting", -1, provider=provider)
+        return wait
+
+
+limiter = RateLimiter()
+
+
+def limited(tool: str, func):
+    """`func` that first waits for its provider's token, or `func` itself if the tool has no provider."""
+    provider = TOOL_PROVIDERS.get(tool)
+    if provider is None:
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            limiter.acquire(provider)
+        except RateLimitExceeded as e:
+            return f"[{tool}] rate limited: {e}"
+        return func(*args, **kwargs)
+
+    return wrapper
+
+
+def alimited(tool: str, afunc):
+    """limited() for a coroutine function such as a REST wrapper's arun()."""
+    provider = TOOL_PROVIDERS.get(tool)
+    if provider is None:
+        return afunc
+
+    @functools.wraps(afunc)
+    async def wrapper(*args, **kwargs):
+        try:
+            await limiter.aacquire(provider)
+        except RateLimitExceeded as e:
+            return f"[{tool}] rate limited: {e}"
+        return await afunc(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,247 @@
+# scan_store.py
+"""
+Structured store for nmap results, so follow-up questions don't need a rescan.
+
+    scan_id = scan_store.ingest(proc.stdout, args="-A 10.0.0.0/24")  # nmap -oX - output, parsed as it streams
+    scan_store.hosts_with_port(443)                   # which hosts have 443 open (latest scan of each)
+    scan_store.host_history("10.0.0.5", since=time.time() - 7 * 86400)
+    scan_store.summarize(scan_id)                     # compact text for the LLM / chat
+
+Hosts, ports, services and NSE script output are kept in data/scans.db with
+indexes on (port, state) and (addr, seen). The XML is read with iterparse and
+each <host> element is freed once stored, so a /16 sweep does not have to fit
+in memory.
+"""
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+DB_PATH = Path(__file__).parent / "data" / "scans.db"
+
+
+def parse_nmap_xml(source):
+    """
+    Yields ('scan', {args, started}) once, then one dict per <host> as it is read:
+    {addr, hostname, state, os, ports: [{port, protocol, state, service, product, version, scripts}], scripts}
+    `source` is a path or a binary file object (e.g. a subprocess's stdout).
+    """
+    root = None
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+                if elem.tag == "nmaprun":
+                    yield "scan", {"args": elem.get("args", ""), "started": float(elem.get("start", 0) or time.time())}
+            continue
+        if elem.tag != "host":
+            continue
+        yield "host", _host_dict(elem)
+        root.clear() # Drop finished hosts so memory stays flat
+
+
+def _scripts(elem) -> list[dict]:
+    return [{"id": s.get("id", ""), "output": s.get("output", "")} for s in elem.findall("script")]
+
+
+def _host_dict(host) -> dict:
+    addresses = {a.get("addrtype"): a.get("addr") for a in host.findall("address")}
+    addr = addresses.get("ipv4") or addresses.get("ipv6") or addresses.get("mac") or ""
+    hostname = host.find("hostnames/hostname")
+    status = host.find("status")
+    osmatch = host.find("os/osmatch")
+    ports = []
+    for port in host.findall("ports/port"):
+        state = port.find("state")
+        service = port.find("service")
+        ports.append({
+            "port": int(port.get("portid", 0)),
+            "protocol": port.get("protocol", "tcp"),
+            "state": state.get("state", "") if state is not None else "",
+            "service": service.get("name", "") if service is not None else "",
+            "product": service.get("product", "") if service is not None else "",
+            "version": " ".join(filter(None, (service.get("version"), service.get("extrainfo")))) if service is not None else "",
+            "scripts": _scripts(port),
+        })
+    hostscript = host.find("hostscript")
+    return {
+        "addr": addr,
+        "hostname": hostname.get("name", "") if hostname is not None else "",
+        "state": status.get("state", "") if status is not None else "",
+        "os": osmatch.get("name", "") if osmatch is not None else "",
+        "ports": ports,
+        "scripts": _scripts(hostscript) if hostscript is not None else [],
+    }
+
+
+class ScanStore:
+    """SQLite-backed nmap results (see the module docstring)."""
+
+    def __init__(self, db_path: Path = DB_PATH):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        # Scans are ingested from tool worker threads and queried from the bot loop
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._ensure_schema()
+
+    # ---------- private helpers ----------
+    def _ensure_schema(self):
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS scans(
+                id        INTEGER PRIMARY KEY AUTOINCREMENT,
+                args      TEXT    NOT NULL,
+                started   REAL    NOT NULL,
+                finished  REAL
+            );
+            CREATE TABLE IF NOT EXISTS hosts(
+                id        INTEGER PRIMARY KEY AUTOINCREMENT,
+                scan_id   INTEGER NOT NULL REFERENCES scans(id),
+                addr      TEXT    NOT NULL,
+                hostname  TEXT,
+                state     TEXT,
+                os        TEXT,
+                seen      REAL    NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS ports(
+                id        INTEGER PRIMARY KEY AUTOINCREMENT,
+                host_id   INTEGER NOT NULL REFERENCES hosts(id),
+                scan_id   INTEGER NOT NULL,
+                addr      TEXT    NOT NULL,
+                port      INTEGER NOT NULL,
+                protocol  TEXT    NOT NULL,
+                state     TEXT    NOT NULL,
+                service   TEXT,
+                product   TEXT,
+                version   TEXT,
+                seen      REAL    NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS scripts(
+                id        INTEGER PRIMARY KEY AUTOINCREMENT,
+                host_id   INTEGER NOT NULL REFERENCES hosts(id),
+                port_id   INTEGER REFERENCES ports(id),
+                script    TEXT    NOT NULL,
+                output    TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_hosts_addr ON hosts(addr, seen);
+            CREATE INDEX IF NOT EXISTS idx_ports_port ON ports(port, state);
+            CREATE INDEX IF NOT EXISTS idx_ports_addr ON ports(addr, seen);
+            CREATE INDEX IF NOT EXISTS idx_ports_scan ON ports(scan_id);
+            CREATE INDEX IF NOT EXISTS idx_scripts_host ON scripts(host_id);
+            """
+        )
+        self.conn.commit()
+
+    def _store_host(self, scan_id: int, seen: float, host: dict):
+        cur = self.conn.execute(
+            "INSERT INTO hosts(scan_id, addr, hostname, state, os, seen) VALUES (?,?,?,?,?,?)",
+            (scan_id, host["addr"], host["hostname"], host["state"], host["os"], seen))
+        host_id = cur.lastrowid
+        for s in host["scripts"]:
+            self.conn.execute("INSERT INTO scripts(host_id, port_id, script, output) VALUES (?,?,?,?)",
+                              (host_id, None, s["id"], s["output"]))
+        for p in host["ports"]:
+            cur = self.conn.execute(
+                "INSERT INTO ports(host_id, scan_id, addr, port, protocol, state, service, product, version, seen)"
+                " VALUES (?,?,?,?,?,?,?,?,?,?)",
+                (host_id, scan_id, host["addr"], p["port"], p["protocol"], p["state"], p["service"],
+                 p["product"], p["version"], seen))
+            port_id = cur.lastrowid
+            for s in p["scripts"]:
+                self.conn.execute("INSERT INTO scripts(host_id, port_id, script, output) VALUES (?,?,?,?)",
+                                  (host_id, port_id, s["id"], s["output"]))
+
+    # ---------- public API ----------
+    def ingest(self, source, args: str = "") -> int:
+        """
+        Parses nmap XML from `source` (path or binary stream) as it arrives and stores it.
+        Returns the scan id. A truncated document keeps the hosts read so far; one that never
+        started raises xml.etree.ElementTree.ParseError (or ValueError if it is not nmap XML).
+        """
+        scan_id, seen = None, time.time()
+        try:
+            # Parsing waits on the scanner; the lock is only held for each write, so queries keep working
+            for kind, data in parse_nmap_xml(source):
+                with self._lock:
+                    if kind == "scan":
+                        seen = data["started"]
+                        scan_id = self.conn.execute("INSERT INTO scans(args, started) VALUES (?,?)",
+                                                    (args or data["args"], seen)).lastrowid
+                    elif scan_id is not None:
+                        self._store_host(scan_id, seen, data)
+                    self.conn.commit() # Each host is queryable as soon as it is parsed
+        except ET.ParseError:
+            if scan_id is None:
+                raise
+            # Killed or crashed mid-scan: keep the hosts that did complete
+        finally:
+            if scan_id is not None:
+                with self._lock:
+                    self.conn.execute("UPDATE scans SET finished = ? WHERE id = ?", (time.time(), scan_id))
+                    self.conn.commit()
+        if scan_id is None:
+            raise ValueError("no <nmaprun> element in nmap output")
+        return scan_id
+
+    def recent_scans(self, limit: int = 10) -> list[sqlite3.Row]:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT s.*, (SELECT COUNT(*) FROM hosts h WHERE h.scan_id = s.id AND h.state = 'up') AS hosts_up"
+                " FROM scans s ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+
+    def hosts_with_port(self, port: int, protocol: str = "tcp", state: str = "open",
+                        since: float | None = None) -> list[sqlite3.Row]:
+        """Hosts whose most recent scan of `port` found it in `state` (default: open)."""
+        with self._lock:
+            return self.conn.execute(
+                """
+                SELECT p.addr, h.hostname, p.port, p.protocol, p.service, p.product, p.version, p.seen, p.scan_id
+                FROM ports p JOIN hosts h ON h.id = p.host_id
+                WHERE p.port = ? AND p.protocol = ? AND p.seen >= ?
+                  AND p.seen = (SELECT MAX(q.seen) FROM ports q
+                                WHERE q.addr = p.addr AND q.port = p.port AND q.protocol = p.protocol)
+                  AND p.state = ?
+                ORDER BY p.addr
+                """, (port, protocol, since or 0, state)).fetchall()
+
+    def host_history(self, addr: str, since: float | None = None) -> list[sqlite3.Row]:
+        """Every port observation for a host, newest scan first."""
+        with self._lock:
+            return self.conn.execute(
+                """
+                SELECT p.scan_id, p.seen, p.port, p.protocol, p.state, p.service, p.product, p.version, h.os, h.hostname
+                FROM ports p JOIN hosts h ON h.id = p.host_id
+                WHERE p.addr = ? AND p.seen >= ?
+                ORDER BY p.seen DESC, p.port
+                """, (addr, since or 0)).fetchall()
+
+    def summarize(self, scan_id: int, max_hosts: int = 50, max_ports: int = 25) -> str:
+        """Compact one-line-per-host summary of a scan."""
+        with self._lock:
+            scan = self.conn.execute("SELECT * FROM scans WHERE id = ?", (scan_id,)).fetchone()
+            hosts = self.conn.execute(
+                "SELECT * FROM hosts WHERE scan_id = ? AND state = 'up' ORDER BY id", (scan_id,)).fetchall()
+            ports = self.conn.execute(
+                "SELECT host_id, port, protocol, service, product, version FROM ports"
+                " WHERE scan_id = ? AND state = 'open' ORDER BY host_id, port", (scan_id,)).fetchall()
+        if scan is None:
+            return f"No scan #{scan_id}."
+        by_host: dict[int, list[str]] = {}
+        for p in ports:
+            label = " ".join(filter(None, (f"{p['port']}/{p['protocol']}", p["service"], p["product"], p["version"])))
+            by_host.setdefault(p["host_id"], []).append(label)
+        lines = [f"nmap scan #{scan_id} ({scan['args']}): {len(hosts)} host(s) up, {len(ports)} open port(s)"]
+        for h in hosts[:max_hosts]:
+            name = f" ({h['hostname']})" if h["hostname"] else ""
+            os_name = f" [{h['os']}]" if h["os"] else ""
+            open_ports = by_host.get(h["id"], [])
+            more = f", +{len(open_ports) - max_ports} more" if len(open_ports) > max_ports else ""
+            lines.append(f"{h['addr']}{name}{os_name}: {', '.join(open_ports[:max_ports]) or 'no open ports'}{more}")
+        if len(hosts) > max_hosts:
+            lines.append(f"… {len(hosts) - max_hosts} more host(s)")
+        return "\n".join(lines)
+
+
+scan_store = ScanStore()
@@ -0,0 +1,178 @@
+# speculative.py
+"""
+Speculative decoding helpers for llama-cpp-python.
+
+A draft proposes a few tokens ahead; the big model verifies them in one
+batched eval and keeps the longest matching prefix. On CPU-only hosts this is
+one of the few ways to raise tokens/s, because verifying k tokens in a batch
+costs little more than generating one.
+
+Two draft sources are supported:
+  • prompt_lookup – n-gram lookup in the prompt itself (no extra model; great
+                    for chat where answers quote the question or tool output)
+  • draft_model   – a small GGUF sharing the big model's tokenizer/vocabulary
+                    (e.g. Llama-3.2-1B drafting for Llama-3-8B)
+
+Every draft is wrapped in `CountingDraft`, which infers how many proposed
+tokens the big model accepted, so the acceptance rate can be logged and
+benchmarked (see benchmarks/speculative_bench.py).
+"""
+import logging
+import threading
+
+try:
+    import numpy as np
+    from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+except ImportError:
+    np = None
+    LlamaDraftModel = object  # Placeholder base so this module stays importable without llama-cpp-python
+    LlamaPromptLookupDecoding = None
+
+from model_registry import registry
+
+log = logging.getLogger("speculative")
+
+MODES = ("off", "prompt_lookup", "draft_model")
+
+
+class DraftStats:
+    """Proposed/accepted token counters for one draft source."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.proposed = 0
+        self.accepted = 0
+
+    def record(self, proposed: int = 0, accepted: int = 0) -> None:
+        with self._lock:
+            self.calls += 1 if proposed else 0
+            self.proposed += proposed
+            self.accepted += accepted
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.proposed if self.proposed else 0.0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "proposed": self.proposed,
+                "accepted": self.accepted,
+                "acceptance_rate": round(self.accepted / self.proposed, 4) if self.proposed else 0.0,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = self.proposed = self.accepted = 0
+
+
+class CountingDraft(LlamaDraftModel):
+    """
+    Wraps a draft source and counts accepted tokens.
+
+    llama-cpp-python calls the draft with the full token sequence so far. The
+    tokens that follow the previous call's input are exactly the ones the big
+    model kept, so the accepted count is their common prefix with the previous
+    proposal.
+    """
+
+    def __init__(self, inner, stats: DraftStats | None = None):
+        self.inner = inner
+        self.stats = stats or DraftStats()
+        self._prev_len = 0
+        self._prev_last = None
+        self._prev_draft = []
+
+    def __call__(self, input_ids, /, **kwargs):
+        n = len(input_ids)
+        if self._prev_len and n > self._prev_len and input_ids[self._prev_len - 1] == self._prev_last:
+            continued = input_ids[self._prev_len:]
+            accepted = 0
+            for got, proposed in zip(continued, self._prev_draft):
+                if got != proposed:
+                    break
+                accepted += 1
+            self.stats.record(accepted=accepted)
+
+        draft = np.asarray(self.inner(input_ids, **kwargs), dtype=np.intc)
+        self.stats.record(proposed=len(draft))
+        self._prev_len = n
+        self._prev_last = input_ids[-1] if n else None
+        self._prev_draft = draft
+        return draft
+
+
+class SmallModelDraft(LlamaDraftModel):
+    """Greedy drafts from a small llama.cpp model (must share the big model's vocabulary)."""
+
+    def __init__(self, model_path: str, num_pred_tokens: int = 4, n_ctx: int = 2048, **params):
+        self.num_pred_tokens = num_pred_tokens
+        # Through the registry, so a router's small model at the same path is not loaded twice
+        self._handle = registry.acquire("llama_cpp", model_path, n_ctx=n_ctx, verbose=False, **params)
+        self._lock = threading.Lock()
+
+    def __call__(self, input_ids, /, **kwargs):
+        out = []
+        with self._lock, self._handle as model:
+            # generate() reuses the longest matching KV-cache prefix, so only new tokens are evaluated
+            for token in model.generate(input_ids.tolist(), temp=0.0, top_k=1, reset=True):
+                out.append(token)
+                if len(out) >= self.num_pred_tokens or token == model.token_eos():
+                    break
+        return np.array(out, dtype=np.intc)
+
+
+SPEC_KEYS = ("mode", "num_pred_tokens", "max_ngram_size", "draft_model_path", "draft_n_ctx")
+
+
+def load_spec(spec_config: dict | None) -> dict | None:
+    """
+    The part of an `llm.speculative` section that changes the loaded model, or None when off.
+    Passed to the model registry as the `speculative` load parameter: equal specs share one
+    loaded model, whose loader builds the draft (see model_registry._load_llama_cpp).
+    """
+    spec_config = spec_config or {}
+    mode = str(spec_config.get("mode", "off")).lower()
+    if mode == "off":
+        return None
+    return {"mode": mode, **{k: spec_config[k] for k in SPEC_KEYS[1:] if spec_config.get(k) is not None}}
+
+
+def build_draft(spec_config: dict | None) -> CountingDraft | None:
+    """
+    Create the draft source described by an `llm.speculative` config section.
+    Args:
+        spec_config (dict): {mode, num_pred_tokens, max_ngram_size, draft_model_path, draft_n_ctx}
+    Returns:
+        CountingDraft | None: None when speculative decoding is off.
+    Raises:
+        ImportError: If llama-cpp-python (with speculative support) is not installed.
+        ValueError: On an unknown mode or a missing draft_model_path.
+    """
+    spec_config = spec_config or {}
+    mode = str(spec_config.get("mode", "off")).lower()
+    if mode == "off":
+        return None
+    if mode not in MODES:
+        raise ValueError(f"Unknown llm.speculative.mode '{mode}' (expected one of {MODES})")
+    if LlamaPromptLookupDecoding is None:
+        raise ImportError("llama-cpp-python with llama_speculative support is required for speculative decoding.")
+
+    if mode == "prompt_lookup":
+        inner = LlamaPromptLookupDecoding(
+            max_ngram_size=spec_config.get("max_ngram_size", 2),
+            num_pred_tokens=spec_config.get("num_pred_tokens", 10),
+        )
+    else:
+        draft_path = spec_config.get("draft_model_path")
+        if not draft_path:
+            raise ValueError("llm.speculative.mode is 'draft_model' but 'draft_model_path' is not set.")
+        inner = SmallModelDraft(
+            draft_path,
+            num_pred_tokens=spec_config.get("num_pred_tokens", 4),
+            n_ctx=spec_config.get("draft_n_ctx", 2048),
+        )
+    log.info(f"Speculative decoding enabled: mode={mode}, num_pred_tokens={getattr(inner, 'num_pred_tokens', '?')}")
+    return CountingDraft(inner)
@@ -1,7 +1,106 @@
 import logging
 from .llm_interface import LLMInterface
 from .memory import ChatMemory
-from .tools import execute_tool, format_tool_prompt # Import tool functions
+from .tools import execute_tool, format_tool_prompt, build_tool_call_grammar # Import tool functions
+from .tool_stream import stream_tool_turn
+
+SYSTEM_MESSAGE = "You are a helpful offline assistant."
+
+
+def _messages_for_llm(memory: ChatMemory, tools_enabled: bool) -> list:
+    """System prompt (with tool instructions if enabled) followed by the stored history."""
+    history = memory.get_history()
+    messages_for_llm = []
+
+    # Construct system prompt (only once or based on model needs)
+    system_message = SYSTEM_MESSAGE
+    if tools_enabled:
+        system_message = format_tool_prompt(system_message) # Add tool instructions
+
+    # Check if history is empty or only contains the system prompt idea
+    # A simple approach: always prepend the system message if tools are enabled,
+    # or if the history doesn't seem to have one. LLM should handle it.
+    # More sophisticated logic might be needed depending on the model.
+    if not any(m['role'] == 'system' for m in history):
+         messages_for_llm.append({"role": "system", "content": system_message})
+
+    messages_for_llm.extend(history) # Add the actual conversation history
+    return messages_for_llm
+
+
+def generate_reply(config: dict, llm: LLMInterface, memory: ChatMemory, user_input: str,
+                   max_tool_iterations: int = 3, on_tool=None, on_status=None) -> str:
+    """
+    Runs one user turn: stores the message, calls the LLM and any requested tools,
+    and returns the final reply (also stored in memory).
+
+    Args:
+        config (dict): The application configuration.
+        llm (LLMInterface): The initialized LLM interface.
+        memory (ChatMemory): Conversation memory for this session.
+        user_input (str): The user's message.
+        max_tool_iterations (int): Prevents infinite tool loops.
+        on_tool (callable, optional): Called with the tool name before each tool result is fed back.
+        on_status (callable, optional): Called with a progress message ("Thinking...") before each LLM call
+            and when the tool limit is reached. Errors come back as the reply ("Sorry, I encountered an error…").
+    """
+    status = on_status or (lambda message: None)
+    tools_enabled = config.get('tools', {}).get('enabled', False)
+    # Stream replies and dispatch tool calls as soon as they are complete (see tool_stream.py)
+    streaming_dispatch = tools_enabled and config.get('tools', {}).get('streaming_dispatch', False)
+
+    # Add user message to memory
+    memory.add_message("user", user_input)
+
+    current_tool_iterations = 0
+    while current_tool_iterations < max_tool_iterations:
+        # --- Get response from LLM ---
+        tool_name, tool_result = None, None
+        status("Thinking...")
+        try:
+            if streaming_dispatch:
+                # Generation stops at the end of a tool call, which is already executed here
+                llm_response_text, tool_name, tool_result = stream_tool_turn(
+                    llm, _messages_for_llm(memory, tools_enabled), config)
+            else:
+                llm_response_text = llm.generate_response_with_history(_messages_for_llm(memory, tools_enabled))
+        except Exception as e:
+             logging.error(f"LLM generation failed: {e}", exc_info=True)
+             # Stop the tool loop on LLM error
+             return "Sorry, I encountered an error generating a response."
+
+        # --- Tool Execution Check ---
+        if tools_enabled and not streaming_dispatch:
+            tool_name, tool_result = execute_tool(llm_response_text, config)
+
+        if not (tool_name and tool_result):
+            # No valid tool call detected, or tools disabled. This is the final response.
+            memory.add_message("assistant", llm_response_text)
+            return llm_response_text
+
+        # A tool was called (successfully or with an error message)
+        if on_tool:
+            on_tool(tool_name)
+        logging.info(f"Tool '{tool_name}' called. Result: {tool_result[:100]}...")
+
+        # Add the LLM's request and the tool's result to memory
+        memory.add_message("assistant", llm_response_text) # Save the raw tool call JSON
+        memory.add_message("tool", tool_result) # Save the tool's output/error
+        current_tool_iterations += 1
+        # Continue the loop to let the LLM process the tool result
+
+    # Max iterations reached: generate a final response based on the last tool result stored in memory
+    logging.info("Reached maximum tool iterations. Generating final response.")
+    status("Reached maximum tool iterations. Providing final response.")
+    status("Thinking (final response after max tools)...")
+    try:
+        final_response = llm.generate_response_with_history(_messages_for_llm(memory, tools_enabled))
+    except Exception as e:
+        logging.error(f"LLM generation failed on final response: {e}", exc_info=True)
+        return "Sorry, I encountered an error generating the final response."
+    memory.add_message("assistant", final_response)
+    return final_response
+
 
 def run_cli_loop(config: dict, llm: LLMInterface, memory: ChatMemory):
     """
@@ -17,8 +116,8 @@ def run_cli_loop(config: dict, llm: LLMInterface, memory: ChatMemory):
     print("Type 'quit' to exit, 'clear' to reset memory.")
     print("-" * 25)
 
-    tools_enabled = config.get('tools', {}).get('enabled', False)
-    max_tool_iterations = 3 # Prevent infinite tool loops
+    if config.get('tools', {}).get('enabled', False):
+        llm.set_tool_grammar(build_tool_call_grammar()) # Used only if llm.tool_grammar is on
 
     while True:
         try:
@@ -38,85 +137,11 @@ def run_cli_loop(config: dict, llm: LLMInterface, memory: ChatMemory):
             print("Memory cleared.")
             continue
 
-        # Add user message to memory
-        memory.add_message("user", user_input)
-
-        current_tool_iterations = 0
-        while current_tool_iterations < max_tool_iterations:
-            # Prepare message history for the LLM
-            history = memory.get_history()
-            messages_for_llm = []
-
-            # Construct system prompt (only once or based on model needs)
-            system_message = "You are a helpful offline assistant."
-            if tools_enabled:
-                system_message = format_tool_prompt(system_message) # Add tool instructions
-
-            # Check if history is empty or only contains the system prompt idea
-            # A simple approach: always prepend the system message if tools are enabled,
-            # or if the history doesn't seem to have one. LLM should handle it.
-            # More sophisticated logic might be needed depending on the model.
-            if not any(m['role'] == 'system' for m in history):
-                 messages_for_llm.append({"role": "system", "content": system_message})
-
-            messages_for_llm.extend(history) # Add the actual conversation history
-
-            # --- Get response from LLM ---
-            print("Bot: Thinking...")
-            try:
-                llm_response_text = llm.generate_response_with_history(messages_for_llm)
-            except Exception as e:
-                 logging.error(f"LLM generation failed: {e}", exc_info=True)
-                 print("Bot: Sorry, I encountered an error generating a response.")
-                 # Break out of the tool loop on LLM error
-                 break # Go to next user input
-
-            # --- Tool Execution Check ---
-            tool_name, tool_result = None, None
-            if tools_enabled:
-                tool_name, tool_result = execute_tool(llm_response_text, config)
-
-            if tool_name and tool_result:
-                # A tool was called (successfully or with an error message)
-                print(f"Bot: (Attempting to use tool '{tool_name}'...)")
-                logging.info(f"Tool '{tool_name}' called. Result: {tool_result[:100]}...")
-
-                # Add the LLM's request and the tool's result to memory
-                memory.add_message("assistant", llm_response_text) # Save the raw tool call JSON
-                memory.add_message("tool", tool_result) # Save the tool's output/error
-
-                current_tool_iterations += 1
-                if current_tool_iterations >= max_tool_iterations:
-                     print("Bot: Reached maximum tool iterations. Providing final response.")
-                     # Let the loop break and generate a final response based on the last tool result
-                     break
-                # Continue the inner loop to let the LLM process the tool result
-                continue
-            else:
-                # No valid tool call detected, or tools disabled. This is the final response.
-                print(f"Bot: {llm_response_text}")
-                memory.add_message("assistant", llm_response_text)
-                # Break the inner tool loop as we have the final response
-                break
-        else:
-             # This else block executes if the while loop completes without break (i.e., max iterations reached)
-             # Need to generate a final response based on the last tool result stored in memory
-             history = memory.get_history()
-             messages_for_llm = []
-             system_message = "You are a helpful offline assistant."
-             if tools_enabled: system_message = format_tool_prompt(system_message)
-             if not any(m['role'] == 'system' for m in history): messages_for_llm.append({"role": "system", "content": system_message})
-             messages_for_llm.extend(history)
-
-             print("Bot: Thinking (final response after max tools)...")
-             try:
-                 final_response = llm.generate_response_with_history(messages_for_llm)
-                 print(f"Bot: {final_response}")
-                 memory.add_message("assistant", final_response)
-             except Exception as e:
-                 logging.error(f"LLM generation failed on final response: {e}", exc_info=True)
-                 print("Bot: Sorry, I encountered an error generating the final response.")
-
+        reply = generate_reply(
+            config, llm, memory, user_input,
+            on_tool=lambda name: print(f"Bot: (Attempting to use tool '{name}'...)"),
+            on_status=lambda message: print(f"Bot: {message}"),
+        )
+        print(f"Bot: {reply}")
 
     print("\n--- CLI Session Ended ---")
-
@@ -2,9 +2,11 @@ import discord
 import logging
 import asyncio
 import threading
+import tool_runner # Project root module
 from .llm_interface import LLMInterface
 from .memory import ChatMemory
-from .tools import execute_tool, format_tool_prompt
+from .tools import execute_tool, format_tool_prompt, build_tool_call_grammar
+from .tool_stream import stream_tool_turn
 
 # --- Per-Channel Memory Management ---
 # Use a dictionary to store separate ChatMemory instances for each channel.
@@ -61,8 +63,11 @@ class OfflineBotClient(discord.Client):
         self.config = config
         self.llm = llm
         self.tools_enabled = config.get('tools', {}).get('enabled', False)
+        self.streaming_dispatch = self.tools_enabled and config.get('tools', {}).get('streaming_dispatch', False)
         self.allowed_channel_ids = {int(cid) for cid in config.get('discord', {}).get('allowed_channel_ids', []) if cid}
         self.max_tool_iterations = 3 # Prevent infinite loops
+        if self.tools_enabled:
+            self.llm.set_tool_grammar(build_tool_call_grammar()) # Used only if llm.tool_grammar is on
         logging.info("Discord Client initialized.")
         if self.allowed_channel_ids:
             logging.info(f"Restricting activity to channels: {self.allowed_channel_ids}")
@@ -73,6 +78,7 @@ class OfflineBotClient(discord.Client):
         logging.info(f'Discord bot logged in as {self.user} (ID: {self.user.id})')
         print(f'Discord bot {self.user} is ready.')
         await self.change_presence(activity=discord.Game(name="with local LLMs"))
+        tool_runner.start_loop_lag_monitor()
 
     async def on_message(self, message: discord.Message):
         # 1. Ignore messages from the bot itself
@@ -139,30 +145,24 @@ class OfflineBotClient(discord.Client):
                 if not any(m['role'] == 'system' for m in history): messages_for_llm.append({"role": "system", "content": system_message})
                 messages_for_llm.extend(history)
 
-                # --- Call LLM (Run synchronously for simplicity, use executor for production) ---
+                # --- Call LLM (async: native for Ollama, a worker thread for local models) ---
+                tool_name, tool_result = None, None
                 try:
-                    # In a production bot, run blocking IO/CPU tasks in an executor:
-                    # loop = asyncio.get_running_loop()
-                    # llm_response_text = await loop.run_in_executor(
-                    #     None, # Default executor
-                    #     self.llm.generate_response_with_history,
-                    #     messages_for_llm
-                    # )
-                    llm_response_text = self.llm.generate_response_with_history(messages_for_llm) # Sync call
+                    if self.streaming_dispatch:
+                        # Streams in a worker thread; a tool call is executed as soon as it is complete
+                        llm_response_text, tool_name, tool_result = await asyncio.to_thread(
+                            stream_tool_turn, self.llm, messages_for_llm, self.config)
+                    else:
+                        llm_response_text = await self.llm.agenerate_response_with_history(messages_for_llm)
 
                 except Exception as e:
                     logging.error(f"LLM generation failed for channel {memory_key}: {e}", exc_info=True)
                     await message.reply("Sorry, I encountered an error while thinking.")
                     return # Stop processing this message
 
-                # --- Tool Check (Run synchronously for simplicity) ---
-                tool_name, tool_result = None, None
-                if self.tools_enabled:
-                    # loop = asyncio.get_running_loop()
-                    # tool_name, tool_result = await loop.run_in_executor(
-                    #      None, execute_tool, llm_response_text, self.config
-                    # )
-                    tool_name, tool_result = execute_tool(llm_response_text, self.config) # Sync call
+                # --- Tool Check (in the tool thread pool, so a slow tool doesn't stall the gateway) ---
+                if self.tools_enabled and not self.streaming_dispatch:
+                    tool_name, tool_result = await tool_runner.run_blocking(execute_tool, llm_response_text, self.config)
 
                 if tool_name and tool_result:
                     logging.info(f"Discord Bot: Tool '{tool_name}' called for channel {memory_key}. Result: {tool_result[:100]}...")
@@ -195,9 +195,7 @@ class OfflineBotClient(discord.Client):
 
                  logging.info(f"Generating final response after max tool iterations for channel {memory_key}.")
                  try:
-                     # loop = asyncio.get_running_loop()
-                     # final_response = await loop.run_in_executor(None, self.llm.generate_response_with_history, messages_for_llm)
-                     final_response = self.llm.generate_response_with_history(messages_for_llm) # Sync call
+                     final_response = await self.llm.agenerate_response_with_history(messages_for_llm)
                      memory.add_message("assistant", final_response)
                      await self.send_reply(message, final_response)
                  except Exception as e:
@@ -1,22 +1,46 @@
 from abc import ABC, abstractmethod
+import asyncio
+import collections
+import hashlib
+import itertools
+import json
 import logging
+import multiprocessing
+import queue
+import random
+import threading
 import time
 
+# Shared, ref-counted model cache (project root module) so the same GGUF is only resident once
+from model_registry import registry
+# Small/large routing rules (project root module, shared with llm_manager)
+import llm_router
+# Draft sources for speculative decoding (project root module)
+import speculative
+# In-process counters/histograms (project root module)
+import metrics
+# Per-host tuned llama.cpp settings (project root module)
+import autotune
+# Per-node health for the cluster interface (project root module)
+import circuit_breaker
+
 # --- Import LLM Libraries (handle optional dependencies) ---
 
 # Example for llama-cpp-python
 try:
-    from llama_cpp import Llama
+    from llama_cpp import Llama, LlamaGrammar
 except ImportError:
     Llama = None # Placeholder if not installed
+    LlamaGrammar = None
     logging.debug("llama-cpp-python not installed. LlamaCPPInterface will be unavailable.")
 
-# Example for Ollama
+# Ollama is spoken to over its REST API with the shared, pooled httpx clients
 try:
-    import ollama
+    import httpx
+    import http_client # Project root module
 except ImportError:
-    ollama = None # Placeholder if not installed
-    logging.debug("ollama library not installed. OllamaInterface will be unavailable.")
+    httpx = None # Placeholder if not installed
+    logging.debug("httpx not installed. OllamaInterface will be unavailable.")
 
 # --- Abstract Base Class ---
 
@@ -35,12 +59,14 @@ class LLMInterface(ABC):
         self.model_name = "Unknown" # Default, should be overridden
 
     @abstractmethod
-    def generate_response_with_history(self, messages: list) -> str:
+    def generate_response_with_history(self, messages: list, **params) -> str:
         """
         Generates a response from the LLM based on a structured message history.
         Args:
             messages (list): A list of message dictionaries, typically following
                              the OpenAI format: [{'role': 'user'/'assistant'/'system', 'content': '...'}, ...]
+            **params: Per-request sampling overrides (max_tokens, temperature, stop);
+                      backends apply the ones they support on top of their configured defaults.
         Returns:
             str: The generated text response from the LLM.
         """
@@ -50,8 +76,72 @@ class LLMInterface(ABC):
         """Returns the name or identifier of the loaded model."""
         return self.model_name
 
+    def warm_up(self, prompt: str = "Hello", max_tokens: int = 8) -> float:
+        """
+        Runs a short generation so the model weights are paged in before real traffic.
+        Args:
+            prompt (str): Throwaway prompt to generate from.
+            max_tokens (int): Upper bound on generated tokens (implementations may ignore it).
+        Returns:
+            float: Warm-up duration in seconds.
+        """
+        start_time = time.time()
+        self.generate_response_with_history([{"role": "user", "content": prompt}])
+        return time.time() - start_time
+
+    def set_tool_grammar(self, gbnf: str) -> bool:
+        """
+        Supplies a GBNF grammar for tool calls (see tools.build_tool_call_grammar).
+        Backends that support constrained decoding use it once a reply starts a tool call.
+        Returns:
+            bool: True if the grammar will be used (the default implementation ignores it).
+        """
+        return False
+
+    def stream_response_with_history(self, messages: list, **params):
+        """
+        Yields the response in pieces as it is generated.
+        The default yields the whole response at once; backends that can stream override it.
+        Args:
+            messages (list): OpenAI-style message history.
+            **params: Sampling overrides, as for generate_response_with_history.
+        Yields:
+            str: Text fragments; concatenated they form the full response.
+        """
+        yield self.generate_response_with_history(messages, **params)
+
+    async def agenerate_response_with_history(self, messages: list, **params) -> str:
+        """
+        Async variant of generate_response_with_history.
+        The default runs the blocking call in a worker thread so the event loop stays responsive.
+        """
+        return await asyncio.to_thread(self.generate_response_with_history, messages, **params)
+
+    async def astream_response_with_history(self, messages: list, **params):
+        """Async variant of stream_response_with_history (default: one fragment with the full response)."""
+        yield await self.agenerate_response_with_history(messages, **params)
+
 # --- Concrete Implementations ---
 
+def _tool_call_start(text: str):
+    """
+    Decides from the first characters of a reply whether it is a JSON tool call.
+    Returns True (tool call), False (plain text) or None (not enough text yet).
+    """
+    stripped = text.lstrip()
+    if not stripped:
+        return None
+    if stripped.startswith('{'):
+        return True
+    if not stripped.startswith('```'):
+        return None if '```'.startswith(stripped) else False
+    # Fenced block: a tool call if the first thing after the fence line is '{'
+    _lang, newline, body = stripped[3:].partition('\n')
+    body = body.lstrip()
+    if not newline or not body:
+        return None
+    return body.startswith('{')
+
 class LlamaCPPInterface(LLMInterface):
     """LLM Interface implementation using llama-cpp-python."""
     def __init__(self, config: dict):
@@ -69,24 +159,120 @@ class LlamaCPPInterface(LLMInterface):
         self.model_name = os.path.basename(model_path)
         n_gpu_layers = llm_config.get('n_gpu_layers', 0)
         n_ctx = llm_config.get('n_ctx', 2048)
+        use_mmap = llm_config.get('use_mmap', True)
+        use_mlock = llm_config.get('use_mlock', False)
+        # CPU threading/batching (unset = llama.cpp defaults; `python main.py --autotune` picks them per host)
+        cpu_params = {k: llm_config[k] for k in ('n_threads', 'n_threads_batch', 'n_batch') if llm_config.get(k)}
         logging.info(f"Initializing Llama model from: {model_path}")
-        logging.info(f"Using n_gpu_layers: {n_gpu_layers}, n_ctx: {n_ctx}")
+        logging.info(f"Using n_gpu_layers: {n_gpu_layers}, n_ctx: {n_ctx}, use_mmap: {use_mmap}, use_mlock: {use_mlock}, {cpu_params or 'default threads/batch'}")
+
+        # Grammar-constrained tool calls (the grammar itself comes from set_tool_grammar)
+        self.tool_grammar_enabled = llm_config.get('tool_grammar', False)
+        self._tool_grammar = None
+
+        # Optional speculative decoding (prompt lookup or a small draft model). The registry keys on
+        # the spec and builds the draft with the model, so equal configs share one loaded instance.
+        spec = speculative.load_spec(llm_config.get('speculative'))
+        spec_params = {'speculative': spec} if spec else {}
 
         try:
+            start_time = time.time()
             # Note: Adjust parameters like `n_batch` based on your hardware if needed
-            self.model = Llama(
-                model_path=model_path,
+            self._handle = registry.acquire(
+                "llama_cpp",
+                model_path,
                 n_gpu_layers=n_gpu_layers,
                 n_ctx=n_ctx,
+                use_mmap=use_mmap,
+                use_mlock=use_mlock,
+                **cpu_params,
                 verbose=logging.getLogger().level == logging.DEBUG, # Show Llama logs only if main logging is DEBUG
                 # chat_format="llama-2" # Or chatml, etc. - Check model compatibility if needed
+                **spec_params,
             )
-            logging.info(f"Llama model '{self.model_name}' loaded successfully.")
+            self._handle.get() # Load eagerly so configuration errors surface at startup
+            logging.info(f"Llama model '{self.model_name}' loaded successfully in {time.time() - start_time:.2f}s.")
         except Exception as e:
             logging.error(f"Failed to load Llama model from {model_path}: {e}", exc_info=True)
             raise
 
-    def generate_response_with_history(self, messages: list) -> str:
+        if llm_config.get('tool_grammar_gbnf'): # Passed down by ReplicaPoolInterface
+            self.set_tool_grammar(llm_config['tool_grammar_gbnf'])
+
+    def set_tool_grammar(self, gbnf: str) -> bool:
+        """Compiles the tool-call grammar if `llm.tool_grammar` is enabled."""
+        if not self.tool_grammar_enabled or not gbnf:
+            return False
+        if LlamaGrammar is None:
+            logging.warning("This llama-cpp-python build has no LlamaGrammar; tool calls stay unconstrained.")
+            return False
+        self._tool_grammar = LlamaGrammar.from_string(gbnf, verbose=False)
+        logging.info("Grammar-constrained tool calls enabled.")
+        return True
+
+    def _chat(self, model, messages: list, **kwargs):
+        # Adjust max_tokens, temperature, stop tokens etc. as needed
+        params = dict(
+            max_tokens=1024, # Sensible default, adjust based on expected response length
+            stop=["\nUser:", "</s>", "<|im_end|>"], # Common stop tokens, adjust per model
+            temperature=0.7,
+        )
+        params.update(kwargs)
+        return model.create_chat_completion(messages=messages, **params)
+
+    def _tool_aware_stream(self, model, messages: list, **params):
+        """
+        Streams a reply, but once its first characters show a tool call, drops the free-form
+        attempt and regenerates the call under the tool grammar. The grammar ends at the closing
+        brace, so the call always parses and generation stops as soon as it is complete.
+        The prompt is already in the KV cache, so the restart only repeats a few tokens.
+        """
+        stream = self._chat(model, messages, stream=True, **params)
+        head, decided = "", False
+        for chunk in stream:
+            piece = chunk['choices'][0].get('delta', {}).get('content') or ''
+            if decided:
+                yield piece
+                continue
+            head += piece
+            is_tool_call = _tool_call_start(head)
+            if is_tool_call is None:
+                continue
+            if is_tool_call:
+                stream.close()
+                # A tool call is short and should be near-deterministic, unless the caller said otherwise
+                tool_params = {'max_tokens': 512, 'temperature': 0.2, **params, 'grammar': self._tool_grammar}
+                response = self._chat(model, messages, **tool_params)
+                metrics.inc("llm_constrained_tool_calls_total", backend="llama_cpp", model=self.model_name)
+                yield response['choices'][0]['message']['content'].strip()
+                return
+            decided = True
+            yield head
+        if not decided and head:
+            yield head
+
+    @property
+    def model(self):
+        """The shared Llama instance (reloaded by the registry if it was evicted)."""
+        return self._handle.get()
+
+    @property
+    def speculative_stats(self):
+        """The loaded model's DraftStats, or None without speculative decoding (reset if the model is reloaded)."""
+        draft = getattr(self.model, 'draft_model', None)
+        return getattr(draft, 'stats', None)
+
+    def close(self, unload: bool = False):
+        """Releases the model handle (unload=True frees the weights now if nobody else uses them)."""
+        self._handle.release(unload=unload)
+
+    def warm_up(self, prompt: str = "Hello", max_tokens: int = 8) -> float:
+        """Runs a raw completion of a few tokens (skips chat templating and the 1024-token budget)."""
+        start_time = time.time()
+        self.model.create_completion(prompt, max_tokens=max_tokens, temperature=0.0)
+        return time.time() - start_time
+
+    def generate_response_with_history(self, messages: list, **params) -> str:
         """Generates response using llama-cpp's chat completion endpoint."""
         logging.debug(f"Generating LlamaCPP response for {len(messages)} messages...")
         if not messages:
@@ -95,13 +281,12 @@ class LlamaCPPInterface(LLMInterface):
 
         try:
             start_time = time.time()
-            # Adjust max_tokens, temperature, stop tokens etc. as needed
-            response = self.model.create_chat_completion(
-                messages=messages,
-                max_tokens=1024, # Sensible default, adjust based on expected response length
-                stop=["\nUser:", "</s>", "<|im_end|>"], # Common stop tokens, adjust per model
-                temperature=0.7,
-            )
+            with self._handle as model: # Pin the model so it isn't evicted mid-generation
+                if self._tool_grammar is not None:
+                    content = "".join(self._tool_aware_stream(model, messages, **params)).strip()
+                    logging.info(f"LlamaCPP response generated in {time.time() - start_time:.2f}s (tool grammar mode).")
+                    return content
+                response = self._chat(model, messages, **params)
             duration = time.time() - start_time
             content = response['choices'][0]['message']['content'].strip()
             # Log token usage if available
@@ -109,53 +294,175 @@ class LlamaCPPInterface(LLMInterface):
             prompt_tokens = usage.get('prompt_tokens', 'N/A')
             completion_tokens = usage.get('completion_tokens', 'N/A')
             logging.info(f"LlamaCPP response generated in {duration:.2f}s. Tokens: Prompt={prompt_tokens}, Completion={completion_tokens}")
+            if self.speculative_stats:
+                logging.debug(f"Speculative decoding: {self.speculative_stats.snapshot()}")
             logging.debug(f"LLM Raw Response: {content[:150]}...") # Log beginning of response
             return content
         except Exception as e:
             logging.error(f"Error during llama-cpp chat completion: {e}", exc_info=True)
             return "Sorry, I encountered an internal error while generating a response."
 
+    def stream_response_with_history(self, messages: list, **params):
+        """Streams the chat completion token by token (the model stays pinned until the stream ends)."""
+        if not messages:
+            yield "I need some input to respond!"
+            return
+        start_time, ttft = time.time(), None
+        try:
+            with self._handle as model:
+                if self._tool_grammar is not None:
+                    pieces = self._tool_aware_stream(model, messages, **params)
+                else:
+                    pieces = (chunk['choices'][0].get('delta', {}).get('content')
+                              for chunk in self._chat(model, messages, stream=True, **params))
+                for piece in pieces:
+                    if piece:
+                        if ttft is None:
+                            ttft = time.time() - start_time
+                            metrics.observe("llm_ttft_seconds", ttft, backend="llama_cpp", model=self.model_name)
+                        yield piece
+            metrics.observe("llm_latency_seconds", time.time() - start_time, backend="llama_cpp", model=self.model_name)
+        except Exception as e:
+            logging.error(f"Error during llama-cpp streaming chat completion: {e}", exc_info=True)
+            if ttft is None:
+                yield "Sorry, I encountered an internal error while generating a response."
+
 
 class OllamaInterface(LLMInterface):
-    """LLM Interface implementation using the Ollama library."""
+    """
+    LLM Interface implementation for an Ollama server.
+    Talks to the REST API over the shared pooled HTTP clients (sync and async), sets
+    `keep_alive` on every request so the model stays resident between users, can ping
+    the server in the background to keep it warm, and supports streaming.
+    """
+    ERROR_REPLY = "Sorry, I encountered an error communicating with the Ollama service."
+
     def __init__(self, config: dict):
         super().__init__(config)
-        if not ollama:
-            raise ImportError("ollama library is required for OllamaInterface but not installed.")
+        if not httpx:
+            raise ImportError("httpx is required for OllamaInterface but not installed.")
 
         llm_config = config['llm']
-        self.host = llm_config.get('host', 'http://localhost:11434') # Default Ollama host
+        self.host = llm_config.get('host', 'http://localhost:11434').rstrip('/') # Default Ollama host
         self.model_name = llm_config.get('model_name')
         if not self.model_name:
              raise ValueError("Missing 'model_name' in llm config for ollama type.")
+        # How long Ollama keeps the model loaded after a request ("30m", -1 = forever, 0 = unload now)
+        self.keep_alive = llm_config.get('keep_alive', '30m')
+        # Seconds between background keep-warm pings (0 disables the thread)
+        self.keep_warm_interval = float(llm_config.get('keep_warm_interval', 0) or 0)
+        self.options = llm_config.get('options') or {} # e.g. {"temperature": 0.7, "num_ctx": 4096}
+        self.timeout = httpx.Timeout(float(llm_config.get('timeout', 300)), connect=5.0)
 
-        logging.info(f"Initializing Ollama client for host: {self.host}")
-        logging.info(f"Using Ollama model: {self.model_name}")
-
-        try:
-            self.client = ollama.Client(host=self.host)
-            # Check connection and if model exists
-            available_models = [m['name'] for m in self.client.list().get('models', [])]
-            logging.debug(f"Available Ollama models: {available_models}")
-            if self.model_name not in available_models:
-                 logging.warning(f"Model '{self.model_name}' not found in Ollama's list. Ensure it's pulled or served.")
-                 # Optionally, try to pull it? Be careful with automatic downloads.
-                 # try:
-                 #     logging.info(f"Attempting to pull Ollama model '{self.model_name}'...")
-                 #     ollama.pull(self.model_name)
-                 # except Exception as pull_e:
-                 #     logging.error(f"Failed to pull Ollama model '{self.model_name}': {pull_e}")
-                 #     # Decide whether to raise error or continue
-            logging.info(f"Ollama client connected successfully to {self.host}.")
+        logging.info(f"Using Ollama model '{self.model_name}' at {self.host} (keep_alive={self.keep_alive})")
+        # No blocking round trip here: the connection is checked lazily (see check_model / warm_up)
+        self._keep_warm_stop = threading.Event()
+        self._keep_warm_thread = None
+        if self.keep_warm_interval > 0:
+            self.start_keep_warm()
 
-        except Exception as e:
-            logging.error(f"Failed to connect to Ollama host {self.host} or list models: {e}", exc_info=True)
+    # --- Connection helpers ---
+
+    # OpenAI-style sampling overrides -> Ollama option names
+    PARAM_OPTIONS = {'max_tokens': 'num_predict', 'temperature': 'temperature', 'stop': 'stop'}
+
+    def _chat_payload(self, messages: list, stream: bool, params: dict = None) -> dict:
+        payload = {"model": self.model_name, "messages": messages, "stream": stream, "keep_alive": self.keep_alive}
+        options = {**self.options, **{self.PARAM_OPTIONS[k]: v for k, v in (params or {}).items() if k in self.PARAM_OPTIONS}}
+        if options:
+            payload["options"] = options
+        return payload
+
+    def _load_payload(self) -> dict:
+        # A generate request without a prompt just loads the model and resets its keep_alive timer
+        return {"model": self.model_name, "keep_alive": self.keep_alive}
+
+    def check_model(self) -> bool:
+        """Returns True if the server lists the configured model (logs a warning otherwise)."""
+        try:
+            response = http_client.get_client().get(f"{self.host}/api/tags", timeout=10.0)
+            response.raise_for_status()
+            available = [m.get('name') for m in response.json().get('models', [])]
+        except httpx.HTTPError as e:
+            logging.error(f"Failed to reach Ollama host {self.host}: {e}")
+            return False
+        if self.model_name not in available:
+            logging.warning(f"Model '{self.model_name}' not found in Ollama's list. Ensure it's pulled or served.")
+            return False
+        return True
+
+    def warm_up(self, prompt: str = "Hello", max_tokens: int = 8) -> float:
+        """Asks Ollama to load the model (no generation); raises ConnectionError if the server is unreachable."""
+        start_time = time.time()
+        try:
+            response = http_client.get_client().post(f"{self.host}/api/generate", json=self._load_payload(), timeout=self.timeout)
+            response.raise_for_status()
+            load_s = (response.json().get('load_duration', 0) or 0) / 1e9
+            metrics.observe("llm_load_seconds", load_s, backend="ollama", model=self.model_name)
+        except httpx.HTTPError as e:
             logging.error("Please ensure the Ollama server is running and accessible.")
-            raise ConnectionError(f"Could not connect to Ollama at {self.host}")
+            raise ConnectionError(f"Could not connect to Ollama at {self.host}: {e}") from e
+        return time.time() - start_time
+
+    def start_keep_warm(self):
+        """Starts the background thread that pings Ollama every keep_warm_interval seconds."""
+        if self._keep_warm_thread and self._keep_warm_thread.is_alive():
+            return
+        self._keep_warm_stop.clear()
+        self._keep_warm_thread = threading.Thread(target=self._keep_warm_loop, name="ollama-keep-warm", daemon=True)
+        self._keep_warm_thread.start()
+        logging.info(f"Ollama keep-warm ping every {self.keep_warm_interval:.0f}s for '{self.model_name}'")
 
+    def _keep_warm_loop(self):
+        while not self._keep_warm_stop.wait(self.keep_warm_interval):
+            try:
+                response = http_client.get_client().post(f"{self.host}/api/generate", json=self._load_payload(), timeout=self.timeout)
+                response.raise_for_status()
+                data = response.json()
+                metrics.inc("llm_keep_warm_pings_total", backend="ollama", model=self.model_name)
+                if data.get('load_duration'):
+                    metrics.observe("llm_load_seconds", data['load_duration'] / 1e9, backend="ollama", model=self.model_name)
+            except httpx.HTTPError as e:
+                metrics.inc("llm_keep_warm_errors_total", backend="ollama", model=self.model_name)
+                logging.warning(f"Ollama keep-warm ping failed: {e}")
 
-    def generate_response_with_history(self, messages: list) -> str:
-        """Generates response using the ollama chat endpoint."""
+    def close(self):
+        """Stops the keep-warm thread (the pooled HTTP clients are shared and stay open)."""
+        self._keep_warm_stop.set()
+        if self._keep_warm_thread:
+            self._keep_warm_thread.join(timeout=5)
+            self._keep_warm_thread = None
+
+    def _record_stats(self, data: dict, duration: float, ttft: float = None):
+        """Logs Ollama's token/timing stats and records them in the metrics registry."""
+        labels = {"backend": "ollama", "model": self.model_name}
+        prompt_tokens = data.get('prompt_eval_count', 0) or 0
+        completion_tokens = data.get('eval_count', 0) or 0
+        load_s = (data.get('load_duration', 0) or 0) / 1e9
+        eval_s = (data.get('eval_duration', 0) or 0) / 1e9
+        prompt_eval_s = (data.get('prompt_eval_duration', 0) or 0) / 1e9
+
+        metrics.inc("llm_requests_total", **labels)
+        metrics.inc("llm_prompt_tokens_total", prompt_tokens, **labels)
+        metrics.inc("llm_completion_tokens_total", completion_tokens, **labels)
+        metrics.observe("llm_latency_seconds", duration, **labels)
+        metrics.observe("llm_load_seconds", load_s, **labels)
+        if ttft is not None:
+            metrics.observe("llm_ttft_seconds", ttft, **labels)
+        if prompt_eval_s and prompt_tokens:
+            metrics.set_gauge("llm_prompt_tokens_per_second", prompt_tokens / prompt_eval_s, **labels)
+        if eval_s and completion_tokens:
+            metrics.set_gauge("llm_tokens_per_second", completion_tokens / eval_s, **labels)
+        logging.info(f"Ollama response generated in {duration:.2f}s (load {load_s:.2f}s). "
+                     f"Tokens: Prompt={prompt_tokens}, Completion={completion_tokens}")
+
+    def _record_error(self):
+        metrics.inc("llm_errors_total", backend="ollama", model=self.model_name)
+
+    # --- Generation ---
+
+    def generate_response_with_history(self, messages: list, **params) -> str:
+        """Generates response using the Ollama /api/chat endpoint."""
         logging.debug(f"Generating Ollama response for {len(messages)} messages using model '{self.model_name}'...")
         if not messages:
             logging.warning("generate_response_with_history called with empty messages list.")
@@ -163,27 +470,1217 @@ class OllamaInterface(LLMInterface):
 
         try:
             start_time = time.time()
-            # You can add options like temperature, top_p etc. here if needed
-            # options = {"temperature": 0.7}
-            response = self.client.chat(
-                model=self.model_name,
-                messages=messages,
-                # options=options
-            )
-            duration = time.time() - start_time
-            content = response['message']['content'].strip()
-            # Log token usage if available
-            prompt_tokens = response.get('prompt_eval_count', 'N/A')
-            completion_tokens = response.get('eval_count', 'N/A')
-            logging.info(f"Ollama response generated in {duration:.2f}s. Tokens: Prompt={prompt_tokens}, Completion={completion_tokens}")
+            response = http_client.get_client().post(
+                f"{self.host}/api/chat", json=self._chat_payload(messages, stream=False, params=params), timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+            content = data['message']['content'].strip()
+            self._record_stats(data, time.time() - start_time)
             logging.debug(f"LLM Raw Response: {content[:150]}...")
             return content
-        except Exception as e:
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            self._record_error()
             logging.error(f"Error during Ollama chat completion: {e}", exc_info=True)
-            return "Sorry, I encountered an error communicating with the Ollama service."
+            return self.ERROR_REPLY
+
+    def stream_response_with_history(self, messages: list, **params):
+        """Streams the reply from /api/chat as it is generated (NDJSON chunks)."""
+        if not messages:
+            yield "I need some input to respond!"
+            return
+        start_time, ttft = time.time(), None
+        try:
+            with http_client.get_client().stream(
+                    "POST", f"{self.host}/api/chat", json=self._chat_payload(messages, stream=True, params=params), timeout=self.timeout) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if 'error' in chunk:
+                        raise ValueError(chunk['error'])
+                    piece = chunk.get('message', {}).get('content', '')
+                    if piece:
+                        if ttft is None:
+                            ttft = time.time() - start_time
+                        yield piece
+                    if chunk.get('done'):
+                        self._record_stats(chunk, time.time() - start_time, ttft)
+        except (httpx.HTTPError, ValueError) as e:
+            self._record_error()
+            logging.error(f"Error during Ollama streaming chat: {e}", exc_info=True)
+            if ttft is None:
+                yield self.ERROR_REPLY
+
+    async def agenerate_response_with_history(self, messages: list, **params) -> str:
+        """Async /api/chat call on the event loop's pooled client (no worker thread)."""
+        if not messages:
+            logging.warning("agenerate_response_with_history called with empty messages list.")
+            return "I need some input to respond!"
+        try:
+            start_time = time.time()
+            response = await http_client.get_async_client().post(
+                f"{self.host}/api/chat", json=self._chat_payload(messages, stream=False, params=params), timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+            content = data['message']['content'].strip()
+            self._record_stats(data, time.time() - start_time)
+            return content
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            self._record_error()
+            logging.error(f"Error during async Ollama chat completion: {e}", exc_info=True)
+            return self.ERROR_REPLY
+
+    async def astream_response_with_history(self, messages: list, **params):
+        """Async streaming from /api/chat."""
+        if not messages:
+            yield "I need some input to respond!"
+            return
+        start_time, ttft = time.time(), None
+        try:
+            async with http_client.get_async_client().stream(
+                    "POST", f"{self.host}/api/chat", json=self._chat_payload(messages, stream=True, params=params), timeout=self.timeout) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    if 'error' in chunk:
+                        raise ValueError(chunk['error'])
+                    piece = chunk.get('message', {}).get('content', '')
+                    if piece:
+                        if ttft is None:
+                            ttft = time.time() - start_time
+                        yield piece
+                    if chunk.get('done'):
+                        self._record_stats(chunk, time.time() - start_time, ttft)
+        except (httpx.HTTPError, ValueError) as e:
+            self._record_error()
+            logging.error(f"Error during async Ollama streaming chat: {e}", exc_info=True)
+            if ttft is None:
+                yield self.ERROR_REPLY
+
+class FakeLLMInterface(LLMInterface):
+    """
+    Deterministic stand-in for a model, for benchmarking the layers above it
+    (prompt building, memory, the tool loop) without loading weights.
+    The same messages always produce the same reply. Latency is simulated as
+    prompt_token_latency per prompt token, then token_latency per generated token.
+    """
+    VOCAB = ("the", "port", "scan", "host", "result", "is", "open", "closed", "service", "banner",
+             "domain", "record", "shows", "a", "likely", "server", "version", "and", "no", "issues")
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        llm_config = config['llm']
+        self.model_name = llm_config.get('model_name', 'fake')
+        self.token_latency = float(llm_config.get('token_latency', 0.02)) # Seconds per generated token
+        self.prompt_token_latency = float(llm_config.get('prompt_token_latency', 0.0005)) # Seconds per prompt token
+        self.response_tokens = int(llm_config.get('response_tokens', 48))
+        # Fraction of user turns answered with a tool call (only when the system prompt offers tools)
+        self.tool_call_rate = float(llm_config.get('tool_call_rate', 0.0))
+        self.tool_call = llm_config.get('tool_call', {"tool_name": "get_current_datetime", "arguments": {}})
+        logging.info(f"Using fake LLM backend ({self.token_latency * 1000:.0f} ms/token, {self.response_tokens} tokens/reply)")
+
+    def _plan(self, messages: list, max_tokens: int = None) -> tuple[float, list[str]]:
+        """Returns (prompt processing delay, reply pieces) for these messages (at most max_tokens pieces)."""
+        prompt_tokens = sum(llm_router.estimate_tokens(m.get('content', '')) for m in messages)
+        digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode('utf-8')).digest()
+        offers_tools = any(m['role'] == 'system' and '"tool_name"' in m['content'] for m in messages)
+        if offers_tools and messages[-1]['role'] == 'user' and digest[0] / 256 < self.tool_call_rate:
+            return prompt_tokens * self.prompt_token_latency, [json.dumps(self.tool_call)]
+        rng = random.Random(digest)
+        words = [rng.choice(self.VOCAB) for _ in range(min(self.response_tokens, max_tokens or self.response_tokens))]
+        return prompt_tokens * self.prompt_token_latency, [words[0]] + [" " + w for w in words[1:]]
+
+    def generate_response_with_history(self, messages: list, **params) -> str:
+        if not messages:
+            return "I need some input to respond!"
+        delay, pieces = self._plan(messages, params.get('max_tokens'))
+        time.sleep(delay + self.token_latency * len(pieces))
+        return "".join(pieces)
+
+    def stream_response_with_history(self, messages: list, **params):
+        if not messages:
+            yield "I need some input to respond!"
+            return
+        delay, pieces = self._plan(messages, params.get('max_tokens'))
+        time.sleep(delay)
+        for piece in pieces:
+            time.sleep(self.token_latency)
+            yield piece
+
+    async def agenerate_response_with_history(self, messages: list, **params) -> str:
+        if not messages:
+            return "I need some input to respond!"
+        delay, pieces = self._plan(messages, params.get('max_tokens'))
+        await asyncio.sleep(delay + self.token_latency * len(pieces))
+        return "".join(pieces)
+
+    async def astream_response_with_history(self, messages: list, **params):
+        if not messages:
+            yield "I need some input to respond!"
+            return
+        delay, pieces = self._plan(messages, params.get('max_tokens'))
+        await asyncio.sleep(delay)
+        for piece in pieces:
+            await asyncio.sleep(self.token_latency)
+            yield piece
+
+class RemoteLLMInterface(LLMInterface):
+    """
+    Thin client for a model served by `main.py --serve` (or any OpenAI-compatible
+    /v1/chat/completions endpoint), over HTTP or a Unix socket ("unix:///path.sock").
+    Lets every frontend process share one resident model instead of loading its own.
+    """
+    ERROR_REPLY = "Sorry, I encountered an error communicating with the LLM server."
+    _DONE = object()
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        if not httpx:
+            raise ImportError("httpx is required for RemoteLLMInterface but not installed.")
+        llm_config = config['llm']
+        server_url = llm_config.get('server_url') or os.getenv('LLM_SERVER_URL')
+        if not server_url:
+            raise ValueError("Missing 'server_url' in llm config for remote type (or set LLM_SERVER_URL).")
+        self.base_url, self.uds = http_client.split_url(server_url)
+        self.timeout = httpx.Timeout(float(llm_config.get('timeout', 300)), connect=5.0)
+        self.model_name = llm_config.get('model_name') or f"remote:{server_url}"
+        logging.info(f"Using LLM server at {server_url}")
+
+    def _payload(self, messages: list, stream: bool, params: dict) -> dict:
+        return {"model": self.model_name, "messages": messages, "stream": stream, **params}
+
+    @staticmethod
+    def _event_piece(line: str):
+        """Content of one server-sent event line (None if it carries none, _DONE at the end of the stream)."""
+        if not line.startswith("data:"):
+            return None
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return RemoteLLMInterface._DONE
+        chunk = json.loads(data)
+        if 'error' in chunk:
+            raise ValueError(chunk['error'])
+        return chunk['choices'][0]['delta'].get('content')
+
+    def check_model(self) -> bool:
+        """Returns True if the server answers /v1/models (and adopts the served model's name)."""
+        try:
+            response = http_client.get_client(self.uds).get(f"{self.base_url}/v1/models", timeout=10.0)
+            response.raise_for_status()
+            served = [m['id'] for m in response.json().get('data', [])]
+        except (httpx.HTTPError, KeyError, ValueError) as e:
+            logging.error(f"Failed to reach LLM server at {self.base_url}: {e}")
+            return False
+        if served and self.model_name.startswith("remote:"):
+            self.model_name = served[0]
+        return bool(served)
+
+    def warm_up(self, prompt: str = "Hello", max_tokens: int = 8) -> float:
+        """The server warms its own model; this only checks that it is reachable."""
+        start_time = time.time()
+        if not self.check_model():
+            raise ConnectionError(f"Could not connect to the LLM server at {self.base_url}")
+        return time.time() - start_time
+
+    def generate_response_with_history(self, messages: list, **params) -> str:
+        try:
+            response = http_client.get_client(self.uds).post(
+                f"{self.base_url}/v1/chat/completions", json=self._payload(messages, stream=False, params=params), timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()['choices'][0]['message']['content']
+        except (httpx.HTTPError, KeyError, IndexError, ValueError) as e:
+            logging.error(f"Error calling the LLM server: {e}", exc_info=True)
+            return self.ERROR_REPLY
+
+    def stream_response_with_history(self, messages: list, **params):
+        started = False
+        try:
+            with http_client.get_client(self.uds).stream(
+                    "POST", f"{self.base_url}/v1/chat/completions", json=self._payload(messages, stream=True, params=params), timeout=self.timeout) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    piece = self._event_piece(line)
+                    if piece is self._DONE:
+                        return
+                    if piece:
+                        started = True
+                        yield piece
+        except (httpx.HTTPError, KeyError, IndexError, ValueError) as e:
+            logging.error(f"Error streaming from the LLM server: {e}", exc_info=True)
+            if not started:
+                yield self.ERROR_REPLY
+
+    async def agenerate_response_with_history(self, messages: list, **params) -> str:
+        try:
+            response = await http_client.get_async_client(self.uds).post(
+                f"{self.base_url}/v1/chat/completions", json=self._payload(messages, stream=False, params=params), timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()['choices'][0]['message']['content']
+        except (httpx.HTTPError, KeyError, IndexError, ValueError) as e:
+            logging.error(f"Error calling the LLM server: {e}", exc_info=True)
+            return self.ERROR_REPLY
+
+    async def astream_response_with_history(self, messages: list, **params):
+        started = False
+        try:
+            async with http_client.get_async_client(self.uds).stream(
+                    "POST", f"{self.base_url}/v1/chat/completions", json=self._payload(messages, stream=True, params=params), timeout=self.timeout) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    piece = self._event_piece(line)
+                    if piece is self._DONE:
+                        return
+                    if piece:
+                        started = True
+                        yield piece
+        except (httpx.HTTPError, KeyError, IndexError, ValueError) as e:
+            logging.error(f"Error streaming from the LLM server: {e}", exc_info=True)
+            if not started:
+                yield self.ERROR_REPLY
+
+class ReplicaCrashedError(RuntimeError):
+    """A replica process died while handling a request."""
+
+
+def _replica_worker(config: dict, conn, index: int):
+    """Entry point of a replica process: builds one backend and serves requests from the pipe."""
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - %(levelname)s - [replica {index}] - %(message)s')
+    try:
+        llm = _create_interface(config)
+    except Exception as e:
+        logging.error(f"Replica {index} failed to start: {e}", exc_info=True)
+        conn.send((None, 'failed', repr(e)))
+        return
+    conn.send((None, 'ready', llm.get_model_name()))
+
+    backlog = collections.deque() # Requests that arrived while a stream was running
+
+    def cancelled(req_id) -> bool:
+        """Drains the pipe without blocking; True if the parent cancelled this stream."""
+        hit = False
+        while conn.poll():
+            message = conn.recv()
+            if message is not None and message[1] == 'cancel':
+                hit = hit or message[0] == req_id
+            else:
+                backlog.append(message)
+        return hit
+
+    while True:
+        try:
+            message = backlog.popleft() if backlog else conn.recv()
+        except (EOFError, OSError): # Parent went away
+            break
+        if message is None: # Shutdown
+            break
+        req_id, kind, payload = message
+        if kind == 'cancel': # The stream it refers to already finished
+            continue
+        try:
+            if kind == 'generate':
+                messages, params = payload
+                conn.send((req_id, 'result', llm.generate_response_with_history(messages, **params)))
+            elif kind == 'stream':
+                messages, params = payload
+                stream = llm.stream_response_with_history(messages, **params)
+                for piece in stream:
+                    if cancelled(req_id): # Closing the generator stops the backend's generation
+                        stream.close()
+                        break
+                    conn.send((req_id, 'chunk', piece))
+                conn.send((req_id, 'end', None))
+            elif kind == 'warm_up':
+                conn.send((req_id, 'result', llm.warm_up(*payload)))
+            elif kind == 'set_tool_grammar':
+                conn.send((req_id, 'result', llm.set_tool_grammar(payload)))
+            else:
+                conn.send((req_id, 'error', f"Unknown request kind '{kind}'"))
+        except Exception as e:
+            logging.error(f"Replica {index} request failed: {e}", exc_info=True)
+            conn.send((req_id, 'error', repr(e)))
+
+
+class _Replica:
+    """Parent-side state of one replica process."""
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.ready = threading.Event()
+        self.in_flight = 0
+        self.pending = set() # Request ids currently assigned to this replica
+        self.restarts = 0
+        self.backoff = 1.0
+        self.start_error = None
+        self.came_up = False # Reported ready since its last (re)start
+        self.failed_starts = 0 # Consecutive starts that never became ready
+        self.failed = False # Given up on: no more restarts
+
+
+class ReplicaPoolInterface(LLMInterface):
+    """
+    Runs N copies of a backend in worker processes and balances requests across them.
+    Each replica has its own model context (and its own GIL); with use_mmap the weights
+    are mapped from the same file, so RAM for them is shared through the page cache.
+    Requests go to the replica with the fewest in-flight requests over a local pipe, and
+    crashed replicas are restarted with exponential backoff. A replica that fails
+    `replica_start_attempts` starts in a row without ever becoming ready is given up on.
+    """
+    def __init__(self, config: dict):
+        super().__init__(config)
+        llm_config = config['llm']
+        self.size = int(llm_config.get('replicas', 2))
+        self.start_timeout = float(llm_config.get('replica_start_timeout', 300))
+        self.start_attempts = max(1, int(llm_config.get('replica_start_attempts', 3)))
+        self.child_config = self._child_config(config, self.size)
+        self.model_name = f"{self.size}x {llm_config.get('model_name') or os.path.basename(llm_config.get('model_path', '')) or llm_config['type']}"
+
+        self._ctx = multiprocessing.get_context('spawn') # fork is unsafe with threads and native model state
+        self._lock = threading.Lock()
+        self._capacity = threading.Condition(self._lock) # Signalled when a replica becomes ready
+        self._requests: dict[int, queue.Queue] = {}
+        self._ids = itertools.count(1)
+        self._rr = itertools.count()
+        self._closing = False
+        self.replicas = [_Replica(i) for i in range(self.size)]
+
+        logging.info(f"Starting {self.size} '{llm_config['type']}' replicas "
+                     f"({self.child_config['llm'].get('n_threads', 'default')} threads each)...")
+        for replica in self.replicas:
+            self._start(replica)
+        with self._lock: # Wait until every replica is either ready or has reported a startup error
+            self._capacity.wait_for(lambda: all(r.ready.is_set() or r.start_error for r in self.replicas),
+                                    timeout=self.start_timeout)
+        ready = sum(r.ready.is_set() for r in self.replicas)
+        if not ready:
+            errors = {r.start_error for r in self.replicas if r.start_error}
+            self.close()
+            raise RuntimeError(f"No LLM replica could be started: {'; '.join(errors) or 'startup timed out'}")
+        logging.info(f"LLM replica pool ready: {ready}/{self.size} replicas.")
+
+    @staticmethod
+    def _child_config(config: dict, size: int) -> dict:
+        """Config for one replica: no further pooling, and the host's cores split between replicas."""
+        child = _with_host_profile(config) if config['llm']['type'].lower() == 'llama_cpp' else config
+        llm_config = {**child['llm'], 'replicas': 1, 'use_host_profile': False}
+        llm_config.pop('router', None)
+        if llm_config['type'].lower() == 'llama_cpp':
+            share = max(1, (os.cpu_count() or 1) // size)
+            for key in ('n_threads', 'n_threads_batch'):
+                llm_config[key] = max(1, min(llm_config.get(key) or share, share))
+        return {**child, 'llm': llm_config}
+
+    # --- Process management ---
+
+    def _start(self, replica: _Replica):
+        parent_conn, child_conn = self._ctx.Pipe(duplex=True)
+        replica.conn = parent_conn
+        replica.ready.clear()
+        replica.came_up = False
+        replica.process = self._ctx.Process(
+            target=_replica_worker, args=(self.child_config, child_conn, replica.index),
+            name=f"llm-replica-{replica.index}", daemon=True)
+        replica.process.start()
+        child_conn.close() # The parent only keeps its own end, so a dead child shows up as EOF
+        threading.Thread(target=self._reader, args=(replica, parent_conn), name=f"llm-replica-{replica.index}-reader", daemon=True).start()
+
+    def _reader(self, replica: _Replica, conn):
+        while True:
+            try:
+                req_id, kind, payload = conn.recv()
+            except (EOFError, OSError):
+                break
+            if req_id is None:
+                if kind == 'ready':
+                    logging.info(f"LLM replica {replica.index} ready (pid {replica.process.pid}).")
+                    with self._lock:
+                        replica.backoff = 1.0
+                        replica.came_up = True
+                        replica.failed_starts = 0
+                        replica.ready.set()
+                        self._capacity.notify_all()
+                    metrics.set_gauge("llm_replica_up", 1, replica=replica.index)
+                else:
+                    with self._lock:
+                        replica.start_error = payload
+                        self._capacity.notify_all()
+                continue
+            with self._lock:
+                target = self._requests.get(req_id)
+            if target is not None:
+                target.put((kind, payload))
+        self._on_exit(replica, conn)
+
+    def _on_exit(self, replica: _Replica, conn):
+        conn.close()
+        replica.process.join(timeout=5)
+        with self._lock:
+            replica.ready.clear()
+            orphaned = [self._requests.get(r) for r in replica.pending]
+            replica.pending.clear()
+            replica.in_flight = 0
+        metrics.set_gauge("llm_replica_up", 0, replica=replica.index)
+        for target in orphaned:
+            if target is not None:
+                target.put(('crashed', f"replica {replica.index} exited with code {replica.process.exitcode}"))
+        if self._closing:
+            return
+        if not replica.came_up:
+            replica.failed_starts += 1
+            if replica.failed_starts >= self.start_attempts:
+                # A config or model problem, not a crash: restarting would fail the same way forever
+                with self._lock:
+                    replica.failed = True
+                    self._capacity.notify_all() # Waiters may now have no replica left to wait for
+                metrics.set_gauge("llm_replica_failed", 1, replica=replica.index)
+                logging.error(f"LLM replica {replica.index} failed to start {replica.failed_starts} times in a row "
+                              f"({replica.start_error or f'exit code {replica.process.exitcode}'}); giving up on it.")
+                return
+        replica.restarts += 1
+        metrics.inc("llm_replica_restarts_total", replica=replica.index)
+        delay = replica.backoff
+        replica.backoff = min(replica.backoff * 2, 60.0)
+        logging.error(f"LLM replica {replica.index} exited (code {replica.process.exitcode}); restarting in {delay:.0f}s.")
+        timer = threading.Timer(delay, lambda: None if self._closing else self._start(replica))
+        timer.daemon = True
+        timer.start()
+
+    # --- Dispatch ---
+
+    def _acquire_replica(self) -> _Replica:
+        """Least-loaded ready replica (ties broken round-robin); waits while none is ready."""
+        deadline = time.time() + self.start_timeout
+        with self._lock:
+            while True:
+                ready = [r for r in self.replicas if r.ready.is_set()]
+                if ready:
+                    offset = next(self._rr)
+                    ready = ready[offset % len(ready):] + ready[:offset % len(ready)]
+                    replica = min(ready, key=lambda r: r.in_flight)
+                    replica.in_flight += 1
+                    metrics.set_gauge("llm_replica_in_flight", replica.in_flight, replica=replica.index)
+                    return replica
+                if all(r.failed for r in self.replicas):
+                    raise ReplicaCrashedError("Every LLM replica failed to start.")
+                if self._closing or not self._capacity.wait(timeout=max(0.0, deadline - time.time())):
+                    raise ReplicaCrashedError("No LLM replica is available.")
+
+    def _submit(self, kind: str, payload, replica: _Replica = None) -> tuple[_Replica, int, queue.Queue]:
+        req_id = next(self._ids)
+        target = queue.Queue()
+        with self._lock:
+            if replica is not None: # Addressed to one replica (e.g. configuration broadcasts)
+                replica.in_flight += 1
+        replica = replica or self._acquire_replica()
+        with self._lock:
+            self._requests[req_id] = target
+            replica.pending.add(req_id)
+        try:
+            with replica.send_lock:
+                replica.conn.send((req_id, kind, payload))
+        except (OSError, ValueError) as e: # Pipe already closed; the reader will restart the replica
+            target.put(('crashed', str(e)))
+        return replica, req_id, target
+
+    def _finish(self, replica: _Replica, req_id: int):
+        with self._lock:
+            self._requests.pop(req_id, None)
+            if req_id in replica.pending:
+                replica.pending.discard(req_id)
+                replica.in_flight = max(0, replica.in_flight - 1)
+            metrics.set_gauge("llm_replica_in_flight", replica.in_flight, replica=replica.index)
+
+    def _call(self, kind: str, payload, attempts: int = 2, replica: _Replica = None):
+        """Runs one request, retrying once on another replica if its replica crashed."""
+        for attempt in range(attempts):
+            replica, req_id, target = self._submit(kind, payload, replica if attempt == 0 else None)
+            try:
+                status, value = target.get()
+            finally:
+                self._finish(replica, req_id)
+            if status == 'result':
+                return value
+            if status == 'crashed' and attempt + 1 < attempts:
+                logging.warning(f"Retrying request after {value}.")
+                continue
+            raise ReplicaCrashedError(value) if status == 'crashed' else RuntimeError(value)
+
+    def warm_up(self, prompt: str = "Hello", max_tokens: int = 8) -> float:
+        """Warms every replica in parallel; returns the slowest warm-up."""
+        def warm_one(replica):
+            try:
+                self._call('warm_up', (prompt, max_tokens), attempts=1, replica=replica)
+            except Exception as e:
+                logging.warning(f"Replica {replica.index} warm-up failed: {e}")
+
+        start_time = time.time()
+        threads = [threading.Thread(target=warm_one, args=(r,)) for r in self.replicas if r.ready.is_set()]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.time() - start_time
+
+    def set_tool_grammar(self, gbnf: str) -> bool:
+        """Sends the grammar to every running replica and to the config used for restarts."""
+        self.child_config['llm']['tool_grammar_gbnf'] = gbnf
+        applied = False
+        for replica in [r for r in self.replicas if r.ready.is_set()]:
+            try:
+                applied = self._call('set_tool_grammar', gbnf, attempts=1, replica=replica) or applied
+            except Exception as e:
+                logging.warning(f"Could not set the tool grammar on a replica: {e}")
+        return applied
+
+    def generate_response_with_history(self, messages: list, **params) -> str:
+        try:
+            return self._call('generate', (messages, params))
+        except Exception as e:
+            logging.error(f"Replica pool generation failed: {e}")
+            return "Sorry, I encountered an internal error while generating a response."
+
+    def stream_response_with_history(self, messages: list, **params):
+        """
+        Streams from one replica (no retry once output has started).
+        Closing the generator early cancels the generation in the replica.
+        """
+        replica, req_id, target = self._submit('stream', (messages, params))
+        done = False
+        try:
+            while True:
+                status, value = target.get()
+                if status == 'chunk':
+                    yield value
+                    continue
+                done = True
+                if status != 'end':
+                    logging.error(f"Replica pool streaming failed: {value}")
+                    yield "Sorry, I encountered an internal error while generating a response."
+                return
+        finally:
+            self._finish(replica, req_id)
+            if not done:
+                try:
+                    with replica.send_lock:
+                        replica.conn.send((req_id, 'cancel', None))
+                except (OSError, ValueError):
+                    pass
+
+    def stats(self) -> list[dict]:
+        """Per-replica state for logging/diagnostics."""
+        with self._lock:
+            return [{"replica": r.index, "pid": r.process.pid if r.process else None, "ready": r.ready.is_set(),
+                     "in_flight": r.in_flight, "restarts": r.restarts, "failed": r.failed} for r in self.replicas]
+
+    def close(self):
+        """Stops every replica process."""
+        self._closing = True
+        with self._lock:
+            self._capacity.notify_all()
+        for replica in self.replicas:
+            try:
+                with replica.send_lock:
+                    replica.conn.send(None)
+            except (OSError, ValueError, AttributeError):
+                pass
+        for replica in self.replicas:
+            if replica.process is not None:
+                replica.process.join(timeout=10)
+                if replica.process.is_alive():
+                    replica.process.terminate()
+
+class _Node:
+    """One endpoint behind ClusterLLMInterface."""
+    def __init__(self, name: str, llm: LLMInterface):
+        self.name = name
+        self.llm = llm
+        self.in_flight = 0
+        self.latency = None # EWMA of recent request latencies, seconds
+        self.breaker = circuit_breaker.get_breaker(f"llm-node:{name}")
+        if hasattr(llm, 'check_model'):
+            circuit_breaker.prober.register(self.breaker, llm.check_model)
+
+    def failed(self, reply: str) -> bool:
+        # Network backends report errors as their fixed error reply rather than raising
+        return reply == getattr(self.llm, 'ERROR_REPLY', None)
+
+
+class ClusterLLMInterface(LLMInterface):
+    """
+    Spreads requests across several model endpoints listed in llm.nodes (`main.py --serve`
+    instances, Ollama hosts, or any other backend type), so capacity grows with every node added.
+    Each request goes to the healthy node with the fewest in-flight requests (ties: lowest recent
+    latency). A conversation stays on the node that last served it unless that node is more than
+    `affinity_slack` requests busier than the least-loaded one, so its KV cache keeps being reused.
+    Failing nodes are skipped through per-node circuit breakers and the request moves on.
+    """
+    ERROR_REPLY = "Sorry, no LLM node is available right now."
+    AFFINITY_SIZE = 4096 # Conversations remembered for affinity
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        llm_config = config['llm']
+        if not llm_config.get('nodes'):
+            raise ValueError("Missing 'nodes' in llm config for cluster type.")
+        self.affinity_slack = int(llm_config.get('affinity_slack', 1))
+        self.latency_alpha = float(llm_config.get('latency_ewma_alpha', 0.3))
+        self._lock = threading.Lock()
+        self._affinity = collections.OrderedDict() # conversation key -> _Node
+
+        base = {k: v for k, v in llm_config.items() if k not in ('router', 'nodes', 'type')}
+        self.nodes = []
+        for i, node_config in enumerate(llm_config['nodes']):
+            node_llm = {**base, 'replicas': 1, 'type': 'remote', **node_config}
+            if node_llm['type'] == 'cluster':
+                raise ValueError("Cluster nodes cannot themselves be clusters.")
+            name = node_config.get('name') or node_config.get('server_url') or node_config.get('host') or f"node{i}"
+            self.nodes.append(_Node(name, _create_interface({**config, 'llm': node_llm})))
+        self.model_name = f"cluster({', '.join(n.name for n in self.nodes)})"
+        logging.info(f"Balancing LLM requests across {len(self.nodes)} nodes: {[n.name for n in self.nodes]}")
+
+    @staticmethod
+    def _conversation_key(messages: list) -> str:
+        """Stable for the life of a conversation: its system prompt and first user message."""
+        system = next((m.get('content', '') for m in messages if m.get('role') == 'system'), '')
+        first_user = next((m.get('content', '') for m in messages if m.get('role') == 'user'), '')
+        return hashlib.sha1(f"{system}\0{first_user}".encode('utf-8')).hexdigest()
+
+    def _acquire(self, key: str, tried: list) -> _Node | None:
+        with self._lock:
+            candidates = [n for n in self.nodes if n not in tried and n.breaker.state != circuit_breaker.OPEN]
+            candidates.sort(key=lambda n: (n.in_flight, n.latency or 0.0))
+            preferred = self._affinity.get(key)
+            if preferred in candidates and preferred.in_flight <= candidates[0].in_flight + self.affinity_slack:
+                candidates.remove(preferred)
+                candidates.insert(0, preferred)
+            for node in candidates:
+                if node.breaker.allow(): # Claims the trial slot of a half-open node
+                    node.in_flight += 1
+                    metrics.set_gauge("llm_node_in_flight", node.in_flight, node=node.name)
+                    metrics.inc("llm_node_requests_total", node=node.name, affinity=str(node is preferred).lower())
+                    return node
+        return None
+
+    def _release(self, node: _Node, key: str, duration: float, ok: bool):
+        with self._lock:
+            node.in_flight = max(0, node.in_flight - 1)
+            metrics.set_gauge("llm_node_in_flight", node.in_flight, node=node.name)
+            if ok:
+                node.latency = duration if node.latency is None else \
+                    self.latency_alpha * duration + (1 - self.latency_alpha) * node.latency
+                self._affinity[key] = node
+                self._affinity.move_to_end(key)
+                while len(self._affinity) > self.AFFINITY_SIZE:
+                    self._affinity.popitem(last=False)
+        if ok:
+            node.breaker.record_success()
+            metrics.observe("llm_node_latency_seconds", duration, node=node.name)
+        else:
+            node.breaker.record_failure()
+            metrics.inc("llm_node_failures_total", node=node.name)
+            logging.warning(f"LLM node '{node.name}' failed; trying another node.")
+
+    def warm_up(self, prompt: str = "Hello", max_tokens: int = 8) -> float:
+        """Warms every node in parallel; returns the slowest warm-up."""
+        def warm_one(node):
+            try:
+                node.llm.warm_up(prompt, max_tokens)
+            except Exception as e:
+                logging.warning(f"LLM node '{node.name}' warm-up failed: {e}")
+                node.breaker.trip()
+
+        start_time = time.time()
+        threads = [threading.Thread(target=warm_one, args=(n,)) for n in self.nodes]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.time() - start_time
+
+    def set_tool_grammar(self, gbnf: str) -> bool:
+        return any([n.llm.set_tool_grammar(gbnf) for n in self.nodes])
+
+    def generate_response_with_history(self, messages: list, **params) -> str:
+        key, tried = self._conversation_key(messages), []
+        while (node := self._acquire(key, tried)) is not None:
+            tried.append(node)
+            start_time = time.time()
+            try:
+                reply = node.llm.generate_response_with_history(messages, **params)
+                ok = not node.failed(reply)
+            except Exception as e:
+                logging.error(f"LLM node '{node.name}' raised: {e}")
+                ok = False
+            self._release(node, key, time.time() - start_time, ok)
+            if ok:
+                return reply
+        logging.error("No healthy LLM node could serve the request.")
+        return self.ERROR_REPLY
+
+    def stream_response_with_history(self, messages: list, **params):
+        """Streams from one node; moves to another only if a node fails before its first fragment."""
+        key, tried = self._conversation_key(messages), []
+        while (node := self._acquire(key, tried)) is not None:
+            tried.append(node)
+            start_time, started, ok = time.time(), False, True
+            try:
+                for piece in node.llm.stream_response_with_history(messages, **params):
+                    if not started and node.failed(piece):
+                        ok = False
+                        break
+                    started = True
+                    yield piece
+            except Exception as e:
+                logging.error(f"LLM node '{node.name}' raised while streaming: {e}")
+                ok = False
+            finally:
+                self._release(node, key, time.time() - start_time, ok)
+            if ok or started:
+                return
+        yield self.ERROR_REPLY
+
+    async def agenerate_response_with_history(self, messages: list, **params) -> str:
+        key, tried = self._conversation_key(messages), []
+        while (node := self._acquire(key, tried)) is not None:
+            tried.append(node)
+            start_time = time.time()
+            try:
+                reply = await node.llm.agenerate_response_with_history(messages, **params)
+                ok = not node.failed(reply)
+            except Exception as e:
+                logging.error(f"LLM node '{node.name}' raised: {e}")
+                ok = False
+            self._release(node, key, time.time() - start_time, ok)
+            if ok:
+                return reply
+        logging.error("No healthy LLM node could serve the request.")
+        return self.ERROR_REPLY
+
+    async def astream_response_with_history(self, messages: list, **params):
+        key, tried = self._conversation_key(messages), []
+        while (node := self._acquire(key, tried)) is not None:
+            tried.append(node)
+            start_time, started, ok = time.time(), False, True
+            try:
+                async for piece in node.llm.astream_response_with_history(messages, **params):
+                    if not started and node.failed(piece):
+                        ok = False
+                        break
+                    started = True
+                    yield piece
+            except Exception as e:
+                logging.error(f"LLM node '{node.name}' raised while streaming: {e}")
+                ok = False
+            finally:
+                self._release(node, key, time.time() - start_time, ok)
+            if ok or started:
+                return
+        yield self.ERROR_REPLY
+
+    def stats(self) -> list[dict]:
+        """Per-node load and health for logging/diagnostics."""
+        with self._lock:
+            return [{"node": n.name, "in_flight": n.in_flight, "latency": round(n.latency, 3) if n.latency else None,
+                     "state": n.breaker.state} for n in self.nodes]
+
+    def close(self):
+        for node in self.nodes:
+            if hasattr(node.llm, 'check_model'):
+                circuit_breaker.prober.unregister(node.breaker.name, node.llm.check_model)
+            close = getattr(node.llm, 'close', None)
+            if close:
+                close()
+
+
+class HedgedLLMInterface(LLMInterface):
+    """
+    Hedged requests for tail latency: each request streams from the primary backend, and if
+    no token has arrived within the primary's recent p95 time to first token, the same request
+    is also sent to the backup. Whichever produces a token first wins and the other is
+    cancelled at its next token, so only the slowest ~5% of requests cost double work.
+    A primary that fails before its first token hands over to the backup immediately.
+    """
+    ERROR_REPLY = "Sorry, I encountered an error while generating a response."
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        llm_config = config['llm']
+        base = {k: v for k, v in llm_config.items() if k not in ('router', 'primary', 'backup', 'type')}
+        arms = []
+        for role in ('primary', 'backup'):
+            arm_config = llm_config.get(role)
+            if not arm_config or 'type' not in arm_config:
+                raise ValueError(f"Missing 'llm.{role}' (with a 'type') for hedged type.")
+            arms.append(_create_interface({**config, 'llm': {**base, **arm_config}}))
+        self.arms = dict(zip(('primary', 'backup'), arms))
+        self.hedge_quantile = float(llm_config.get('hedge_quantile', 0.95))
+        # Used until enough first-token times are recorded to trust the quantile
+        self.initial_delay = float(llm_config.get('hedge_delay', 2.0))
+        self.min_delay = float(llm_config.get('hedge_min_delay', 0.05))
+        self.min_samples = int(llm_config.get('hedge_min_samples', 20))
+        self.model_name = f"hedged(primary={arms[0].get_model_name()}, backup={arms[1].get_model_name()})"
+        self._labels = {"model": self.model_name}
+        logging.info(f"Hedging LLM requests: {self.model_name}")
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary's first token before also asking the backup."""
+        if metrics.count("llm_hedge_ttft_seconds", arm="primary", **self._labels) < self.min_samples:
+            return self.initial_delay
+        p = metrics.quantile("llm_hedge_ttft_seconds", self.hedge_quantile, arm="primary", **self._labels)
+        return max(self.min_delay, p)
+
+    def _start(self, arm: str, messages: list, params: dict, events: queue.Queue, cancel: threading.Event):
+        def pump():
+            stream = self.arms[arm].stream_response_with_history(messages, **params)
+            try:
+                for piece in stream:
+                    if cancel.is_set():
+                        break
+                    events.put((arm, 'piece', piece))
+                events.put((arm, 'end', None))
+            except Exception as e:
+                events.put((arm, 'error', repr(e)))
+            finally:
+                stream.close() # Stops the losing backend's generation
+        threading.Thread(target=pump, name=f"llm-hedge-{arm}", daemon=True).start()
+
+    def stream_response_with_history(self, messages: list, **params):
+        events = queue.Queue()
+        cancels = {arm: threading.Event() for arm in self.arms}
+        started = {'primary': time.time()}
+        self._start('primary', messages, params, events, cancels['primary'])
+        deadline = started['primary'] + self.hedge_delay()
+        winner, failed = None, {}
+        try:
+            while True:
+                waiting_to_hedge = winner is None and 'backup' not in started
+                try:
+                    arm, kind, value = events.get(timeout=max(0.0, deadline - time.time()) if waiting_to_hedge else None)
+                except queue.Empty: # The primary is slower than its p95: hedge
+                    metrics.inc("llm_hedges_total", **self._labels)
+                    started['backup'] = time.time()
+                    self._start('backup', messages, params, events, cancels['backup'])
+                    continue
+
+                if arm in failed:
+                    continue
+                if winner is None:
+                    if kind == 'error' or (kind == 'piece' and value == getattr(self.arms[arm], 'ERROR_REPLY', None)):
+                        failed[arm] = value
+                        logging.warning(f"Hedged {arm} backend failed before its first token: {value}")
+                        if 'backup' not in started:
+                            started['backup'] = time.time()
+                            self._start('backup', messages, params, events, cancels['backup'])
+                        elif len(failed) == len(started):
+                            yield self.ERROR_REPLY
+                            return
+                        continue
+                    winner = arm
+                    loser = 'backup' if arm == 'primary' else 'primary'
+                    cancels[loser].set()
+                    metrics.inc("llm_hedge_wins_total", arm=arm, **self._labels)
+                    # A backup win means the primary took at least this long (recorded so p95 isn't biased low)
+                    metrics.observe("llm_hedge_ttft_seconds", time.time() - started['primary'], arm="primary", **self._labels)
+                    if arm == 'backup':
+                        metrics.observe("llm_hedge_ttft_seconds", time.time() - started['backup'], arm="backup", **self._labels)
+                elif arm != winner:
+                    continue # The loser's last events
+
+                if kind == 'piece':
+                    yield value
+                else:
+                    if kind == 'error':
+                        logging.error(f"Hedged {arm} backend failed mid-stream: {value}")
+                    return
+        finally:
+            for cancel in cancels.values():
+                cancel.set()
+
+    def generate_response_with_history(self, messages: list, **params) -> str:
+        return "".join(self.stream_response_with_history(messages, **params))
+
+    def warm_up(self, prompt: str = "Hello", max_tokens: int = 8) -> float:
+        return sum(llm.warm_up(prompt, max_tokens) for llm in self.arms.values())
+
+    def set_tool_grammar(self, gbnf: str) -> bool:
+        return any([llm.set_tool_grammar(gbnf) for llm in self.arms.values()])
+
+    def close(self):
+        for llm in self.arms.values():
+            close = getattr(llm, 'close', None)
+            if close:
+                close()
+
+
+class RoutedLLMInterface(LLMInterface):
+    """
+    Routes each request to a small, fast model or the large model.
+    Classification, tool-call extraction and short replies go to the small model;
+    long-form answers go to the large one (see llm_router.choose_backend for the rules).
+    """
+    def __init__(self, config: dict, small: LLMInterface, large: LLMInterface):
+        super().__init__(config)
+        router_config = config['llm'].get('router', {})
+        self.small = small
+        self.large = large
+        self.rules = {k: v for k, v in router_config.items() if k in llm_router.DEFAULT_RULES}
+        # Opt-in: let the small model try to extract a tool call before handing long-form turns
+        # to the large one (costs a small-model generation on every such turn)
+        self.tool_call_first = router_config.get('tool_call_first', False)
+        self.model_name = f"router(small={small.get_model_name()}, large={large.get_model_name()})"
+        self.route_counts = {llm_router.SMALL: 0, llm_router.LARGE: 0}
+        self._counts_lock = threading.Lock() # Called from server and replica threads at once
+        logging.info(f"Routing LLM requests between small='{small.get_model_name()}' and large='{large.get_model_name()}'")
+
+    def warm_up(self, prompt: str = "Hello", max_tokens: int = 8) -> float:
+        return self.small.warm_up(prompt, max_tokens) + self.large.warm_up(prompt, max_tokens)
+
+    def set_tool_grammar(self, gbnf: str) -> bool:
+        applied_small = self.small.set_tool_grammar(gbnf)
+        return self.large.set_tool_grammar(gbnf) or applied_small
+
+    def _count(self, backend: str):
+        with self._counts_lock:
+            self.route_counts[backend] += 1
+            counts = dict(self.route_counts)
+        metrics.inc("llm_route_total", backend=backend)
+        return counts
+
+    def _choose(self, messages: list, task: str = None) -> tuple[str, bool]:
+        """(backend, whether the small model should first try to extract a tool call)."""
+        backend = llm_router.choose_backend(messages, task=task, rules=self.rules)
+        offers_tools = any(m['role'] == 'system' and '"tool_name"' in m['content'] for m in messages)
+        try_small = backend == llm_router.LARGE and task is None and self.tool_call_first and offers_tools \
+            and bool(messages) and messages[-1]['role'] == 'user'
+        return backend, try_small
+
+    def _target(self, backend: str, task: str = None) -> LLMInterface:
+        counts = self._count(backend)
+        logging.debug(f"Router: '{backend}' model selected (task={task}). Totals: {counts}")
+        return self.small if backend == llm_router.SMALL else self.large
+
+    def _tool_call_draft(self, draft: str) -> bool:
+        if not llm_router.looks_like_tool_call(draft):
+            return False
+        logging.info("Router: small model extracted a tool call; skipping the large model.")
+        self._count(llm_router.SMALL)
+        return True
+
+    def generate_response_with_history(self, messages: list, task: str = None, **params) -> str:
+        """
+        Generates a response with whichever model the routing rules pick.
+        Args:
+            messages (list): OpenAI-style message history.
+            task (str, optional): Explicit hint such as 'classify', 'tool_call' or 'long_form'.
+            **params: Sampling overrides, passed to the chosen model.
+        """
+        backend, try_small = self._choose(messages, task)
+        if try_small:
+            draft = self.small.generate_response_with_history(messages, **params)
+            if self._tool_call_draft(draft):
+                return draft
+        return self._target(backend, task).generate_response_with_history(messages, **params)
+
+    def stream_response_with_history(self, messages: list, task: str = None, **params):
+        """Streams from the model the routing rules pick (routed once, before the first fragment)."""
+        backend, try_small = self._choose(messages, task)
+        if try_small:
+            draft = self.small.generate_response_with_history(messages, **params)
+            if self._tool_call_draft(draft):
+                yield draft
+                return
+        yield from self._target(backend, task).stream_response_with_history(messages, **params)
+
+    async def agenerate_response_with_history(self, messages: list, task: str = None, **params) -> str:
+        backend, try_small = self._choose(messages, task)
+        if try_small:
+            draft = await self.small.agenerate_response_with_history(messages, **params)
+            if self._tool_call_draft(draft):
+                return draft
+        return await self._target(backend, task).agenerate_response_with_history(messages, **params)
+
+    async def astream_response_with_history(self, messages: list, task: str = None, **params):
+        backend, try_small = self._choose(messages, task)
+        if try_small:
+            draft = await self.small.agenerate_response_with_history(messages, **params)
+            if self._tool_call_draft(draft):
+                yield draft
+                return
+        async for piece in self._target(backend, task).astream_response_with_history(messages, **params):
+            yield piece
+
+def _close_interface(llm: LLMInterface):
+    """Frees a backend that is no longer used (model weights included, if nobody else holds them)."""
+    if isinstance(llm, LlamaCPPInterface):
+        llm.close(unload=True)
+    elif isinstance(llm, RoutedLLMInterface):
+        _close_interface(llm.small)
+        _close_interface(llm.large)
+    elif hasattr(llm, 'close'):
+        llm.close()
+
+
+class HotSwapInterface(LLMInterface):
+    """
+    Holds the active backend and replaces it without downtime. swap() builds and warms the new
+    backend while the current one keeps serving, then switches new requests over in one step.
+    Requests already running finish on the old backend, which is freed once they have drained.
+    """
+    def __init__(self, config: dict, llm: LLMInterface):
+        super().__init__(config)
+        self._active = llm
+        self._in_flight: dict[int, int] = {} # id(backend) -> running requests
+        self._cond = threading.Condition()
+        self._swap_lock = threading.Lock() # One swap at a time
+        self._tool_grammar = None
+
+    @property
+    def active(self) -> LLMInterface:
+        return self._active
+
+    def get_model_name(self) -> str:
+        return self._active.get_model_name()
+
+    def _enter(self) -> LLMInterface:
+        with self._cond:
+            llm = self._active
+            self._in_flight[id(llm)] = self._in_flight.get(id(llm), 0) + 1
+            return llm
+
+    def _exit(self, llm: LLMInterface):
+        with self._cond:
+            self._in_flight[id(llm)] -= 1
+            self._cond.notify_all()
+
+    def swap(self, config: dict, drain_timeout: float = 300.0) -> LLMInterface:
+        """
+        Replaces the active backend with one built from `config` (see get_llm_interface).
+        Blocks until the old backend has drained and been closed, so call it from a worker thread.
+        Raises whatever loading the new backend raises; the current backend then stays active.
+        """
+        with self._swap_lock:
+            start_time = time.time()
+            logging.info(f"Hot swap: loading {config['llm'].get('model_path') or config['llm'].get('model_name') or config['llm']['type']} "
+                         f"while '{self.get_model_name()}' keeps serving")
+            new = get_llm_interface(config)
+            warmup_cfg = config['llm'].get('warmup', {})
+            if warmup_cfg.get('enabled', True):
+                new.warm_up(warmup_cfg.get('prompt', 'Hello'), warmup_cfg.get('max_tokens', 8))
+            if self._tool_grammar:
+                new.set_tool_grammar(self._tool_grammar)
+
+            with self._cond:
+                old, self._active = self._active, new
+                self.config = config
+            metrics.inc("llm_model_swaps_total")
+            metrics.observe("llm_model_swap_seconds", time.time() - start_time)
+            logging.info(f"Hot swap: now serving '{new.get_model_name()}' (ready in {time.time() - start_time:.1f}s); "
+                         f"draining '{old.get_model_name()}'")
+
+            with self._cond:
+                drained = self._cond.wait_for(lambda: self._in_flight.get(id(old), 0) == 0, timeout=drain_timeout)
+                self._in_flight.pop(id(old), None)
+            if not drained:
+                logging.warning(f"Hot swap: requests still running on '{old.get_model_name()}' after {drain_timeout:.0f}s; closing it anyway.")
+            _close_interface(old)
+            return new
+
+    def warm_up(self, prompt: str = "Hello", max_tokens: int = 8) -> float:
+        return self._active.warm_up(prompt, max_tokens)
+
+    def set_tool_grammar(self, gbnf: str) -> bool:
+        self._tool_grammar = gbnf # Re-applied to every swapped-in backend
+        return self._active.set_tool_grammar(gbnf)
+
+    def generate_response_with_history(self, messages: list, **params) -> str:
+        llm = self._enter()
+        try:
+            return llm.generate_response_with_history(messages, **params)
+        finally:
+            self._exit(llm)
+
+    def stream_response_with_history(self, messages: list, **params):
+        llm = self._enter()
+        try:
+            yield from llm.stream_response_with_history(messages, **params)
+        finally:
+            self._exit(llm)
+
+    async def agenerate_response_with_history(self, messages: list, **params) -> str:
+        llm = self._enter()
+        try:
+            return await llm.agenerate_response_with_history(messages, **params)
+        finally:
+            self._exit(llm)
+
+    async def astream_response_with_history(self, messages: list, **params):
+        llm = self._enter()
+        try:
+            async for piece in llm.astream_response_with_history(messages, **params):
+                yield piece
+        finally:
+            self._exit(llm)
+
+    def close(self):
+        _close_interface(self._active)
 
 # --- Factory Function ---
 
+def _create_interface(config: dict) -> LLMInterface:
+    """Creates a single backend interface for `config['llm']['type']`."""
+    llm_type = config['llm']['type'].lower()
+    logging.info(f"Attempting to load LLM interface of type: '{llm_type}'")
+
+    if llm_type == 'cluster':
+        return ClusterLLMInterface(config)
+    if llm_type == 'hedged':
+        return HedgedLLMInterface(config)
+    if int(config['llm'].get('replicas', 1) or 1) > 1:
+        return ReplicaPoolInterface(config)
+    if llm_type == 'llama_cpp':
+        return LlamaCPPInterface(_with_host_profile(config))
+    elif llm_type == 'ollama':
+        return OllamaInterface(config)
+    elif llm_type == 'fake':
+        return FakeLLMInterface(config)
+    elif llm_type == 'remote':
+        return RemoteLLMInterface(config)
+    # Add other types here:
+    # elif llm_type == 'ctransformers':
+    #    return CTransformersInterface(config) # Assuming you create this class
+    else:
+        raise ValueError(f"Unsupported LLM type specified in config: '{llm_type}'")
+
+def _with_host_profile(config: dict) -> dict:
+    """
+    Applies this host's autotuned settings (config/profiles/<hostname>.yaml) for the configured model.
+    They only fill in what the llm section leaves unset: an explicit value (e.g. llm.n_ctx) wins.
+    """
+    if not config['llm'].get('use_host_profile', True):
+        return config
+    tuned = autotune.tuned_params(config['llm'].get('model_path'))
+    explicit = {k: config['llm'][k] for k in tuned if config['llm'].get(k) is not None}
+    applied = {k: v for k, v in tuned.items() if k not in explicit}
+    for k, v in explicit.items():
+        if v != tuned[k]:
+            logging.info(f"Host profile {k}={tuned[k]} not applied: llm.{k} is set to {v} in the config.")
+    if not applied:
+        return config
+    logging.info(f"Applying host profile {autotune.profile_path()}: {applied}")
+    derived = config.copy()
+    derived['llm'] = {**config['llm'], **applied}
+    return derived
+
+def _with_llm_overrides(config: dict, overrides: dict) -> dict:
+    """Returns a shallow copy of config whose 'llm' section has `overrides` applied."""
+    derived = config.copy()
+    derived['llm'] = {**{k: v for k, v in config['llm'].items() if k != 'router'}, **overrides}
+    return derived
+
 def get_llm_interface(config: dict) -> LLMInterface:
     """
     Factory function to create an instance of the appropriate LLM interface
@@ -196,23 +1693,19 @@ def get_llm_interface(config: dict) -> LLMInterface:
         ValueError: If the configured LLM type is unsupported or configuration is missing.
         ImportError: If the required library for the chosen type is not installed.
         FileNotFoundError: If the model file (for llama_cpp) is not found.
-        ConnectionError: If connection to the LLM service (like Ollama) fails.
     """
     if 'llm' not in config or 'type' not in config['llm']:
         raise ValueError("LLM configuration ('llm' section with 'type') is missing in the config file.")
 
-    llm_type = config['llm']['type'].lower()
-    logging.info(f"Attempting to load LLM interface of type: '{llm_type}'")
+    router_config = config['llm'].get('router', {})
+    if router_config.get('enabled', False):
+        if not router_config.get('small'):
+            raise ValueError("llm.router is enabled but 'llm.router.small' is not configured.")
+        large = _create_interface(_with_llm_overrides(config, {}))
+        small = _create_interface(_with_llm_overrides(config, router_config['small']))
+        return RoutedLLMInterface(config, small=small, large=large)
 
-    if llm_type == 'llama_cpp':
-        return LlamaCPPInterface(config)
-    elif llm_type == 'ollama':
-        return OllamaInterface(config)
-    # Add other types here:
-    # elif llm_type == 'ctransformers':
-    #    return CTransformersInterface(config) # Assuming you create this class
-    else:
-        raise ValueError(f"Unsupported LLM type specified in config: '{llm_type}'")
+    return _create_interface(config)
 
 # --- Helper for path resolution (needed by LlamaCPPInterface) ---
 import os
@@ -19,7 +19,7 @@ class ChatMemory:
         self.memory_type = mem_config.get('type', 'json').lower()
         self.memory_path = mem_config.get('path')
         self.history = []
-        self._lock = threading.Lock() # Lock for thread safety
+        self._lock = threading.RLock() # Re-entrant: add_message/clear_history hold it while _save_json takes it again
 
         if not self.memory_path:
             raise ValueError("Memory path ('memory.path') not specified in configuration.")
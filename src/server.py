@@ -0,0 +1,322 @@
+"""
+Local OpenAI-compatible server: one loaded model, and the tool registry, shared by every frontend.
+
+  GET  /v1/models             – the served model
+  POST /v1/chat/completions   – OpenAI chat completions ("stream": true -> server-sent events;
+                                max_tokens, temperature and stop are passed to the backend)
+  GET  /tools                 – registered tools and their arguments
+  POST /tools/{name}          – runs a tool; body {"arguments": {...}} -> {"tool_name": ..., "result": ...}
+                                (tool_registry tools take one argument: {"arguments": {"arg": "..."}})
+  GET  /health                – {"status": "ok" | "loading", "model": ...}
+  GET  /metrics               – Prometheus text format
+
+Listens on TCP (server.host / server.port) or on a Unix socket (server.unix_socket).
+Start it with `python main.py --serve`; frontends connect with llm.type 'remote'
+(RemoteLLMInterface) or, for llm_manager users, LLM_SERVER_URL.
+"""
+import asyncio
+import json
+import logging
+import os
+import socketserver
+import stat
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import metrics # Project root module
+import model_lifecycle # Project root module
+import llm_router # Project root module
+import tool_runner # Project root module
+from tool_registry import TOOLS # Project root module
+from .llm_interface import LLMInterface
+from .tools import execute_tool, get_tool_schemas
+
+
+def _normalize_messages(messages) -> list | None:
+    """OpenAI messages -> [{'role', 'content'}] with text content (list-of-parts content is flattened)."""
+    if not isinstance(messages, list) or not messages:
+        return None
+    normalized = []
+    for m in messages:
+        if not isinstance(m, dict) or 'role' not in m:
+            return None
+        content = m.get('content') or ""
+        if isinstance(content, list):
+            content = "".join(p.get('text', '') for p in content if isinstance(p, dict))
+        normalized.append({"role": m['role'], "content": str(content)})
+    return normalized
+
+
+def _sampling_params(body: dict) -> dict:
+    """max_tokens / temperature / stop from an OpenAI request body; raises ValueError if one is malformed."""
+    params = {}
+    max_tokens = body.get("max_tokens", body.get("max_completion_tokens"))
+    if max_tokens is not None:
+        if not isinstance(max_tokens, int) or isinstance(max_tokens, bool) or max_tokens < 1:
+            raise ValueError("'max_tokens' must be a positive integer.")
+        params['max_tokens'] = max_tokens
+    temperature = body.get("temperature")
+    if temperature is not None:
+        if not isinstance(temperature, (int, float)) or isinstance(temperature, bool) or not 0 <= temperature <= 2:
+            raise ValueError("'temperature' must be a number between 0 and 2.")
+        params['temperature'] = float(temperature)
+    stop = body.get("stop")
+    if stop is not None:
+        stop = [stop] if isinstance(stop, str) else stop
+        if not isinstance(stop, list) or not all(isinstance(x, str) for x in stop):
+            raise ValueError("'stop' must be a string or a list of strings.")
+        params['stop'] = stop
+    return params
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive for thin clients' pooled connections
+    server_version = "OfflineBot"
+
+    def log_message(self, format, *args):
+        logging.debug(f"server: {format % args}")
+
+    @property
+    def app(self) -> "LLMServer":
+        return self.server.app
+
+    def _body(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        raw = self.rfile.read(length) if length else b""
+        body = json.loads(raw) if raw else {}
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object.")
+        return body
+
+    def _send_json(self, payload: dict, status: int = 200):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int, message: str, error_type: str = "invalid_request_error"):
+        self._send_json({"error": {"message": message, "type": error_type}}, status)
+
+    def _write_chunk(self, data: bytes):
+        # HTTP/1.1 chunked transfer encoding; an empty chunk ends the response
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_event(self, payload):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode("utf-8")
+        self._write_chunk(b"data: " + data + b"\n\n")
+
+    # --- Routes ---
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        metrics.inc("server_requests_total", method="GET", path=path if path in self.app.GET_ROUTES else "other")
+        if path == "/v1/models":
+            self._send_json({"object": "list", "data": [
+                {"id": self.app.llm.get_model_name(), "object": "model", "created": self.app.started, "owned_by": "local"}]})
+        elif path == "/tools":
+            schemas = get_tool_schemas()
+            tools = [{"name": name, "arguments": [{"name": a, "type": t, "required": r} for a, t, r in args]}
+                     for name, args in schemas.items()]
+            tools += [{"name": name, "description": TOOLS.doc(name),
+                       "arguments": [{"name": "arg", "type": "string", "required": True}]}
+                      for name in TOOLS if name not in schemas]
+            self._send_json({"tools": tools})
+        elif path == "/health":
+            self._send_json({"status": "ok" if model_lifecycle.is_ready() else "loading",
+                             "model": self.app.llm.get_model_name()})
+        elif path == "/metrics":
+            data = metrics.render_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._error(404, f"Unknown path '{path}'", "not_found")
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        route = "/tools/{name}" if path.startswith("/tools/") else path
+        metrics.inc("server_requests_total", method="POST", path=route if route in self.app.POST_ROUTES else "other")
+        try:
+            body = self._body()
+        except ValueError as e:
+            return self._error(400, f"Invalid JSON body: {e}")
+        start_time = time.time()
+        if path == "/v1/chat/completions":
+            self._chat_completions(body)
+        elif path.startswith("/tools/"):
+            self._run_tool(unquote(path[len("/tools/"):]), body)
+        else:
+            return self._error(404, f"Unknown path '{path}'", "not_found")
+        metrics.observe("server_request_seconds", time.time() - start_time, path=route)
+
+    def _chat_completions(self, body: dict):
+        messages = _normalize_messages(body.get("messages"))
+        if messages is None:
+            return self._error(400, "'messages' must be a non-empty list of {role, content} objects.")
+        try:
+            params = _sampling_params(body)
+        except ValueError as e:
+            return self._error(400, str(e))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = self.app.llm.get_model_name()
+
+        with self.app.slots: # Bounded concurrency on the shared model
+            if not body.get("stream"):
+                text = self.app.llm.generate_response_with_history(messages, **params)
+                prompt_tokens = sum(llm_router.estimate_tokens(m['content']) for m in messages)
+                completion_tokens = llm_router.estimate_tokens(text)
+                return self._send_json({
+                    "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                              "total_tokens": prompt_tokens + completion_tokens},
+                })
+
+            def chunk(delta: dict, finish_reason=None) -> dict:
+                return {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            stream = self.app.llm.stream_response_with_history(messages, **params)
+            try:
+                self._send_event(chunk({"role": "assistant"}))
+                for piece in stream:
+                    self._send_event(chunk({"content": piece}))
+                self._send_event(chunk({}, finish_reason="stop"))
+                self._send_event(b"[DONE]")
+                self._write_chunk(b"")
+            except (BrokenPipeError, ConnectionResetError):
+                logging.info("Client disconnected mid-stream; stopping generation.")
+                self.close_connection = True
+            finally:
+                stream.close() # Stops the backend's generation if the client went away
+
+    def _run_tool(self, name: str, body: dict):
+        if not self.app.config.get('tools', {}).get('enabled', False):
+            return self._error(403, "Tools are disabled on this server.")
+        arguments = body.get("arguments", {})
+        if not isinstance(arguments, dict):
+            return self._error(400, "'arguments' must be an object.")
+        if name in get_tool_schemas():
+            tool_name, result = execute_tool(json.dumps({"tool_name": name, "arguments": arguments}), self.app.config)
+            return self._send_json({"tool_name": tool_name, "result": result})
+        if name not in TOOLS:
+            return self._error(404, f"Unknown tool '{name}'", "not_found")
+        if set(arguments) - {"arg"}:
+            return self._error(400, f"'{name}' takes a single argument: {{\"arg\": \"...\"}}.")
+        try:
+            result = self.app.run_registry_tool(name, str(arguments.get("arg", "")))
+        except Exception as e:
+            logging.error(f"Tool '{name}' failed: {e}", exc_info=True)
+            result = f"[{name}] {e}"
+        self._send_json({"tool_name": name, "result": result})
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0) # BaseHTTPRequestHandler expects a (host, port) address
+
+
+class LLMServer:
+    """
+    Serves one LLMInterface to many local clients.
+    Args:
+        config (dict): The application configuration ('server' section: host, port, unix_socket, max_concurrency).
+        llm (LLMInterface): The loaded model.
+    """
+    GET_ROUTES = ("/v1/models", "/tools", "/health", "/metrics")
+    POST_ROUTES = ("/v1/chat/completions", "/tools/{name}")
+
+    def __init__(self, config: dict, llm: LLMInterface, host: str = None, port: int = None, unix_socket: str = None):
+        server_config = config.get('server', {})
+        self.config = config
+        self.llm = llm
+        self.host = host or server_config.get('host', '127.0.0.1')
+        self.port = int(port if port is not None else server_config.get('port', 8088))
+        self.unix_socket = unix_socket or server_config.get('unix_socket')
+        # A single in-process model handles one generation at a time; a replica pool handles one per replica
+        default_concurrency = int(config['llm'].get('replicas', 1) or 1)
+        self.slots = threading.BoundedSemaphore(int(server_config.get('max_concurrency', default_concurrency)))
+        self.started = int(time.time())
+        self._thread = None
+        self._tool_loop = None # Event loop for tool_registry tools, started on first use
+        self._tool_loop_lock = threading.Lock()
+
+        if self.unix_socket:
+            if os.path.exists(self.unix_socket):
+                if not stat.S_ISSOCK(os.stat(self.unix_socket).st_mode):
+                    raise FileExistsError(f"{self.unix_socket} exists and is not a socket; refusing to replace it.")
+                os.unlink(self.unix_socket) # Stale socket from a previous run
+            self.httpd = _UnixHTTPServer(self.unix_socket, _Handler)
+            self.url = f"unix://{self.unix_socket}"
+        else:
+            self.httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+            self.httpd.daemon_threads = True
+            self.url = f"http://{self.host}:{self.httpd.server_address[1]}"
+        self.httpd.app = self
+
+    def serve_forever(self):
+        logging.info(f"Serving {self.llm.get_model_name()} at {self.url} (OpenAI-compatible /v1/chat/completions)")
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self._cleanup()
+
+    def start(self) -> threading.Thread:
+        """Serves in a background thread (stop it with close())."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="llm-server", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def close(self):
+        """Stops a server started with start()."""
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._cleanup()
+
+    def run_registry_tool(self, name: str, arg: str) -> str:
+        """Runs a tool_registry tool through tool_runner (cache, rate limits, concurrency classes) and waits for it."""
+        with self._tool_loop_lock:
+            if self._tool_loop is None:
+                self._tool_loop = asyncio.new_event_loop()
+                threading.Thread(target=self._tool_loop.run_forever, name="llm-server-tools", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(tool_runner.run_tool(name, arg), self._tool_loop).result()
+
+    def _cleanup(self):
+        self.httpd.server_close()
+        if self._tool_loop is not None:
+            self._tool_loop.call_soon_threadsafe(self._tool_loop.stop)
+            self._tool_loop = None
+        # Only remove our own socket, never a file that replaced it
+        if self.unix_socket and os.path.exists(self.unix_socket) and stat.S_ISSOCK(os.stat(self.unix_socket).st_mode):
+            os.unlink(self.unix_socket)
+
+
+def run_server(config: dict, llm: LLMInterface, host: str = None, port: int = None, unix_socket: str = None):
+    """
+    Runs the OpenAI-compatible server until interrupted.
+
+    Args:
+        config (dict): The application configuration.
+        llm (LLMInterface): The initialized LLM interface.
+        host, port, unix_socket: Override the 'server' config section.
+    """
+    LLMServer(config, llm, host=host, port=port, unix_socket=unix_socket).serve_forever()
@@ -0,0 +1,204 @@
+import concurrent.futures
+import json
+import logging
+import re
+import time
+
+import metrics # Project root module
+from .tools import execute_tool, get_tool_schemas, IDEMPOTENT_TOOLS
+
+# Speculative tool runs happen here, off the generation thread
+_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="tool-speculative")
+
+_TOOL_NAME_RE = re.compile(r'"tool_name"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_ARGUMENTS_RE = re.compile(r'"arguments"\s*:\s*\{')
+_DECODER = json.JSONDecoder()
+
+
+class ToolCallStreamParser:
+    """
+    Incremental parser for a streamed reply that may be a JSON tool call.
+
+    Feed it text as it arrives. It decides from the first characters whether
+    the reply is a tool call (a JSON object, bare or in a code fence) or plain
+    text. For a tool call it exposes the tool name as soon as its string is
+    closed, every argument whose value is complete, and the whole call once
+    the top-level object closes.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.kind = None # None (undecided), 'text' or 'tool'
+        self.tool_name = None
+        self.arguments = {} # Arguments whose values are complete so far
+        self.call = None # The parsed call once the object is closed
+        self.call_text = None
+        self._start = None
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> None:
+        self.buffer += text
+        if self.kind is None:
+            self._decide()
+        if self.kind == 'tool' and self.call is None:
+            self._update()
+
+    def _decide(self):
+        stripped = self.buffer.lstrip()
+        if not stripped:
+            return
+        if stripped.startswith('{'):
+            self.kind = 'tool'
+        elif stripped.startswith('```'):
+            newline = stripped.find('\n')
+            body = stripped[newline + 1:].lstrip() if newline >= 0 else ""
+            if not body:
+                return # Still inside the fence line
+            self.kind = 'tool' if body.startswith('{') else 'text'
+        elif '```'.startswith(stripped):
+            return # Could still become a fence
+        else:
+            self.kind = 'text'
+        if self.kind == 'tool':
+            self._start = self._pos = self.buffer.index('{')
+
+    def _update(self):
+        # Brace matching that ignores braces inside strings
+        text, i = self.buffer, self._pos
+        end = None
+        while i < len(text):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+            elif c == '"':
+                self._in_string = True
+            elif c in '{[':
+                self._depth += 1
+            elif c in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    end = i + 1
+                    break
+            i += 1
+        self._pos = i
+
+        if self.tool_name is None:
+            match = _TOOL_NAME_RE.search(text, self._start)
+            if match:
+                self.tool_name = json.loads(f'"{match.group(1)}"')
+        self.arguments = self._complete_arguments()
+
+        if end is not None:
+            candidate = text[self._start:end]
+            try:
+                call = json.loads(candidate)
+            except json.JSONDecodeError:
+                call = None
+            if isinstance(call, dict) and isinstance(call.get('tool_name'), str):
+                self.call, self.call_text = call, candidate
+                self.tool_name = call['tool_name']
+                self.arguments = call.get('arguments') or {}
+            else:
+                self.kind = 'text' # Looked like JSON but is not a tool call
+
+    def _complete_arguments(self) -> dict:
+        match = _ARGUMENTS_RE.search(self.buffer, self._start)
+        if not match:
+            return {}
+        text, i, args = self.buffer, match.end(), {}
+        while True:
+            while i < len(text) and text[i] in ' \t\r\n,':
+                i += 1
+            if i >= len(text) or text[i] == '}':
+                return args
+            try:
+                key, i = _DECODER.raw_decode(text, i)
+                while i < len(text) and text[i] in ' \t\r\n':
+                    i += 1
+                if not isinstance(key, str) or i >= len(text) or text[i] != ':':
+                    return args
+                i += 1
+                while i < len(text) and text[i] in ' \t\r\n':
+                    i += 1
+                value, end = _DECODER.raw_decode(text, i)
+            except ValueError: # Key or value still incomplete
+                return args
+            # A number or literal at the very end of the buffer may still be growing
+            if end >= len(text) and not isinstance(value, (str, list, dict)):
+                return args
+            args[key] = value
+            i = end
+
+
+def _speculation_ready(parser: ToolCallStreamParser) -> bool:
+    """An idempotent tool whose required arguments are all complete can start before the call closes."""
+    if parser.tool_name not in IDEMPOTENT_TOOLS:
+        return False
+    schema = get_tool_schemas().get(parser.tool_name)
+    if schema is None:
+        return False
+    return all(name in parser.arguments for name, _type, required in schema if required)
+
+
+def stream_tool_turn(llm, messages: list, config: dict) -> tuple[str, str | None, str | None]:
+    """
+    Streams one LLM reply and dispatches a tool call the moment it is complete.
+
+    Generation is stopped at the call's closing brace. Idempotent lookup tools
+    (tools.IDEMPOTENT_TOOLS) start even earlier, as soon as the tool name and
+    its required arguments are known; the result is used if the finished call
+    has the same arguments.
+
+    Args:
+        llm: An LLMInterface (any backend; non-streaming ones yield the whole reply at once).
+        messages (list): OpenAI-style message history.
+        config (dict): The application configuration (passed to the tools).
+    Returns:
+        tuple: (response_text, tool_name, tool_result), with tool_name/tool_result None for plain replies,
+               i.e. the same contract as generating and then calling tools.execute_tool.
+    """
+    parser = ToolCallStreamParser()
+    speculative = None # (arguments, future)
+    start_time = time.time()
+    stream = llm.stream_response_with_history(messages)
+    try:
+        for piece in stream:
+            parser.feed(piece)
+            if parser.kind != 'tool':
+                continue
+            if speculative is None and _speculation_ready(parser):
+                arguments = dict(parser.arguments)
+                call_json = json.dumps({"tool_name": parser.tool_name, "arguments": arguments})
+                logging.info(f"Speculatively starting tool '{parser.tool_name}' with {arguments}")
+                speculative = (arguments, _EXECUTOR.submit(execute_tool, call_json, config))
+            if parser.call is not None:
+                break # The call is complete: stop generating
+    finally:
+        close = getattr(stream, 'close', None)
+        if close:
+            close()
+
+    if parser.call is None:
+        # Plain text (or malformed JSON): same check as before streaming existed
+        text = parser.buffer.strip()
+        tool_name, tool_result = execute_tool(text, config)
+        return text, tool_name, tool_result
+
+    logging.info(f"Tool call '{parser.tool_name}' complete after {time.time() - start_time:.2f}s of generation; dispatching.")
+    metrics.inc("tool_calls_streamed_total", tool=parser.tool_name)
+    if speculative is not None and speculative[0] == parser.arguments:
+        metrics.inc("tool_speculative_hits_total", tool=parser.tool_name)
+        tool_name, tool_result = speculative[1].result()
+    else:
+        if speculative is not None:
+            metrics.inc("tool_speculative_misses_total", tool=parser.tool_name)
+            logging.info(f"Speculative '{parser.tool_name}' run used different arguments; running it again.")
+        tool_name, tool_result = execute_tool(parser.call_text, config)
+    return parser.call_text, tool_name, tool_result
@@ -1,9 +1,12 @@
 import logging
 import json
 import datetime
+import inspect
 import subprocess # For execute_shell example
 import os # For execute_shell example
 
+import output_capture # Project root module
+
 # --- Tool Implementation Examples ---
 # Add your custom tool functions here.
 # They should accept arguments as defined in TOOL_DESCRIPTIONS
@@ -126,6 +129,15 @@ TOOL_REGISTRY = {
     # "execute_shell_command": execute_shell_command, # <-- Add with extreme caution!
 }
 
+# Tools that only look something up (same arguments -> same effect, no side effects).
+# These may be started speculatively while the model is still finishing the call (see tool_stream.py).
+# Add lookup tools such as whois, ipinfo or geocoding here when they are registered.
+IDEMPOTENT_TOOLS = {
+    "get_current_datetime",
+    "get_current_location",
+    "simple_osint_search",
+}
+
 # 2. Describe your tools clearly for the LLM.
 #    - Use the exact tool names from TOOL_REGISTRY.
 #    - Specify arguments (name and type) accurately.
@@ -177,6 +189,68 @@ def get_tool_descriptions() -> str:
     # or a more structured tool definition format.
     return TOOL_DESCRIPTIONS
 
+# --- Tool Call Grammar (constrained decoding) ---
+
+# Python annotation -> GBNF value rule (unannotated arguments are treated as strings)
+_GBNF_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+_GBNF_COMMON = r'''
+string ::= "\"" ( [^"\\\x00-\x1f] | "\\" ( ["\\/bfnrt] | "u" [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] [0-9a-fA-F] ) )* "\""
+integer ::= "-"? [0-9]+
+number ::= "-"? [0-9]+ ( "." [0-9]+ )? ( [eE] [-+]? [0-9]+ )?
+boolean ::= "true" | "false"
+ws ::= [ \t\n]? [ \t\n]? [ \t\n]? [ \t\n]?
+'''
+
+
+def get_tool_schemas() -> dict:
+    """
+    Argument schemas for TOOL_REGISTRY, read from the function signatures.
+    Returns:
+        dict: {tool_name: [(arg_name, gbnf_type, required), ...]} (**kwargs/config are skipped).
+    """
+    schemas = {}
+    for name, func in TOOL_REGISTRY.items():
+        args = []
+        for param in inspect.signature(func).parameters.values():
+            if param.kind in (param.VAR_KEYWORD, param.VAR_POSITIONAL) or param.name == 'config':
+                continue
+            gbnf_type = _GBNF_TYPES.get(param.annotation, "string")
+            args.append((param.name, gbnf_type, param.default is inspect.Parameter.empty))
+        schemas[name] = args
+    return schemas
+
+
+def build_tool_call_grammar() -> str:
+    """
+    GBNF grammar accepting exactly one tool call for a registered tool:
+        {"tool_name": "<name>", "arguments": {<that tool's arguments>}}
+    The grammar ends at the closing brace, so constrained generation stops there.
+    Required arguments come first in signature order; optional ones may follow.
+    """
+    alternatives, rules = [], []
+    for name, args in get_tool_schemas().items():
+        rule = "call-" + name.replace("_", "-").lower()
+        ordered = sorted(args, key=lambda a: not a[2])
+        members = [f'"\\"{arg}\\":" ws {gbnf_type}' for arg, gbnf_type, _ in ordered]
+        required = [m for m, a in zip(members, ordered) if a[2]]
+        optional = [m for m, a in zip(members, ordered) if not a[2]]
+        body = ' ws "," ws '.join(required)
+        if optional:
+            # Each optional argument needs the ones before it, so no leading or dangling commas are possible
+            tail = ""
+            for member in reversed(optional):
+                tail = f'( "," ws {member}{" ws " + tail if tail else ""} )?'
+            if body:
+                body = f"{body} ws {tail}"
+            else:
+                body = tail.replace('( "," ws ', "( ", 1)
+        rules.append(f'{rule} ::= "\\"{name}\\"" ws "," ws "\\"arguments\\":" ws "{{" ws {body + " ws " if body else ""}"}}"')
+        alternatives.append(rule)
+    root = f'root ::= "{{" ws "\\"tool_name\\":" ws ( {" | ".join(alternatives)} ) ws "}}"'
+    return "\n".join([root] + rules) + _GBNF_COMMON
+
+
 def format_tool_prompt(system_message: str) -> str:
     """Adds tool usage instructions and descriptions to the system prompt."""
     # Only add tool info if tools are enabled in the registry
@@ -230,8 +304,10 @@ def execute_tool(tool_call_json: str, config: dict) -> tuple[str | None, str | N
                 # Basic check for excessively long results
                 max_result_len = 4000 # Limit tool output length
                 if len(result_str) > max_result_len:
-                     logging.warning(f"Tool '{tool_name}' output truncated from {len(result_str)} to {max_result_len} chars.")
-                     result_str = result_str[:max_result_len] + "... (truncated)"
+                     # Keep head + tail for the LLM; the full text goes to a spill file readable with !page
+                     capture = output_capture.capture_text(result_str, label=tool_name, spill_chars=max_result_len)
+                     logging.warning(f"Tool '{tool_name}' output of {len(result_str)} chars shortened to head + tail; full output in {capture.path}")
+                     result_str = capture.summary()
 
                 logging.info(f"Tool '{tool_name}' executed successfully.")
                 return tool_name, result_str # Return tool name and its string result
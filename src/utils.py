@@ -16,6 +16,27 @@ def setup_logging():
     )
     logging.info("Logging setup complete.")
 
+def _resolve_model_paths(llm_config: dict, project_root: str, label: str = "llm"):
+    """Resolves model paths in an llm config section, and in the sections nested in it (cluster nodes, hedged arms)."""
+    if 'model_path' in llm_config and not os.path.isabs(llm_config['model_path']):
+        llm_config['model_path'] = os.path.join(project_root, llm_config['model_path'])
+        logging.debug(f"Resolved {label} model path: {llm_config['model_path']}")
+
+    spec_config = llm_config.get('speculative') or {}
+    if 'draft_model_path' in spec_config and not os.path.isabs(spec_config['draft_model_path']):
+        spec_config['draft_model_path'] = os.path.join(project_root, spec_config['draft_model_path'])
+
+    small_config = (llm_config.get('router') or {}).get('small') or {}
+    if 'model_path' in small_config and not os.path.isabs(small_config['model_path']):
+        small_config['model_path'] = os.path.join(project_root, small_config['model_path'])
+        logging.debug(f"Resolved {label} router small model path: {small_config['model_path']}")
+
+    for i, node_config in enumerate(llm_config.get('nodes') or []):
+        _resolve_model_paths(node_config, project_root, f"{label}.nodes[{i}]")
+    for role in ('primary', 'backup'):
+        if isinstance(llm_config.get(role), dict):
+            _resolve_model_paths(llm_config[role], project_root, f"{label}.{role}")
+
 def load_config(config_path='../config/config.yaml') -> dict:
     """
     Loads configuration from a YAML file relative to this script's location.
@@ -42,9 +63,7 @@ def load_config(config_path='../config/config.yaml') -> dict:
 
         # --- Resolve relative paths ---
         # Assume paths in config are relative to the *project root*
-        if 'llm' in config and 'model_path' in config['llm'] and not os.path.isabs(config['llm']['model_path']):
-            config['llm']['model_path'] = os.path.join(project_root, config['llm']['model_path'])
-            logging.debug(f"Resolved LLM model path: {config['llm']['model_path']}")
+        _resolve_model_paths(config.get('llm') or {}, project_root)
 
         if 'memory' in config and 'path' in config['memory'] and not os.path.isabs(config['memory']['path']):
             config['memory']['path'] = os.path.join(project_root, config['memory']['path'])
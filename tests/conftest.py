@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Root modules (http_client, metrics, ...) and the src package import from the project root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,35 @@
+"""bulk.run_bulk over a throwaway registry tool."""
+import asyncio
+
+import pytest
+
+import bulk
+from tool_registry import TOOLS
+
+
+@pytest.fixture
+def lookup_tool(monkeypatch):
+    def lookup(arg):
+        if arg == "bad":
+            return "[bulk_test_lookup] not found"
+        if arg == "boom":
+            raise RuntimeError("crashed")
+        return f'[{{"indicator": "{arg}"}}]' # A JSON array is a result, not an error
+
+    # Straight into the loaded table: TOOLS[name] = ... would also wrap it in the on-disk cache
+    monkeypatch.setitem(TOOLS._loaded, "bulk_test_lookup", lookup)
+    return "bulk_test_lookup"
+
+
+def test_run_bulk_keeps_order_and_flags_errors(lookup_tool):
+    indicators = bulk.parse_indicators("8.8.8.8, bad\n# comment\nboom; 8.8.8.8")
+    assert indicators == ["8.8.8.8", "bad", "boom"]
+    results = asyncio.run(bulk.run_bulk(lookup_tool, indicators))
+    assert [r["indicator"] for r in results] == indicators
+    assert [r["ok"] for r in results] == [True, False, False]
+    assert results[2]["result"] == "[bulk_test_lookup] crashed"
+
+
+def test_unknown_tool():
+    with pytest.raises(KeyError):
+        asyncio.run(bulk.run_bulk("no_such_tool", ["x"]))
@@ -0,0 +1,159 @@
+"""CircuitBreaker transitions, FallbackChain order and HealthProber registration."""
+import itertools
+
+import pytest
+
+import circuit_breaker as cb
+
+_names = itertools.count()
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _breaker(clock, threshold=3, reset=30.0) -> cb.CircuitBreaker:
+    return cb.CircuitBreaker(f"test-{next(_names)}", failure_threshold=threshold, reset_timeout=reset, clock=clock)
+
+
+def _boom():
+    raise RuntimeError("down")
+
+
+def test_opens_after_consecutive_failures():
+    breaker = _breaker(Clock())
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == cb.CLOSED
+    breaker.record_success() # Resets the count: failures must be consecutive
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == cb.CLOSED
+    breaker.record_failure()
+    assert breaker.state == cb.OPEN
+    assert not breaker.allow()
+
+
+def test_cooldown_then_single_trial():
+    clock = Clock()
+    breaker = _breaker(clock, threshold=1, reset=30.0)
+    breaker.record_failure()
+    clock.now += 29.9
+    assert breaker.state == cb.OPEN
+    clock.now += 0.1
+    assert breaker.state == cb.HALF_OPEN
+    assert breaker.allow() # The trial
+    assert not breaker.allow() # Only one at a time
+
+
+def test_half_open_success_closes_and_failure_reopens():
+    clock = Clock()
+    breaker = _breaker(clock, threshold=2, reset=10.0)
+    breaker.trip()
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_failure() # A failed trial reopens at once, whatever the threshold
+    assert breaker.state == cb.OPEN
+    clock.now += 9
+    assert breaker.state == cb.OPEN # The cooldown restarted when it reopened
+    clock.now += 1
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == cb.CLOSED
+    assert breaker.allow() and breaker.allow()
+
+
+def test_probe_success_half_opens_without_waiting():
+    breaker = _breaker(Clock())
+    breaker.trip()
+    breaker.probe_succeeded()
+    assert breaker.state == cb.HALF_OPEN
+
+
+def test_call_rejects_when_open():
+    breaker = _breaker(Clock(), threshold=1)
+    with pytest.raises(RuntimeError, match="down"):
+        breaker.call(_boom)
+    calls = []
+    with pytest.raises(cb.CircuitOpenError):
+        breaker.call(lambda: calls.append(1))
+    assert calls == []
+
+
+def _chain(*calls) -> cb.FallbackChain:
+    return cb.FallbackChain([cb.Backend(f"test-{next(_names)}", call) for call in calls])
+
+
+def test_fallback_chain_order():
+    seen = []
+
+    def ok(name):
+        def call(prompt):
+            seen.append(name)
+            return f"{name}:{prompt}"
+        return call
+
+    chain = _chain(ok("first"), ok("second"))
+    assert chain.call("hi")[1] == "first:hi"
+    assert seen == ["first"]
+
+
+def test_fallback_chain_skips_failing_then_open_backends():
+    first_calls = []
+
+    def flaky(prompt):
+        first_calls.append(prompt)
+        raise ConnectionError("refused")
+
+    chain = _chain(flaky, lambda prompt: f"backup:{prompt}")
+    first = chain.backends[0]
+    for i in range(cb.FAILURE_THRESHOLD):
+        assert chain.call(i) == (chain.backends[1].name, f"backup:{i}")
+    assert first.breaker.state == cb.OPEN
+    chain.call("skipped")
+    assert "skipped" not in first_calls # Open: not even tried
+
+
+def test_fallback_chain_all_down():
+    chain = _chain(_boom, _boom)
+    with pytest.raises(cb.CircuitOpenError, match="All backends unavailable"):
+        chain.call()
+
+
+def test_prober_trips_and_recovers():
+    prober = cb.HealthProber(interval=0)
+    breaker = _breaker(Clock())
+    healthy = [False]
+    prober.register(breaker, lambda: healthy[0])
+    assert prober.run_once() == {breaker.name: False}
+    assert breaker.state == cb.OPEN
+    healthy[0] = True
+    prober.run_once()
+    assert breaker.state == cb.HALF_OPEN
+
+
+def test_prober_exception_counts_as_unhealthy():
+    prober = cb.HealthProber(interval=0)
+    breaker = _breaker(Clock())
+    prober.register(breaker, _boom)
+    assert prober.run_once() == {breaker.name: False}
+
+
+def test_unregister_only_removes_the_given_probe():
+    prober = cb.HealthProber(interval=0)
+    breaker = _breaker(Clock())
+    old, new = (lambda: True), (lambda: True)
+    prober.register(breaker, old)
+    prober.register(breaker, new) # A replacement backend under the same name
+    prober.unregister(breaker.name, old)
+    assert breaker.name in prober.run_once()
+    prober.unregister(breaker.name, new)
+    assert prober.run_once() == {}
+    prober.register(breaker, old)
+    prober.unregister(breaker.name)
+    assert prober.run_once() == {}
+    prober.unregister("never-registered")
@@ -0,0 +1,67 @@
+"""cli_interface.generate_reply's tool loop and progress callbacks."""
+import pytest
+
+from src import cli_interface
+from src.memory import ChatMemory
+
+TOOL_CALL = '{"tool_name": "whois", "arguments": {"domain": "example.com"}}'
+
+
+class ScriptedLLM:
+    """Returns the scripted replies in order; an Exception in the script is raised instead."""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+
+    def generate_response_with_history(self, messages, **params):
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+
+@pytest.fixture
+def memory(tmp_path):
+    return ChatMemory({"memory": {"type": "json", "path": str(tmp_path / "memory.json")}})
+
+
+@pytest.fixture(autouse=True)
+def fake_tools(monkeypatch):
+    def execute_tool(text, config):
+        return ("whois", "Registrar: Example") if text == TOOL_CALL else (None, None)
+
+    monkeypatch.setattr(cli_interface, "execute_tool", execute_tool)
+
+
+CONFIG = {"tools": {"enabled": True}}
+
+
+def _run(llm, memory, **kwargs):
+    events = []
+    reply = cli_interface.generate_reply(
+        CONFIG, llm, memory, "who owns example.com?",
+        on_tool=lambda name: events.append(f"tool {name}"), on_status=events.append, **kwargs)
+    return reply, events
+
+
+def test_tool_then_answer(memory):
+    reply, events = _run(ScriptedLLM(TOOL_CALL, "Example owns it."), memory)
+    assert reply == "Example owns it."
+    assert events == ["Thinking...", "tool whois", "Thinking..."]
+    assert [m["role"] for m in memory.get_history()] == ["user", "assistant", "tool", "assistant"]
+
+
+def test_max_tool_iterations_reported(memory):
+    reply, events = _run(ScriptedLLM(TOOL_CALL, TOOL_CALL, "Done."), memory, max_tool_iterations=2)
+    assert reply == "Done."
+    assert events == [
+        "Thinking...", "tool whois", "Thinking...", "tool whois",
+        "Reached maximum tool iterations. Providing final response.",
+        "Thinking (final response after max tools)...",
+    ]
+
+
+def test_generation_error_becomes_the_reply(memory):
+    reply, _ = _run(ScriptedLLM(RuntimeError("model crashed")), memory)
+    assert reply == "Sorry, I encountered an error generating a response."
+    assert [m["role"] for m in memory.get_history()] == ["user"]
@@ -0,0 +1,60 @@
+"""Per-loop async clients and host slots in http_client."""
+import asyncio
+import gc
+import weakref
+
+import pytest
+
+import http_client
+from benchmarks.stub_servers import OllamaStub
+
+
+@pytest.fixture
+def stub():
+    with OllamaStub(models=["mistral:latest"]) as stub:
+        yield stub
+
+
+def _run_on_new_loop(coro_fn):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop, loop.run_until_complete(coro_fn())
+    finally:
+        loop.close()
+
+
+def test_one_client_per_loop(stub):
+    async def fetch():
+        response = await http_client.arequest("GET", f"{stub.url}/api/tags")
+        return response.status_code, http_client.get_async_client()
+
+    first_loop, (status, first) = _run_on_new_loop(fetch)
+    assert status == 200
+    _, (_, second) = _run_on_new_loop(fetch)
+    assert second is not first
+    assert first_loop not in http_client._async_clients # Closed loops are dropped
+    assert first_loop not in http_client._async_host_slots
+
+
+def test_closed_loops_are_not_kept_alive(stub):
+    async def fetch():
+        await http_client.arequest("GET", f"{stub.url}/api/tags")
+
+    loop, _ = _run_on_new_loop(fetch)
+    ref = weakref.ref(loop)
+    del loop
+    _run_on_new_loop(fetch) # Prunes the closed loop's entries
+    gc.collect()
+    assert ref() is None
+
+
+def test_aclose_forgets_the_loop(stub):
+    async def fetch_then_close():
+        client = http_client.get_async_client()
+        await http_client.arequest("GET", f"{stub.url}/api/tags")
+        await http_client.aclose()
+        return client, asyncio.get_running_loop() in http_client._async_clients
+
+    _, (client, still_registered) = _run_on_new_loop(fetch_then_close)
+    assert client.is_closed
+    assert not still_registered
@@ -0,0 +1,56 @@
+"""ModelRegistry sharing, keyed on load parameters, with a counting fake loader."""
+import pytest
+
+import model_registry
+import speculative
+from model_registry import ModelRegistry
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+
+    def load(path, **params):
+        calls.append((path, params))
+        return object()
+
+    monkeypatch.setitem(model_registry.LOADERS, "fake", load)
+    return calls
+
+
+def test_equal_params_share_one_model(loads):
+    registry = ModelRegistry()
+    a = registry.acquire("fake", "model.gguf", n_ctx=2048, verbose=True)
+    b = registry.acquire("fake", "model.gguf", n_ctx=2048, verbose=False)
+    c = registry.acquire("fake", "model.gguf", n_ctx=4096)
+    assert a.get() is b.get()
+    assert c.get() is not a.get()
+    assert len(loads) == 2
+
+
+def test_equal_speculative_configs_share_one_model(loads):
+    registry = ModelRegistry()
+    config = {"mode": "Prompt_Lookup", "num_pred_tokens": 8, "draft_n_ctx": None}
+    first = registry.acquire("fake", "model.gguf", speculative=speculative.load_spec(config))
+    second = registry.acquire("fake", "model.gguf", speculative=speculative.load_spec(dict(config)))
+    assert first.key == second.key
+    assert first.get() is second.get()
+    assert loads == [("model.gguf", {"speculative": {"mode": "prompt_lookup", "num_pred_tokens": 8}})]
+    other = registry.acquire("fake", "model.gguf", speculative=speculative.load_spec({"mode": "prompt_lookup"}))
+    assert other.key != first.key
+
+
+def test_speculative_off_has_no_spec():
+    assert speculative.load_spec(None) is None
+    assert speculative.load_spec({"mode": "off", "num_pred_tokens": 8}) is None
+
+
+def test_release_unload_frees_an_unshared_model(loads):
+    registry = ModelRegistry()
+    a = registry.acquire("fake", "model.gguf")
+    b = registry.acquire("fake", "model.gguf")
+    a.get()
+    a.release(unload=True)
+    assert registry.stats()[0]["loaded"] # b still holds it
+    b.release(unload=True)
+    assert registry.stats() == []
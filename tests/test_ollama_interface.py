@@ -0,0 +1,76 @@
+"""OllamaInterface against benchmarks.stub_servers.OllamaStub (no real Ollama needed)."""
+import asyncio
+
+import pytest
+
+from benchmarks.stub_servers import OllamaStub
+from src.llm_interface import OllamaInterface
+
+MODEL = "mistral:latest"
+MESSAGES = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "port 22 open"}]
+
+
+@pytest.fixture
+def stub():
+    with OllamaStub(models=[MODEL]) as stub:
+        yield stub
+
+
+def _llm(stub, **llm_config) -> OllamaInterface:
+    return OllamaInterface({"llm": {"type": "ollama", "host": stub.url, "model_name": MODEL, **llm_config}})
+
+
+def _chat_bodies(stub) -> list[dict]:
+    return [body for method, path, body in stub.requests if path == "/api/chat"]
+
+
+def test_generate(stub):
+    llm = _llm(stub)
+    assert llm.generate_response_with_history(MESSAGES) == "echo: port 22 open"
+    assert asyncio.run(llm.agenerate_response_with_history(MESSAGES)) == "echo: port 22 open"
+    assert [b["stream"] for b in _chat_bodies(stub)] == [False, False]
+
+
+def test_stream(stub):
+    llm = _llm(stub)
+    pieces = list(llm.stream_response_with_history(MESSAGES))
+    assert len(pieces) > 1
+    assert "".join(pieces) == "echo: port 22 open"
+
+    async def collect():
+        return [piece async for piece in llm.astream_response_with_history(MESSAGES)]
+
+    assert "".join(asyncio.run(collect())) == "echo: port 22 open"
+    assert [b["stream"] for b in _chat_bodies(stub)] == [True, True]
+
+
+def test_keep_alive_sent_on_every_request(stub):
+    llm = _llm(stub, keep_alive=-1)
+    llm.warm_up()
+    llm.generate_response_with_history(MESSAGES)
+    list(llm.stream_response_with_history(MESSAGES))
+    posts = [(path, body) for method, path, body in stub.requests if method == "POST"]
+    assert [path for path, _ in posts] == ["/api/generate", "/api/chat", "/api/chat"]
+    assert "prompt" not in posts[0][1] # warm_up only loads the model
+    assert all(body["keep_alive"] == -1 for _, body in posts)
+
+
+def test_sampling_params_become_options(stub):
+    llm = _llm(stub, options={"num_ctx": 4096})
+    llm.generate_response_with_history(MESSAGES, max_tokens=16, temperature=0.2, stop=["\n"])
+    assert _chat_bodies(stub)[0]["options"] == {"num_ctx": 4096, "num_predict": 16, "temperature": 0.2, "stop": ["\n"]}
+
+
+def test_error_reply(stub):
+    llm = _llm(stub, model_name="missing:latest") # The stub answers 404 for unknown models
+    assert llm.generate_response_with_history(MESSAGES) == OllamaInterface.ERROR_REPLY
+    assert list(llm.stream_response_with_history(MESSAGES)) == [OllamaInterface.ERROR_REPLY]
+    assert asyncio.run(llm.agenerate_response_with_history(MESSAGES)) == OllamaInterface.ERROR_REPLY
+    assert not llm.check_model()
+
+
+def test_unreachable_server():
+    llm = OllamaInterface({"llm": {"type": "ollama", "host": "http://127.0.0.1:9", "model_name": MODEL}})
+    assert llm.generate_response_with_history(MESSAGES) == OllamaInterface.ERROR_REPLY
+    with pytest.raises(ConnectionError):
+        llm.warm_up()
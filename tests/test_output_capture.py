@@ -0,0 +1,92 @@
+"""OutputCapture spilling and read_page paging against a throwaway output directory."""
+import random
+
+import pytest
+
+import output_capture
+from output_capture import OutputCapture, capture_text, read_page
+
+
+@pytest.fixture(autouse=True)
+def output_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(output_capture, "OUTPUT_DIR", tmp_path / "outputs")
+    return tmp_path / "outputs"
+
+
+def _pages(capture_id: str, page_chars: int) -> list[str]:
+    first, _, pages = read_page(capture_id, 1, page_chars)
+    return [first] + [read_page(capture_id, n, page_chars)[0] for n in range(2, pages + 1)]
+
+
+def test_spills_only_past_the_threshold(output_dir):
+    cap = capture_text("x" * 100, spill_chars=100)
+    assert not cap.spilled
+    assert cap.summary() == "x" * 100
+    assert not output_dir.exists()
+
+    cap = OutputCapture(spill_chars=100)
+    cap.write("x" * 100)
+    assert not cap.spilled
+    cap.write("y")
+    assert cap.spilled
+    cap.close()
+    assert cap.path.parent == output_dir
+    assert read_page(cap.id, 1, page_chars=1000) == ("x" * 100 + "y", 1, 1)
+
+
+def test_summary_keeps_head_and_tail(monkeypatch):
+    monkeypatch.setattr(output_capture, "HEAD_CHARS", 10)
+    monkeypatch.setattr(output_capture, "TAIL_CHARS", 10)
+    cap = OutputCapture(spill_chars=0)
+    for i in range(1000):
+        cap.write(f"{i:04d}\n")
+    cap.close()
+    summary = cap.summary()
+    assert summary.startswith("0000\n0001\n")
+    assert summary.endswith("0998\n0999\n")
+    assert f"`!page {cap.id}`" in summary
+    assert "4980 chars omitted" in summary # 5000 - 10 - 10
+    assert "".join(_pages(cap.id, 1800)) == "".join(f"{i:04d}\n" for i in range(1000))
+
+
+def test_multibyte_characters_across_page_and_chunk_edges():
+    rng = random.Random(0)
+    # Enough incompressible text that the gzip file is read in several raw chunks,
+    # so multibyte characters straddle chunk boundaries as well as page edges
+    text = "".join(rng.choice("aé€😀\n") for _ in range(300_000))
+    cap = capture_text(text, spill_chars=0)
+    assert cap.path.stat().st_size > 1 << 16
+    pages = _pages(cap.id, 777)
+    assert all(len(page) == 777 for page in pages[:-1])
+    assert "".join(pages) == text
+    assert "�" not in "".join(pages)
+
+
+def test_page_edge_lands_between_bytes_of_a_character():
+    cap = capture_text("ab😀cd" * 10, spill_chars=0)
+    assert read_page(cap.id, 1, page_chars=3) == ("ab😀", 1, 17)
+    assert read_page(cap.id, 2, page_chars=3) == ("cda", 2, 17)
+
+
+def test_out_of_range_pages_are_clamped():
+    cap = capture_text("0123456789" * 5, spill_chars=0) # 50 chars: pages of 20, 20, 10
+    assert read_page(cap.id, 0, page_chars=20) == ("01234567890123456789", 1, 3)
+    assert read_page(cap.id, -4, page_chars=20)[1] == 1
+    assert read_page(cap.id, 3, page_chars=20) == ("0123456789", 3, 3)
+    assert read_page(cap.id, 99, page_chars=20) == ("0123456789", 3, 3)
+
+
+def test_unknown_or_unsafe_ids():
+    assert read_page("0123456789") is None
+    assert read_page("../secrets") is None
+    assert read_page("") is None
+
+
+def test_flush_makes_a_running_output_readable():
+    cap = OutputCapture(spill_chars=0)
+    cap.write("first line\n")
+    cap.flush()
+    assert read_page(cap.id, 1)[0] == "first line\n"
+    cap.write("second line\n")
+    cap.close()
+    assert read_page(cap.id, 1)[0] == "first line\nsecond line\n"
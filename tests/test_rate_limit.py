@@ -0,0 +1,106 @@
+"""RateLimiter buckets, quotas and overrides against a throwaway database."""
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import rate_limit
+from rate_limit import RateLimiter, RateLimitExceeded
+
+DAY_END = datetime(2026, 3, 14, 23, 59, 0, tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Wall clock the limiter sees (sleeps are still real)."""
+    now = [DAY_END]
+    monkeypatch.setattr(rate_limit.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def limiter(tmp_path):
+    return RateLimiter(db_path=tmp_path / "rate_limits.db")
+
+
+def _used(limiter, provider) -> int:
+    row = limiter._conn().execute("SELECT used FROM quotas WHERE provider = ?", (provider,)).fetchone()
+    return row[0] if row else 0
+
+
+def test_overrides(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_SHODAN", "2:4")
+    assert rate_limit.limits_for("shodan") == (2.0, 4.0)
+    monkeypatch.setenv("RATE_LIMIT_SHODAN", "0.5")
+    assert rate_limit.limits_for("shodan") == (0.5, 1.0)
+    assert rate_limit.quota_for("google_cse") == rate_limit.QUOTAS["google_cse"]
+    monkeypatch.setenv("RATE_LIMIT_GOOGLE_CSE_QUOTA", "250/month")
+    assert rate_limit.quota_for("google_cse") == (250, "month")
+    monkeypatch.setenv("RATE_LIMIT_GOOGLE_CSE_QUOTA", "")
+    assert rate_limit.quota_for("google_cse") is None
+    assert rate_limit.limits_for("unknown") == (0.0, 0.0)
+    assert rate_limit.unlimited("unknown")
+
+
+def test_burst_then_queue(monkeypatch, limiter, clock):
+    monkeypatch.setenv("RATE_LIMIT_SHODAN", "100:2")
+    assert limiter.acquire("shodan") == 0
+    assert limiter.acquire("shodan") == 0
+    assert limiter.acquire("shodan") == pytest.approx(0.01) # Third one waits for the refill
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("shodan", max_wait=0.001)
+
+
+def test_quota_fails_fast_and_resets_at_the_window(monkeypatch, limiter, clock):
+    monkeypatch.setenv("RATE_LIMIT_GOOGLE_CSE", "1000:1000")
+    monkeypatch.setenv("RATE_LIMIT_GOOGLE_CSE_QUOTA", "2/day")
+    limiter.acquire("google_cse")
+    limiter.acquire("google_cse")
+    with pytest.raises(RateLimitExceeded, match="quota used up"):
+        limiter.acquire("google_cse")
+    assert _used(limiter, "google_cse") == 2 # A rejected call isn't counted
+    clock[0] += 120 # Past midnight UTC
+    limiter.acquire("google_cse")
+    assert _used(limiter, "google_cse") == 1
+
+
+def test_quota_applies_when_the_rate_is_disabled(monkeypatch, limiter, clock):
+    monkeypatch.setenv("RATE_LIMIT_GOOGLE_CSE", "0")
+    monkeypatch.setenv("RATE_LIMIT_GOOGLE_CSE_QUOTA", "1/day")
+    assert limiter.acquire("google_cse") == 0
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("google_cse")
+
+
+def test_month_window_rolls_over_the_year():
+    start, end = rate_limit._window_bounds("month", datetime(2026, 12, 31, 12, tzinfo=timezone.utc).timestamp())
+    assert datetime.fromtimestamp(start, timezone.utc) == datetime(2026, 12, 1, tzinfo=timezone.utc)
+    assert datetime.fromtimestamp(end, timezone.utc) == datetime(2027, 1, 1, tzinfo=timezone.utc)
+
+
+def test_cancelled_waiter_gives_its_slot_back(monkeypatch, limiter):
+    monkeypatch.setenv("RATE_LIMIT_SHODAN", "1:1")
+    monkeypatch.setenv("RATE_LIMIT_SHODAN_QUOTA", "10/day")
+
+    async def scenario():
+        assert await limiter.aacquire("shodan") == 0
+        waiter = asyncio.create_task(limiter.aacquire("shodan")) # ~1s away
+        await asyncio.sleep(0.1)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(scenario())
+    assert _used(limiter, "shodan") == 1 # The cancelled reservation was refunded
+    wait = limiter._reserve("shodan", max_wait=10) # Next in line again, not behind the cancelled one
+    assert wait < 1.0
+
+
+def test_limited_wrapper_reports_instead_of_raising(monkeypatch, tmp_path):
+    monkeypatch.setattr(rate_limit, "limiter", RateLimiter(db_path=tmp_path / "rl.db"))
+    monkeypatch.setenv("RATE_LIMIT_IPINFO", "0")
+    monkeypatch.setenv("RATE_LIMIT_IPINFO_QUOTA", "1/month")
+    lookup = rate_limit.limited("ipinfo", lambda arg: f"ok {arg}")
+    assert lookup("8.8.8.8") == "ok 8.8.8.8"
+    assert lookup("1.1.1.1").startswith("[ipinfo] rate limited:")
+    assert rate_limit.limited("whois", len) is len # No provider: not wrapped
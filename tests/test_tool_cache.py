@@ -0,0 +1,119 @@
+"""ToolCache TTLs, stale-while-revalidate and LRU eviction against a throwaway database."""
+import time
+
+import pytest
+
+import tool_cache
+from tool_cache import ToolCache, is_error_reply
+
+REAL_SLEEP = time.sleep
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(tool_cache.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ToolCache(db_path=tmp_path / "tool_cache.db")
+
+
+class Lookup:
+    """Counts calls; returns a new answer each time."""
+
+    def __init__(self, reply="result"):
+        self.calls = 0
+        self.reply = reply
+
+    def __call__(self, arg):
+        self.calls += 1
+        return f"{self.reply} {arg} #{self.calls}"
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        REAL_SLEEP(0.01)
+
+
+def test_fresh_hit_and_normalized_key(cache, clock):
+    lookup = Lookup()
+    assert cache.get_or_call("whois", "Example.com ", lookup, ttl=60) == "result Example.com  #1"
+    assert cache.get_or_call("whois", "example.com", lookup, ttl=60) == "result Example.com  #1"
+    assert lookup.calls == 1
+
+
+def test_expired_past_the_stale_window_is_a_miss(cache, clock, monkeypatch):
+    monkeypatch.setattr(tool_cache, "STALE_FACTOR", 1.0)
+    lookup = Lookup()
+    cache.get_or_call("whois", "a", lookup, ttl=60)
+    clock[0] += 120 # TTL + the whole stale window
+    assert cache.get_or_call("whois", "a", lookup, ttl=60) == "result a #2"
+    assert lookup.calls == 2
+
+
+def test_stale_while_revalidate(cache, clock, monkeypatch):
+    monkeypatch.setattr(tool_cache, "STALE_FACTOR", 1.0)
+    lookup = Lookup()
+    cache.get_or_call("whois", "a", lookup, ttl=60)
+    clock[0] += 90 # Expired, but within the stale window
+    assert cache.get_or_call("whois", "a", lookup, ttl=60) == "result a #1" # Old value, at once
+    _wait_for(lambda: lookup.calls == 2) # ...refreshed in the background
+    _wait_for(lambda: not cache._refreshing)
+    assert cache.get_or_call("whois", "a", lookup, ttl=60) == "result a #2"
+    assert lookup.calls == 2
+
+
+def test_survives_a_restart(tmp_path, clock):
+    lookup = Lookup()
+    ToolCache(db_path=tmp_path / "c.db").get_or_call("whois", "a", lookup, ttl=60)
+    assert ToolCache(db_path=tmp_path / "c.db").get_or_call("whois", "a", lookup, ttl=60) == "result a #1"
+
+
+def test_lru_eviction(tmp_path, clock):
+    cache = ToolCache(db_path=tmp_path / "c.db", max_bytes=100)
+    for arg in ("a", "b", "c"): # 30 bytes each (value + arg)
+        clock[0] += 1
+        cache.get_or_call("whois", arg, lambda a: "x" * 29, ttl=600)
+    clock[0] += 1
+    cache.get_or_call("whois", "a", Lookup(), ttl=600) # A hit: "a" is now the most recently used
+    clock[0] += 1
+    cache.get_or_call("whois", "d", lambda a: "x" * 29, ttl=600) # 120 bytes > 100: evict down to 90
+    kept = {row[0] for row in cache.conn.execute("SELECT arg FROM cache")}
+    assert kept == {"a", "c", "d"}
+    assert cache._size <= 90
+
+
+def test_error_replies_are_not_cached(cache, clock):
+    calls = []
+
+    def failing(arg):
+        calls.append(arg)
+        return "[IPinfo] HTTP 503"
+
+    cache.get_or_call("ipinfo", "8.8.8.8", failing, ttl=60)
+    cache.get_or_call("ipinfo", "8.8.8.8", failing, ttl=60)
+    assert len(calls) == 2
+
+
+def test_json_array_results_are_cached(cache, clock):
+    lookup = Lookup(reply='[{"port": 22}]')
+    cache.get_or_call("shodan", "1.2.3.4", lookup, ttl=60)
+    cache.get_or_call("shodan", "1.2.3.4", lookup, ttl=60)
+    assert lookup.calls == 1
+
+
+@pytest.mark.parametrize("tool, text, error", [
+    ("ipinfo", "[IPinfo] 404 Not Found", True),
+    ("alienvault_otx", "[AlienVault OTX] timed out", True),
+    ("shodan", "[shodan] rate limited: quota used up", True),
+    ("ipinfo", '[{"ip": "8.8.8.8"}]', False),
+    ("whois", "[1] first\n[2] second", False),
+    ("whois", "Domain Name: EXAMPLE.COM", False),
+])
+def test_is_error_reply(tool, text, error):
+    assert is_error_reply(tool, text) is error
@@ -0,0 +1,89 @@
+"""ToolCallStreamParser fed a reply in arbitrary pieces."""
+import json
+
+import pytest
+
+from src.tool_stream import ToolCallStreamParser
+
+CALL = {"tool_name": "whois", "arguments": {"domain": "example.com", "depth": 2}}
+
+
+def _feed(pieces) -> ToolCallStreamParser:
+    parser = ToolCallStreamParser()
+    for piece in pieces:
+        parser.feed(piece)
+    return parser
+
+
+def _split(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_call_split_across_chunks(size):
+    text = json.dumps(CALL)
+    parser = _feed(_split(text, size))
+    assert parser.kind == "tool"
+    assert parser.call == CALL
+    assert parser.call_text == text
+
+
+def test_name_and_arguments_before_the_call_closes():
+    parser = ToolCallStreamParser()
+    parser.feed('{"tool_name": "who')
+    assert parser.kind == "tool" and parser.tool_name is None
+    parser.feed('is", "arguments": {"domain": "exam')
+    assert parser.tool_name == "whois"
+    assert parser.arguments == {}
+    parser.feed('ple.com", "depth": 2')
+    assert parser.arguments == {"domain": "example.com"} # 2 may still grow into 20
+    parser.feed('}')
+    assert parser.arguments == CALL["arguments"]
+    assert parser.call is None
+    parser.feed('}')
+    assert parser.call == CALL
+
+
+def test_braces_and_quotes_inside_strings():
+    call = {"tool_name": "search", "arguments": {"query": 'a } b { "c" \\ ]'}}
+    text = json.dumps(call)
+    parser = _feed(_split(text, 4))
+    assert parser.call == call
+    assert parser.call_text == text
+
+
+def test_fenced_call_with_text_around_it():
+    text = json.dumps(CALL)
+    parser = _feed(_split(f"  ```json\n{text}\n```\nDone, looking it up.", 5))
+    assert parser.kind == "tool"
+    assert parser.call == CALL
+    assert parser.call_text == text # Only the object, not the fence or the trailing text
+
+
+def test_trailing_text_after_the_object_is_ignored():
+    text = json.dumps(CALL)
+    parser = _feed([text[:-1], text[-1] + " and then some prose {"])
+    assert parser.call == CALL
+    assert parser.call_text == text
+
+
+def test_text_before_the_json_is_plain_text():
+    parser = _feed(["Sure! ", json.dumps(CALL)])
+    assert parser.kind == "text"
+    assert parser.call is None
+
+
+@pytest.mark.parametrize("pieces", [["`", "`", "`\n", "Plain answer"], ["``", "x"]])
+def test_backticks_wait_for_the_fence(pieces):
+    parser = ToolCallStreamParser()
+    parser.feed(pieces[0])
+    assert parser.kind is None
+    for piece in pieces[1:]:
+        parser.feed(piece)
+    assert parser.kind == "text"
+
+
+def test_json_that_is_not_a_tool_call_becomes_text():
+    parser = _feed(['{"answer": ', '42}'])
+    assert parser.kind == "text"
+    assert parser.call is None
@@ -0,0 +1,54 @@
+"""load_config's path resolution."""
+import os
+
+import yaml
+
+from src.utils import load_config
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load(tmp_path, llm: dict) -> dict:
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump({"llm": llm, "memory": {"path": "data/history.json"}}))
+    return load_config(str(path))
+
+
+def test_top_level_paths(tmp_path):
+    config = _load(tmp_path, {
+        "type": "llama_cpp",
+        "model_path": "models/big.gguf",
+        "speculative": {"mode": "draft_model", "draft_model_path": "models/draft.gguf"},
+        "router": {"small": {"type": "llama_cpp", "model_path": "/abs/small.gguf"}},
+    })
+    llm = config["llm"]
+    assert llm["model_path"] == os.path.join(PROJECT_ROOT, "models/big.gguf")
+    assert llm["speculative"]["draft_model_path"] == os.path.join(PROJECT_ROOT, "models/draft.gguf")
+    assert llm["router"]["small"]["model_path"] == "/abs/small.gguf"
+    assert config["memory"]["path"] == os.path.join(PROJECT_ROOT, "data/history.json")
+
+
+def test_cluster_node_paths(tmp_path):
+    config = _load(tmp_path, {
+        "type": "cluster",
+        "nodes": [
+            {"server_url": "http://10.0.0.2:8088"},
+            {"type": "llama_cpp", "model_path": "models/node.gguf",
+             "speculative": {"mode": "draft_model", "draft_model_path": "models/node-draft.gguf"}},
+        ],
+    })
+    nodes = config["llm"]["nodes"]
+    assert "model_path" not in nodes[0]
+    assert nodes[1]["model_path"] == os.path.join(PROJECT_ROOT, "models/node.gguf")
+    assert nodes[1]["speculative"]["draft_model_path"] == os.path.join(PROJECT_ROOT, "models/node-draft.gguf")
+
+
+def test_hedged_arm_paths(tmp_path):
+    config = _load(tmp_path, {
+        "type": "hedged",
+        "primary": {"type": "llama_cpp", "model_path": "models/primary.gguf"},
+        "backup": {"type": "cluster", "nodes": [{"type": "llama_cpp", "model_path": "models/backup.gguf"}]},
+    })
+    llm = config["llm"]
+    assert llm["primary"]["model_path"] == os.path.join(PROJECT_ROOT, "models/primary.gguf")
+    assert llm["backup"]["nodes"][0]["model_path"] == os.path.join(PROJECT_ROOT, "models/backup.gguf")
@@ -0,0 +1,286 @@
+# tool_cache.py
+"""
+Persistent TTL cache for lookup-tool results, keyed by (tool, normalized arg).
+
+tool_registry wraps every tool that has a TTL, so callers need no changes
+(tool_runner does the same for async `arun` wrappers via acached()):
+
+    TOOLS["whois"]("Example.com ")   # network call, result stored for a day
+    TOOLS["whois"]("example.com")    # served from memory
+
+Results live in data/tool_cache.db (SQLite) behind a small in-memory LRU, so
+repeat lookups skip both the network and the disk. When an entry is past its
+TTL but within the stale window (TOOL_CACHE_STALE_FACTOR × TTL) the old
+result is returned at once and refreshed in the background
+(stale-while-revalidate). The file is kept under TOOL_CACHE_MAX_MB by
+evicting the least recently used entries. Error replies (the wrappers'
+"[Tool] …" convention, see is_error_reply) are never cached.
+
+TTLs are per tool (TOOL_TTLS, overridable with TOOL_CACHE_TTL_<TOOL>=seconds;
+0 disables caching for that tool). Counters: tool_cache_hits_total{state},
+tool_cache_misses_total, tool_cache_evictions_total.
+"""
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import metrics
+
+log = logging.getLogger("tool_cache")
+
+DB_PATH = Path(__file__).parent / "data" / "tool_cache.db"
+MAX_BYTES = int(float(os.getenv("TOOL_CACHE_MAX_MB", 64)) * 1024 * 1024)
+STALE_FACTOR = float(os.getenv("TOOL_CACHE_STALE_FACTOR", 1.0))
+MEMORY_ENTRIES = 1024
+
+HOUR = 3600
+TOOL_TTLS = {
+    "whois": 24 * HOUR,
+    "ipinfo": 12 * HOUR,
+    "shodan": 6 * HOUR,
+    "alienvault_otx": 6 * HOUR,
+    "geopy": 7 * 24 * HOUR,
+    "google_images_search": HOUR,
+}
+
+
+def ttl_for(tool: str) -> float:
+    """Cache TTL in seconds for a tool (0 = not cached)."""
+    override = os.getenv(f"TOOL_CACHE_TTL_{tool.upper()}")
+    return float(override) if override is not None else float(TOOL_TTLS.get(tool, 0))
+
+
+_LABEL = re.compile(r"\s*\[([^\]\n]{1,40})\]")
+
+
+def _label_key(label: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", label.lower())
+
+
+def is_error_reply(tool: str, result) -> bool:
+    """
+    True for a wrapper's error reply: text that starts with the tool's own "[Tool]" label
+    ("[IPinfo] …" for ipinfo, "[AlienVault OTX] …" for alienvault_otx). A JSON array or a
+    "[1] …" list is an ordinary result.
+    """
+    if not isinstance(result, str):
+        return False
+    m = _LABEL.match(result)
+    return m is not None and _label_key(m.group(1)) == _label_key(tool)
+
+
+def normalize_arg(arg) -> str:
+    """Case- and whitespace-insensitive form of a lookup argument ('Example.com ' == 'example.com')."""
+    return " ".join(str(arg).split()).lower()
+
+
+class ToolCache:
+    """SQLite store + in-memory LRU; see the module docstring."""
+
+    def __init__(self, db_path: Path = DB_PATH, max_bytes: int = MAX_BYTES):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        # Tools run on worker threads; one connection guarded by a lock
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._memory: OrderedDict[tuple, tuple[str, float, float]] = OrderedDict() # key -> (value, expires, stale_until)
+        self._touched: dict[tuple, float] = {} # Access times not yet written back
+        self._refreshing: set[tuple] = set()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="tool-cache")
+        self._ensure_schema()
+        self._size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+    # ---------- private helpers ----------
+    def _ensure_schema(self):
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS cache(
+                tool         TEXT    NOT NULL,
+                arg          TEXT    NOT NULL,
+                value        TEXT    NOT NULL,
+                created      REAL    NOT NULL,
+                expires      REAL    NOT NULL,
+                stale_until  REAL    NOT NULL,
+                accessed     REAL    NOT NULL,
+                size         INTEGER NOT NULL,
+                PRIMARY KEY (tool, arg)
+            );
+            CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed);
+            """
+        )
+        self.conn.commit()
+
+    def _remember(self, key: tuple, entry: tuple):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, key: tuple) -> tuple | None:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        row = self.conn.execute("SELECT value, expires, stale_until FROM cache WHERE tool = ? AND arg = ?", key).fetchone()
+        if row is not None:
+            entry = tuple(row)
+            self._remember(key, entry)
+        return entry
+
+    def _flush_touched(self):
+        if self._touched:
+            self.conn.executemany("UPDATE cache SET accessed = ? WHERE tool = ? AND arg = ?",
+                                  [(t, *key) for key, t in self._touched.items()])
+            self._touched.clear()
+
+    def _store(self, key: tuple, value: str, ttl: float):
+        now = time.time()
+        entry = (value, now + ttl, now + ttl * (1 + STALE_FACTOR))
+        size = len(value.encode("utf-8")) + len(key[1])
+        with self._lock:
+            old = self.conn.execute("SELECT size FROM cache WHERE tool = ? AND arg = ?", key).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache(tool, arg, value, created, expires, stale_until, accessed, size)"
+                " VALUES (?,?,?,?,?,?,?,?)", (*key, value, now, entry[1], entry[2], now, size))
+            self._size += size - (old[0] if old else 0)
+            self._remember(key, entry)
+            self._flush_touched() # Batched with this write: hits never pay for a commit
+            if self._size > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        # Least recently used first, down to 90% of the budget
+        target, evicted = self.max_bytes * 0.9, 0
+        rows = self.conn.execute("SELECT tool, arg, size FROM cache ORDER BY accessed").fetchall()
+        for tool, arg, size in rows:
+            if self._size <= target:
+                break
+            self.conn.execute("DELETE FROM cache WHERE tool = ? AND arg = ?", (tool, arg))
+            self._memory.pop((tool, arg), None)
+            self._size -= size
+            evicted += 1
+        metrics.inc("tool_cache_evictions_total", evicted)
+        log.info(f"Tool cache over {self.max_bytes} bytes; evicted {evicted} least recently used entries")
+
+    def _call(self, key: tuple, func, arg, ttl: float) -> str:
+        result = func(arg)
+        if isinstance(result, str) and not is_error_reply(key[0], result):
+            self._store(key, result, ttl)
+        return result
+
+    def _refresh(self, key: tuple, func, arg, ttl: float):
+        try:
+            self._call(key, func, arg, ttl)
+        except Exception as e:
+            log.warning(f"Background refresh of {key[0]}({key[1]!r}) failed; keeping the stale result: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    async def _acall(self, key: tuple, afunc, arg, ttl: float) -> str:
+        result = await afunc(arg)
+        if isinstance(result, str) and not is_error_reply(key[0], result):
+            # The write (and any eviction) runs off the loop
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._store, key, result, ttl)
+        return result
+
+    async def _arefresh(self, key: tuple, afunc, arg, ttl: float):
+        try:
+            await self._acall(key, afunc, arg, ttl)
+        except Exception as e:
+            log.warning(f"Background refresh of {key[0]}({key[1]!r}) failed; keeping the stale result: {e}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _check(self, tool: str, key: tuple) -> tuple[str | None, bool]:
+        """(cached value or None, whether a background refresh should start)."""
+        now = time.time()
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None or now >= entry[2]:
+                metrics.inc("tool_cache_misses_total", tool=tool)
+                return None, False
+            self._touched[key] = now
+            if now < entry[1]:
+                metrics.inc("tool_cache_hits_total", tool=tool, state="fresh")
+                return entry[0], False
+            metrics.inc("tool_cache_hits_total", tool=tool, state="stale")
+            refresh = key not in self._refreshing
+            self._refreshing.add(key)
+            return entry[0], refresh
+
+    # ---------- public API ----------
+    def get_or_call(self, tool: str, arg, func, ttl: float | None = None) -> str:
+        """func(arg) through the cache (see the module docstring)."""
+        ttl = ttl_for(tool) if ttl is None else ttl
+        key = (tool, normalize_arg(arg))
+        value, refresh = self._check(tool, key)
+        if refresh:
+            self._executor.submit(self._refresh, key, func, arg, ttl)
+        if value is not None:
+            return value
+        return self._call(key, func, arg, ttl)
+
+    async def aget_or_call(self, tool: str, arg, afunc, ttl: float | None = None) -> str:
+        """get_or_call() for a coroutine function; stale entries are refreshed as a loop task."""
+        ttl = ttl_for(tool) if ttl is None else ttl
+        key = (tool, normalize_arg(arg))
+        value, refresh = self._check(tool, key)
+        if refresh:
+            asyncio.get_running_loop().create_task(self._arefresh(key, afunc, arg, ttl))
+        if value is not None:
+            return value
+        return await self._acall(key, afunc, arg, ttl)
+
+    def invalidate(self, tool: str, arg=None) -> None:
+        """Drops one cached result, or every result of a tool when arg is None."""
+        with self._lock:
+            if arg is None:
+                self.conn.execute("DELETE FROM cache WHERE tool = ?", (tool,))
+                for key in [k for k in self._memory if k[0] == tool]:
+                    del self._memory[key]
+            else:
+                key = (tool, normalize_arg(arg))
+                self.conn.execute("DELETE FROM cache WHERE tool = ? AND arg = ?", key)
+                self._memory.pop(key, None)
+            self._size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+            self.conn.commit()
+
+
+tool_cache = ToolCache()
+
+
+def cached(tool: str, func):
+    """`func` wrapped with the cache if the tool has a TTL, else `func` itself."""
+    if not ttl_for(tool):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(arg="", *args, **kwargs):
+        if args or kwargs: # Only the plain run(arg) form is cached
+            return func(arg, *args, **kwargs)
+        return tool_cache.get_or_call(tool, arg, func)
+
+    return wrapper
+
+
+def acached(tool: str, afunc):
+    """cached() for a coroutine function such as a REST wrapper's arun()."""
+    if not ttl_for(tool):
+        return afunc
+
+    @functools.wraps(afunc)
+    async def wrapper(arg=""):
+        return await tool_cache.aget_or_call(tool, arg, afunc)
+
+    return wrapper
@@ -30,6 +30,7 @@ TEMPLATE_MAP = {
     "geopy.py":       ("specific", "geopy.py.j2"),
     "gpt4all.py":     ("specific", "gpt4all.py.j2"),
     "llama_cpp.py": ("specific", "llama_cpp.py.j2"),
+    "nmap.py":       ("specific", "nmap.py.j2"),  # XML into scan_store
 
     # --- Generic REST examples -------------------------------------------
     "alienvault_otx.py": ("rest", {
@@ -52,11 +53,11 @@ TEMPLATE_MAP = {
         "arg_pattern": "enum -d {arg} -o -",
         "cmd_builder": "amass enum -d {arg} -o -", # This is the string literal value
     }),
-    "nmap.py": ("cli", {
-        "name": "Nmap",
-        "exec_name": "nmap",
-        "arg_pattern": "-A {arg}",
-        "cmd_builder": "nmap -A {arg}",
+    "masscan.py": ("cli", {
+        "name": "Masscan",
+        "exec_name": "masscan",
+        "arg_pattern": "-p80 {arg}",
+        "cmd_builder": "masscan -p80 {arg}",
     }),
     # ---------------------------------------------------------------------
     # Add more entries here as you template more tools
@@ -1,36 +1,200 @@
 """
-Dynamic loader for all tool modules in the `tools` package.
-Populates the `TOOLS` dict mapping tool names to their callable implementations.
+Lazy registry for the tool modules in the `tools` package.
+
+`TOOLS` maps tool names to their callables, but a module is only imported the
+first time one of its tools is looked up. Names come from a manifest built by
+parsing (not importing) each file:
+
+    data/tool_manifest.json
+        {"version": 1, "modules": {"whois": {"file": "whois.py", "mtime": ..., "size": ...,
+                                             "sha1": "...", "doc": "...", "tools": ["whois"]}}}
+
+A module provides a tool if it defines a top-level `run(arg)` (the tool takes the
+module's name) or registers callables with a literal `tool_registry.TOOLS.update({...})`.
+Only files whose mtime or size changed are re-parsed, so startup costs a few stat()
+calls instead of importing every tool (some load whole models at import).
+
+Lookup tools with a TTL in tool_cache are wrapped with the persistent result cache
+as they are loaded, and tools of a rate-limited API provider (rate_limit) wait for
+a token on a cache miss.
 """
+import ast
+import hashlib
 import importlib
-import pkgutil
+import json
+import logging
+import os
+from collections.abc import MutableMapping
 
-TOOLS: dict[str, callable] = {}
+import rate_limit
+import tool_cache
 
-def load_tools() -> None:
-    """Discover and import all modules in the tools package."""
+log = logging.getLogger("tool_registry")
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+TOOLS_DIR = os.path.join(PROJECT_ROOT, "tools")
+MANIFEST_PATH = os.path.join(PROJECT_ROOT, "data", "tool_manifest.json")
+MANIFEST_VERSION = 1
+
+
+def _scan_file(path: str) -> dict:
+    """Tool names and docstring of one module, read from its AST."""
+    with open(path, "rb") as f:
+        source = f.read()
+    entry = {"sha1": hashlib.sha1(source).hexdigest(), "doc": "", "tools": []}
+    try:
+        tree = ast.parse(source, filename=path)
+    except (SyntaxError, ValueError) as e:
+        log.warning(f"Skipping {os.path.basename(path)}: {e}")
+        return entry
+
+    module_name = os.path.splitext(os.path.basename(path))[0]
+    doc = ast.get_docstring(tree) or ""
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name == "run":
+            entry["tools"].append(module_name)
+            doc = doc or ast.get_docstring(node) or ""
+        elif isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == "run" for t in node.targets):
+            entry["tools"].append(module_name)
+        # tool_registry.TOOLS.update({"name": func, ...})
+        elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Call):
+            func = node.value.func
+            if isinstance(func, ast.Attribute) and func.attr == "update" and \
+                    isinstance(func.value, (ast.Attribute, ast.Name)) and \
+                    getattr(func.value, "attr", getattr(func.value, "id", None)) == "TOOLS" and \
+                    node.value.args and isinstance(node.value.args[0], ast.Dict):
+                entry["tools"].extend(k.value for k in node.value.args[0].keys
+                                      if isinstance(k, ast.Constant) and isinstance(k.value, str))
+    entry["doc"] = doc.strip().splitlines()[0] if doc.strip() else ""
+    return entry
+
+
+def _read_manifest() -> dict:
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": MANIFEST_VERSION, "modules": {}}
+
+
+def _write_manifest(manifest: dict) -> None:
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
     try:
-        import tools
-        tools_path = tools.__path__
-    except ImportError:
-        return
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, MANIFEST_PATH) # Atomic, so concurrent bots never read half a file
+    except OSError as e:
+        log.warning(f"Could not write tool manifest {MANIFEST_PATH}: {e}")
 
-    for finder, name, ispkg in pkgutil.iter_modules(tools_path):
-        if ispkg:
+
+def build_manifest() -> dict:
+    """Bring the cached manifest up to date with tools/, re-parsing only changed files."""
+    manifest = _read_manifest()
+    old, modules, rescanned = manifest["modules"], {}, 0
+    try:
+        files = sorted(f for f in os.listdir(TOOLS_DIR) if f.endswith(".py") and f != "__init__.py")
+    except FileNotFoundError:
+        files = []
+    for filename in files:
+        module_name = filename[:-3]
+        st = os.stat(os.path.join(TOOLS_DIR, filename))
+        cached = old.get(module_name)
+        if cached and cached.get("mtime") == st.st_mtime and cached.get("size") == st.st_size:
+            modules[module_name] = cached
             continue
+        entry = _scan_file(os.path.join(TOOLS_DIR, filename))
+        modules[module_name] = {"file": filename, "mtime": st.st_mtime, "size": st.st_size, **entry}
+        rescanned += 1
+    manifest["modules"] = modules
+    if rescanned or modules.keys() != old.keys():
+        log.info(f"Tool manifest: {rescanned} of {len(modules)} modules (re)scanned")
+        _write_manifest(manifest)
+    return manifest
+
+
+class LazyTools(MutableMapping):
+    """
+    {tool name: callable} that imports a tool's module on first lookup.
+    Membership tests and iteration never import anything.
+    """
+
+    def __init__(self):
+        self._modules: dict[str, str] = {}  # tool name -> module name
+        self._docs: dict[str, str] = {}
+        self._loaded: dict[str, callable] = {}
+
+    def index(self, manifest: dict) -> None:
+        for module_name, entry in manifest["modules"].items():
+            for name in entry["tools"]:
+                # Explicit TOOLS.update() registrations win over a same-named module's run(),
+                # as they did when every module was imported in order
+                if name == module_name and name in self._modules:
+                    continue
+                self._modules[name] = module_name
+                self._docs[name] = entry.get("doc", "")
+
+    def _import(self, name: str):
+        module_name = self._modules[name]
         try:
-            module = importlib.import_module(f"tools.{name}")
-        except Exception:
-            continue
-        # If module defines a run(arg) function, register it
-        if hasattr(module, "run") and callable(module.run):
-            TOOLS[name] = module.run
+            module = importlib.import_module(f"tools.{module_name}")
+        except Exception as e:
+            log.error(f"Tool '{name}' is unavailable: importing tools.{module_name} failed: {e}")
+            error = f"[{name}] unavailable: {e}"
+            return lambda *args, **kwargs: error
+        if name not in self._loaded: # Self-registering modules fill _loaded while importing
+            func = getattr(module, "run", None)
+            if not callable(func):
+                error = f"[{name}] unavailable: tools.{module_name} did not register it"
+                return lambda *args, **kwargs: error
+            self._loaded[name] = tool_cache.cached(name, rate_limit.limited(name, func))
+        return self._loaded[name]
 
-# Load all CLI-based tools
-load_tools()
+    def __getitem__(self, name: str):
+        func = self._loaded.get(name)
+        if func is not None:
+            return func
+        if name not in self._modules:
+            raise KeyError(name)
+        return self._import(name)
+
+    def __setitem__(self, name: str, func) -> None:
+        self._loaded[name] = tool_cache.cached(name, rate_limit.limited(name, func))
+
+    def __delitem__(self, name: str) -> None:
+        self._loaded.pop(name, None)
+        if self._modules.pop(name, None) is None:
+            raise KeyError(name)
+
+    def __contains__(self, name) -> bool:
+        return name in self._loaded or name in self._modules
+
+    def __iter__(self):
+        return iter(sorted(self._modules.keys() | self._loaded.keys()))
+
+    def __len__(self) -> int:
+        return len(self._modules.keys() | self._loaded.keys())
+
+    def doc(self, name: str) -> str:
+        """First line of the tool module's docstring (no import)."""
+        return self._docs.get(name, "")
 
-# Explicitly import the image suite so it self-registers
-try:
-    import tools.tools_image_suite  # noqa: F401
-except ImportError:
-    pass
+
+TOOLS = LazyTools()
+
+
+def load_tools() -> None:
+    """Index every tool in the tools package from the manifest (no tool module is imported)."""
+    TOOLS.index(build_manifest())
+
+
+def list_tools() -> list[str]:
+    """Sorted tool names."""
+    return list(TOOLS)
+
+
+# Index all tools (cheap: reads the cached manifest)
+load_tools()
@@ -0,0 +1,262 @@
+# tool_runner.py
+"""
+Runs tools without blocking the asyncio event loop.
+
+    out = await tool_runner.run_tool("nmap", "-p 80 example.com")
+    name, result = await tool_runner.run_blocking(execute_tool, call_json, config)
+
+CLI tools are run with asyncio.create_subprocess_exec, so a 10-minute scan
+costs the loop nothing, its output streams to `on_update` as it is printed,
+and cancelling the caller kills the process. A tool is a CLI tool if it
+exposes a command builder, `cli_command(arg) -> (argv, finish)`, as a
+module function (tools/nmap.py) or as an attribute of the tool callable
+(tools/tools_bulk_wrappers.py), or if its module is a generic wrapper with
+a CMD_TEMPLATE. `finish(output, error)`, when not None, turns the captured
+output into the tool's result (e.g. nmap stores its XML and returns a
+summary); `error` is None, "exit N", "Timed-out (>Ns)", a spawn error or
+"cancelled" (then it should only clean up). Tools whose module has an `async def arun(arg)` (the REST wrappers,
+via http_client) are awaited on the loop itself. Every other tool is a plain
+Python call and goes to a bounded thread pool. Each tool class has its own concurrency limit, so a burst of
+scans cannot starve quick lookups:
+
+    TOOL_CONCURRENCY_CLI=2      subprocess scanners (nmap, amass, masscan, …)
+    TOOL_CONCURRENCY_IMAGE=1    image generation/search (model- or API-heavy)
+    TOOL_CONCURRENCY_DEFAULT=8  everything else (also the thread pool size)
+
+`start_loop_lag_monitor()` records how late the loop wakes up
+(event_loop_lag_seconds) so a tool that still blocks shows up in /metrics.
+"""
+import asyncio
+import concurrent.futures
+import logging
+import math
+import os
+import shlex
+import sys
+import time
+
+import metrics
+import rate_limit
+import tool_cache
+from output_capture import OutputCapture
+from tool_registry import TOOLS
+
+log = logging.getLogger("tool_runner")
+
+CLI_TIMEOUT = float(os.getenv("TOOL_CLI_TIMEOUT", 600)) # 10-minute ceiling for long scans
+STREAM_LINE_LIMIT = 1024 * 1024 # Longest single output line (progress bars can be long)
+
+CONCURRENCY = {
+    "cli": int(os.getenv("TOOL_CONCURRENCY_CLI", 2)),
+    "image": int(os.getenv("TOOL_CONCURRENCY_IMAGE", 1)),
+    "default": int(os.getenv("TOOL_CONCURRENCY_DEFAULT", 8)),
+}
+
+IMAGE_TOOLS = {
+    "stable_diffusion", "openai_dall_e", "google_images_search", "duckduckgo_images",
+    "yandex_reverse_image_search", "tineye_reverse_image_search", "bing_image_search",
+}
+
+LOOP_LAG_INTERVAL = 0.25
+
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=CONCURRENCY["default"], thread_name_prefix="tool")
+_semaphores: dict[str, asyncio.Semaphore] = {}
+_lag_task: asyncio.Task | None = None
+
+
+def _semaphore(tool_class: str) -> asyncio.Semaphore:
+    sem = _semaphores.get(tool_class)
+    if sem is None:
+        sem = _semaphores[tool_class] = asyncio.Semaphore(CONCURRENCY.get(tool_class, CONCURRENCY["default"]))
+    return sem
+
+
+def _module(func):
+    return sys.modules.get(getattr(func, "__module__", "") or "")
+
+
+def _command_builder(func):
+    """The tool's `cli_command(arg) -> (argv, finish)` if it runs a subprocess, else None."""
+    builder = getattr(func, "cli_command", None) or getattr(_module(func), "cli_command", None)
+    if callable(builder):
+        return builder
+    template = getattr(_module(func), "CMD_TEMPLATE", None)
+    if isinstance(template, str):
+        return lambda arg: (shlex.split(template.format(arg=arg)), None)
+    return None
+
+
+def _async_run(func):
+    """The module's `async def arun(arg)` if the tool has one, else None."""
+    arun = getattr(_module(func), "arun", None)
+    return arun if asyncio.iscoroutinefunction(arun) else None
+
+
+def is_cli(name: str, arg: str) -> bool:
+    """Whether run_tool(name, arg) runs a subprocess (without building the command)."""
+    return bool(arg) and _command_builder(TOOLS[name]) is not None
+
+
+def cli_command(name: str, arg: str) -> tuple[list[str], str, object] | None:
+    """
+    (argv, label, finish) for a CLI tool, or None if the tool is a plain Python call.
+    Building may allocate resources (nmap's temp file) that only finish() releases:
+    call it only to run the command.
+    """
+    func = TOOLS[name]
+    builder = _command_builder(func)
+    if builder is None or not arg:
+        return None
+    argv, finish = builder(arg)
+    module = _module(func)
+    doc = module.__doc__ if getattr(func, "cli_command", None) is None else None
+    label = (doc or name).split(" wrapper")[0].strip() or name
+    return argv, label, finish
+
+
+def tool_class(name: str, func=None) -> str:
+    """'cli', 'image' or 'default' — selects the concurrency limit."""
+    if name in IMAGE_TOOLS:
+        return "image"
+    if func is not None:
+        # A module can declare its class explicitly
+        declared = getattr(_module(func), "TOOL_CLASS", None)
+        if declared in CONCURRENCY:
+            return declared
+        if _command_builder(func) is not None:
+            return "cli"
+    return "default"
+
+
+async def run_blocking(func, *args, tool_class: str = "default", **kwargs):
+    """Runs a blocking call in the tool thread pool, within its class's concurrency limit."""
+    loop = asyncio.get_running_loop()
+    async with _semaphore(tool_class):
+        return await loop.run_in_executor(_executor, lambda: func(*args, **kwargs))
+
+
+async def stream_cli(argv: list[str], capture: OutputCapture, timeout: float | None = CLI_TIMEOUT,
+                     on_update=None, update_interval: float = 2.0, label: str = "cli") -> int:
+    """
+    Runs a command line, writing its combined stdout/stderr into `capture` as it
+    is printed, and returns the exit code. If given, `await on_update(tail)` is
+    called with the rolling tail at most once per `update_interval` seconds.
+    On timeout (None = no limit) the process is killed and asyncio.TimeoutError
+    raised; if the caller is cancelled the process is killed too. Raises OSError
+    if the command cannot be started. `capture` is left open.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT, limit=STREAM_LINE_LIMIT)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout if timeout else math.inf
+    last_update, dirty = loop.time(), False
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            try:
+                line = await asyncio.wait_for(proc.stdout.readline(), min(remaining, update_interval))
+            except asyncio.TimeoutError:
+                line = None # Quiet period: still flush pending output below
+            if line == b"":
+                break
+            if line:
+                capture.write(line.decode(errors="replace"))
+                dirty = True
+            if on_update is not None and dirty and loop.time() - last_update >= update_interval:
+                last_update, dirty = loop.time(), False
+                try:
+                    await on_update(capture.tail())
+                except Exception as e:
+                    log.debug(f"[{label}] progress update failed: {e}")
+        return await proc.wait()
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill() # Don't leave a scan running after its caller gave up
+            await proc.wait()
+        raise
+
+
+async def run_cli(argv: list[str], label: str, timeout: float | None = CLI_TIMEOUT, on_update=None,
+                  update_interval: float = 2.0, capture: OutputCapture | None = None, finish=None) -> str:
+    """
+    Runs a command line (see stream_cli) and returns its output or an error
+    string, like the synchronous CLI wrappers do.
+
+    Output goes into an OutputCapture (pass one in to keep a handle on it):
+    large outputs keep only head + tail in memory, spill in full to disk, and
+    the summary returned points at `!page <id>`. `finish(output, error)`, if
+    given, produces the result instead (run in a worker thread).
+    """
+    capture = capture if capture is not None else OutputCapture(label)
+    error, spawn_failed = None, False
+    try:
+        code = await stream_cli(argv, capture, timeout, on_update, update_interval, label)
+        error = f"exit {code}" if code != 0 else None
+    except asyncio.TimeoutError: # Before OSError: TimeoutError subclasses it
+        error = f"Timed-out (>{timeout:g}s)"
+    except OSError as e:
+        error, spawn_failed = str(e), True
+    except asyncio.CancelledError:
+        if finish is not None:
+            finish(capture.summary(), "cancelled")
+        raise
+    finally:
+        capture.close()
+    text = capture.summary()
+    if finish is not None:
+        return await asyncio.to_thread(finish, text, error)
+    if spawn_failed:
+        return f"[{label}] {error}"
+    if error is not None and error.startswith("Timed-out"):
+        return f"[{label}] {error}. Try a smaller scope."
+    if error is not None:
+        return f"[{label}] {text}"
+    return text or f"[{label}] No output"
+
+
+async def run_tool(name: str, arg: str, on_update=None, update_interval: float = 2.0,
+                   capture: OutputCapture | None = None) -> str:
+    """
+    Runs a registry tool (tool_registry.TOOLS) without blocking the event loop.
+    For CLI tools, `on_update` receives the rolling output tail while they run and
+    `capture` receives the full output (see run_cli).
+    Raises KeyError for an unknown tool.
+    """
+    func = TOOLS[name]
+    cls = tool_class(name, func)
+    start_time = time.time()
+    try:
+        if is_cli(name, arg):
+            async with _semaphore(cls):
+                argv, label, finish = cli_command(name, arg) # Built once it can run (see cli_command)
+                return await run_cli(argv, label, on_update=on_update, update_interval=update_interval,
+                                     capture=capture, finish=finish)
+        arun = _async_run(func)
+        if arun is not None:
+            async with _semaphore(cls):
+                return await tool_cache.acached(name, rate_limit.alimited(name, arun))(arg)
+        return await run_blocking(func, arg, tool_class=cls)
+    finally:
+        metrics.observe("tool_run_seconds", time.time() - start_time, tool=name, tool_class=cls)
+
+
+async def _monitor_loop_lag(interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - expected)
+        metrics.observe("event_loop_lag_seconds", lag)
+        metrics.set_gauge("event_loop_lag_last_seconds", lag)
+        if lag > 0.1:
+            log.warning(f"Event loop blocked for {lag * 1000:.0f} ms")
+
+
+def start_loop_lag_monitor(interval: float = LOOP_LAG_INTERVAL) -> asyncio.Task:
+    """Starts (once per process) a task that measures event-loop lag. Call from inside the loop."""
+    global _lag_task
+    if _lag_task is None or _lag_task.done():
+        _lag_task = asyncio.get_running_loop().create_task(_monitor_loop_lag(interval))
+    return _lag_task
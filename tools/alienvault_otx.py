@@ -2,26 +2,44 @@
 
 Calls: https://otx.alienvault.com/api/v1/indicators/IPv4/{arg}
 Headers: {'X-OTX-API-KEY': ''}
+Requests go through the shared pooled client (http_client): keep-alive,
+per-host connection limits and retries with backoff.
 """
 
-import json, requests
+import json
+
+import http_client
 
 URL          = "https://otx.alienvault.com/api/v1/indicators/IPv4"
 QUERY_PARAM  = ""
 HEADERS      = {"X-OTX-API-KEY": ""}
+TIMEOUT      = 10
+
+def _url(arg: str) -> str:
+    # Build full URL (path vs query style)
+    return f"{URL}/{arg}" if not QUERY_PARAM else f"{URL}?{QUERY_PARAM}={arg}"
+
+def _format(r) -> str:
+    r.raise_for_status()
+    # Truncate to 4 k chars for Discord
+    return json.dumps(r.json(), indent=2)[:4000]
 
 def run(arg: str) -> str:
     """Query the REST endpoint for *arg* and return prettified JSON."""
     if not arg:
         return f"[AlienVault OTX] Empty argument."
 
-    # Build full URL (path vs query style)
-    full_url = f"{URL}/{arg}" if not QUERY_PARAM else f"{URL}?{QUERY_PARAM}={arg}"
+    try:
+        return _format(http_client.request("GET", _url(arg), headers=HEADERS, timeout=TIMEOUT))
+    except Exception as e:
+        return f"[AlienVault OTX] {e}"
+
+async def arun(arg: str) -> str:
+    """run() for the event loop (used by tool_runner instead of a worker thread)."""
+    if not arg:
+        return f"[AlienVault OTX] Empty argument."
 
     try:
-        r = requests.get(full_url, headers=HEADERS, timeout=10)
-        r.raise_for_status()
-        # Truncate to 4 k chars for Discord
-        return json.dumps(r.json(), indent=2)[:4000]
+        return _format(await http_client.arequest("GET", _url(arg), headers=HEADERS, timeout=TIMEOUT))
     except Exception as e:
         return f"[AlienVault OTX] {e}"
@@ -26,4 +26,6 @@ def geopy(arg: str):
     """
     g = Nominatim(user_agent="kiba-bot")
     loc = g.geocode(arg)
-    return str(loc) if loc else "No match found."
\ No newline at end of file
+    return str(loc) if loc else "No match found."
+
+run = geopy  # Registered as the "geopy" tool, so the Nominatim rate limit and result cache apply
@@ -5,37 +5,46 @@ Requires the 'gpt4all' Python library and a downloaded model.
 """
 
 import os
-from gpt4all import GPT4All
 import logging
 
+from model_registry import registry
+
 # Configure logging (optional, but helpful for debugging)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 TOOL_NAME = "GPT4All"
 # Read model path from environment variable
-MODEL_PATH = r"C:\Users\btayl\AppData\Local\nomic.ai\GPT4All\Meta-Llama-3-8B-Instruct.Q4_0.gguf"  # Using a raw string
+MODEL_PATH = os.getenv("GPT4ALL_MODEL_PATH", r"C:\Users\btayl\AppData\Local\nomic.ai\GPT4All\Meta-Llama-3-8B-Instruct.Q4_0.gguf")  # Using a raw string
+
+# The model is loaded lazily through the shared model registry: either by the
+# startup preload stage (model_lifecycle.preload) or on the first call to run().
+# llm_manager shares this instance when GPT4ALL_MODEL_PATH points at the same model.
+_handle = registry.acquire("gpt4all", MODEL_PATH) if MODEL_PATH else None
+
 
-# Load the model once when the module is imported
-gpt4all_model = None
-if not MODEL_PATH:
-    logger.error("GPT4ALL_MODEL_PATH environment variable not set.")
-else:
+def load_model():
+    """Load the model (once, via the registry) and return it, or None if it cannot be loaded."""
+    if not MODEL_PATH:
+        logger.error("GPT4ALL_MODEL_PATH environment variable not set.")
+        return None
     try:
-        # Adjust model_path based on your GPT4All version/setup
-        # model = GPT4All(MODEL_PATH) is often sufficient
-        # Or if using default models directory:
-        # model = GPT4All(model_name='MODEL_FILENAME.gguf', allow_download=False)
-        # Let's assume MODEL_PATH is the full path to the file for simplicity here
-        gpt4all_model = GPT4All(MODEL_PATH)
-        logger.info(f"Successfully loaded GPT4All model from {MODEL_PATH}")
+        return _handle.get()
     except Exception as e:
         logger.error(f"Failed to load GPT4All model from {MODEL_PATH}: {e}")
+        return None
+
+
+def warm_up(prompt: str = "Hello", max_tokens: int = 8) -> None:
+    """Run a tiny generation so the weights are faulted in before real traffic."""
+    model = load_model()
+    if model is not None:
+        model.generate(prompt, max_tokens=max_tokens, temp=0.0)
 
 
 def run(arg: str) -> str:
     """Generates text using the loaded GPT4All model based on the input prompt."""
-    if not gpt4all_model:
+    if not load_model():
         return f"[{TOOL_NAME}] Model not loaded. Please set GPT4ALL_MODEL_PATH correctly."
 
     if not arg or not arg.strip():
@@ -46,12 +55,13 @@ def run(arg: str) -> str:
 
         # Use the generate method. Adjust parameters as needed (max_tokens, temp, etc.)
         # The exact method signature might vary slightly based on gpt4all version
-        response = gpt4all_model.generate(
-            arg,
-            max_tokens=200, # Limit response length to avoid flooding Discord/context issues
-            temp=0.7
-            # Add other parameters like top_k, top_p, repeat_penalty if desired
-        )
+        with _handle as gpt4all_model: # Pin the model so it isn't evicted mid-generation
+            response = gpt4all_model.generate(
+                arg,
+                max_tokens=200, # Limit response length to avoid flooding Discord/context issues
+                temp=0.7
+                # Add other parameters like top_k, top_p, repeat_penalty if desired
+            )
 
         logger.info(f"Generation complete. Response length: {len(response)}")
 
@@ -1,28 +1,42 @@
 """Masscan wrapper (generic CLI)
 
 Runs: masscan -p80 {arg}
-Returns stdout (trimmed) or an error string.
+Returns the output (head + tail, full text spilled to disk when large) or an error string.
+The bot runs CMD_TEMPLATE itself through tool_runner (async, streamed to Discord).
 """
 
-import subprocess, shlex
+import subprocess, shlex, threading
+
+from output_capture import OutputCapture
 
 CMD_TEMPLATE = "masscan -p80 {arg}"
+TIMEOUT = 600  # 10‑minute ceiling for long scans
 
 def run(arg: str) -> str:
     if not arg:
         return f"[Masscan] Empty argument."
 
+    capture = OutputCapture("Masscan")  # Bounded memory; large outputs spill to disk
     try:
-        cmd = CMD_TEMPLATE.format(arg=arg)
-        out = subprocess.check_output(
-            shlex.split(cmd),
-            stderr=subprocess.STDOUT,
-            timeout=600  # 10‑minute ceiling for long scans
-        )
-        return out.decode()[:4000] or f"[Masscan] No output"
-    except subprocess.TimeoutExpired:
-        return f"[Masscan] Timed‑out (>10 min). Try a smaller scope."
-    except subprocess.CalledProcessError as e:
-        return f"[Masscan] {e.output.decode()}"
+        proc = subprocess.Popen(shlex.split(CMD_TEMPLATE.format(arg=arg)), stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, text=True, errors="replace", bufsize=1)
     except Exception as e:
-        return f"[Masscan] {e}"
\ No newline at end of file
+        return f"[Masscan] {e}"
+    timed_out = threading.Event()
+    timer = threading.Timer(TIMEOUT, lambda: (timed_out.set(), proc.kill()))
+    timer.start()
+    try:
+        with capture:
+            for line in proc.stdout:  # Read as printed, so memory stays bounded
+                capture.write(line)
+        proc.wait()
+    finally:
+        timer.cancel()
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+    if timed_out.is_set():
+        return f"[Masscan] Timed‑out (>10 min). Try a smaller scope."
+    if proc.returncode != 0:
+        return f"[Masscan] {capture.summary()}"
+    return capture.summary() or f"[Masscan] No output"
@@ -1,28 +1,55 @@
-"""Nmap wrapper (generic CLI)
+"""Nmap wrapper (structured)
 
-Runs: nmap -A {arg}
-Returns stdout (trimmed) or an error string.
+Runs: nmap -A --stats-every 30s -oX <temp file> {arg}
+nmap's normal output streams to the caller while the scan runs (tool_runner
+shows it in Discord); the XML report is then stored in scan_store
+(data/scans.db) and a compact per-host summary returned. Past results can be
+queried with `!scan` instead of rescanning.
 """
 
-import subprocess, shlex
+import os, shlex, subprocess, tempfile
+import xml.etree.ElementTree as ET
 
-CMD_TEMPLATE = "nmap -A {arg}"
+from scan_store import scan_store
+
+NMAP_BIN = os.getenv("NMAP_BIN", "nmap")
+TIMEOUT = 600  # 10‑minute ceiling for the synchronous run(); the bot uses tool_runner's / the job's timeout
+
+def cli_command(arg: str):
+    """(argv, finish) for tool_runner: nmap writes its XML to a temp file that finish() stores."""
+    fd, xml_path = tempfile.mkstemp(prefix="nmap-", suffix=".xml")
+    os.close(fd)
+    argv = [NMAP_BIN, "-A", "--stats-every", "30s", "-oX", xml_path, *shlex.split(arg)]
+
+    def finish(output: str, error: str | None) -> str:
+        try:
+            if error == "cancelled":
+                return ""
+            try:
+                scan_id = scan_store.ingest(xml_path, args=arg)
+            except (ET.ParseError, ValueError):
+                return f"[Nmap] {output.strip() or error or 'No output'}"
+            summary = scan_store.summarize(scan_id)
+            return f"[Nmap] {error}; partial results:\n{summary}" if error else summary
+        finally:
+            try:
+                os.unlink(xml_path)
+            except OSError:
+                pass
+
+    return argv, finish
 
 def run(arg: str) -> str:
     if not arg:
         return f"[Nmap] Empty argument."
 
+    argv, finish = cli_command(arg)
     try:
-        cmd = CMD_TEMPLATE.format(arg=arg)
-        out = subprocess.check_output(
-            shlex.split(cmd),
-            stderr=subprocess.STDOUT,
-            timeout=600  # 10‑minute ceiling for long scans
-        )
-        return out.decode()[:4000] or f"[Nmap] No output"
-    except subprocess.TimeoutExpired:
-        return f"[Nmap] Timed‑out (>10 min). Try a smaller scope."
-    except subprocess.CalledProcessError as e:
-        return f"[Nmap] {e.output.decode()}"
-    except Exception as e:
-        return f"[Nmap] {e}"
\ No newline at end of file
+        proc = subprocess.run(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              text=True, errors="replace", timeout=TIMEOUT)
+    except subprocess.TimeoutExpired as e:
+        output = e.stdout.decode(errors="replace") if isinstance(e.stdout, bytes) else e.stdout or ""
+        return finish(output, "Timed‑out (>10 min)")
+    except OSError as e:
+        return finish("", str(e))
+    return finish(proc.stdout, f"exit {proc.returncode}" if proc.returncode else None)
@@ -1,31 +1,32 @@
 import os
-from llama_cpp import Llama
 import logging
 
+from model_registry import registry
+from tools.llama_cpp import LLM_PARAMS
+
 logger = logging.getLogger(__name__)
 
 TOOL_NAME = "LlamaCPP"
 MODEL_PATH = os.getenv("LLAMACPP_MODEL_PATH") # Use a different env var name
 
-llm_model = None
-if not MODEL_PATH:
-     logger.error("LLAMACPP_MODEL_PATH environment variable not set.")
-else:
+# Same GGUF + params as tools/llama_cpp.py, so the registry hands both tools one shared instance
+_handle = registry.acquire("llama_cpp", MODEL_PATH, **LLM_PARAMS) if MODEL_PATH else None
+
+
+def load_model():
+    """Load the model (once, via the registry) and return it, or None if it cannot be loaded."""
+    if not MODEL_PATH:
+        logger.error("LLAMACPP_MODEL_PATH environment variable not set.")
+        return None
     try:
-        # Load the model
-        llm_model = Llama(
-            model_path=MODEL_PATH,
-            n_ctx=4096, # Context window size (match model capability)
-            n_gpu_layers=-1, # Uncomment to offload all layers to GPU (if CUDA built)
-            verbose=False # Reduce verbosity
-        )
-        logger.info(f"Successfully loaded LlamaCPP model from {MODEL_PATH}")
+        return _handle.get()
     except Exception as e:
         logger.error(f"Failed to load LlamaCPP model from {MODEL_PATH}: {e}")
+        return None
 
 
 def run(arg: str) -> str:
-    if not llm_model:
+    if not load_model():
         return f"[{TOOL_NAME}] Model not loaded. Please set LLAMACPP_MODEL_PATH correctly."
 
     if not arg or not arg.strip():
@@ -33,12 +34,13 @@ def run(arg: str) -> str:
 
     try:
         # Example for a simple completion
-        output = llm_model.create_completion(
-            arg,
-            max_tokens=200,
-            temperature=0.7,
-            stop=["\n", "User:"] # Stop sequences
-        )
+        with _handle as llm_model: # Pin the model so it isn't evicted mid-generation
+            output = llm_model.create_completion(
+                arg,
+                max_tokens=200,
+                temperature=0.7,
+                stop=["\n", "User:"] # Stop sequences
+            )
         response = output["choices"][0]["text"]
 
         # Example for chat completion (if model supports it)
@@ -7,7 +7,7 @@
 • Call signature is always `tool(arg: str) -> str` so it plugs straight
   into the existing `TOOL_REGISTRY` / `!tool ...` path.
 • For tools that are libraries (e.g. `geoip2`), we attempt to import and
-  run a minimal demo; for CLI tools we spawn via `subprocess.run`.
+  run a minimal demo; for CLI tools we spawn via `subprocess.Popen` and read output as it arrives.
 • Environment‑specific paths can be overridden with `<TOOLNAME>_BIN`.
 
 Add proper, full‑featured wrappers later as you need them—this gets the
@@ -17,27 +17,54 @@ bot answering *now* instead of throwing "tool not found".
 import os
 import shlex
 import subprocess
+import threading
 from typing import Dict, Callable
 
+from output_capture import OutputCapture
+
 # ---------------------------------------------------------------------------
 # Helper: create a shell‑out wrapper
 # ---------------------------------------------------------------------------
 
 def _make_cli_wrapper(bin_name: str) -> Callable[[str], str]:
-    """Return a function that calls the given binary with the arg string."""
-    def _wrapper(arg: str) -> str:
+    """Return a function that calls the given binary with the arg string.
+
+    Output is read line by line as the process prints it into an OutputCapture,
+    so chatty scans keep only head + tail in memory and spill the rest to disk.
+    `_wrapper.cli_command(arg)` gives tool_runner the argv, so the bot runs the
+    binary as an async subprocess and streams its output to Discord instead.
+    """
+    def _argv(arg: str) -> list[str]:
         exe = os.getenv(f"{bin_name.upper()}_BIN", bin_name)
-        cmd = f"{exe} {arg}".strip()
+        return shlex.split(f"{exe} {arg}".strip())
+
+    def _wrapper(arg: str) -> str:
+        capture = OutputCapture(bin_name)
         try:
-            res = subprocess.run(shlex.split(cmd), capture_output=True, timeout=120, text=True)
-            if res.returncode != 0:
-                return f"[{bin_name}] exit {res.returncode}: {res.stderr.strip()[:4000]}"
-            return res.stdout.strip() or f"[{bin_name}] done (no stdout)"
+            proc = subprocess.Popen(_argv(arg), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    text=True, errors="replace", bufsize=1)
         except FileNotFoundError:
             return f"[{bin_name}] binary not found; install and/or set {bin_name.upper()}_BIN"
-        except subprocess.TimeoutExpired:
+        timed_out = threading.Event()
+        timer = threading.Timer(120, lambda: (timed_out.set(), proc.kill()))
+        timer.start()
+        try:
+            with capture:
+                for line in proc.stdout:
+                    capture.write(line)
+            proc.wait()
+        finally:
+            timer.cancel()
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+        if timed_out.is_set():
             return f"[{bin_name}] timed out"
+        if proc.returncode != 0:
+            return f"[{bin_name}] exit {proc.returncode}: {capture.summary().strip()}"
+        return capture.summary().strip() or f"[{bin_name}] done (no stdout)"
     _wrapper.__doc__ = f"Run `{bin_name}` CLI with provided args. arg='...'"
+    _wrapper.cli_command = lambda arg: (_argv(arg), None)
     return _wrapper
 
 # ---------------------------------------------------------------------------